@@ -0,0 +1,85 @@
+"""Benchmark: extração do yt-dlp com backend de threads vs processos
+
+Mede o tempo total de N extrações concorrentes e o atraso do event loop
+(um tique a cada 20 ms, o mesmo ritmo dos pacotes de voz).
+
+Uso (a partir de zavork/):
+    python -m benchmarks.extractor_backends --queries 20 --workers 2
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from utils.extractor import ThreadExtractor, ProcessExtractor
+from utils.youtube import YouTubePlayer
+
+QUERIES = [
+    "lilium elfen lied", "hunter x hunter reason", "galneryus hunting for your dreams",
+    "never gonna give you up", "bohemian rhapsody", "take on me", "africa toto",
+    "september earth wind fire", "hotel california", "billie jean",
+]
+
+
+async def measure_loop_lag(stop: asyncio.Event, lags: list) -> None:
+    """Registra o atraso de cada tique de 20 ms"""
+    interval = 0.02
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+
+
+async def run_backend(extractor, count: int) -> dict:
+    """Executa `count` buscas concorrentes e coleta métricas"""
+    extractor.start()
+    # Aquecimento: a primeira extração de cada worker paga a inicialização
+    try:
+        await extractor.extract("ytsearch1:warmup", YouTubePlayer.YDL_OPTIONS)
+    except Exception as e:
+        print(f"[{extractor.name}] aquecimento falhou: {e}")
+
+    stop = asyncio.Event()
+    lags = []
+    ticker = asyncio.create_task(measure_loop_lag(stop, lags))
+
+    start = time.perf_counter()
+    results = await asyncio.gather(
+        *(extractor.extract(f"ytsearch1:{QUERIES[i % len(QUERIES)]}", YouTubePlayer.YDL_OPTIONS)
+          for i in range(count)),
+        return_exceptions=True
+    )
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await ticker
+    extractor.close()
+
+    errors = sum(1 for r in results if isinstance(r, Exception))
+    return {
+        'elapsed': elapsed,
+        'per_call': elapsed / count,
+        'errors': errors,
+        'lag_p50': statistics.median(lags) * 1000 if lags else 0.0,
+        'lag_max': max(lags) * 1000 if lags else 0.0,
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--queries', type=int, default=20)
+    parser.add_argument('--workers', type=int, default=2)
+    args = parser.parse_args()
+
+    backends = [
+        ThreadExtractor(workers=args.workers),
+        ProcessExtractor(workers=args.workers, default_options=YouTubePlayer.YDL_OPTIONS),
+    ]
+    print(f"{'backend':<10}{'total (s)':>12}{'por busca (s)':>16}{'lag p50 (ms)':>15}{'lag máx (ms)':>15}{'erros':>8}")
+    for extractor in backends:
+        r = await run_backend(extractor, args.queries)
+        print(f"{extractor.name:<10}{r['elapsed']:>12.2f}{r['per_call']:>16.2f}"
+              f"{r['lag_p50']:>15.1f}{r['lag_max']:>15.1f}{r['errors']:>8}")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
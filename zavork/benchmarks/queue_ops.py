@@ -0,0 +1,110 @@
+"""Benchmark: MusicQueue indexada (ChunkedList) vs a fila antiga em deque
+
+Mede remoção no meio, shuffle, página do /queue e duração total para filas
+de vários tamanhos. Não usa rede nem Discord.
+
+Uso (a partir de zavork/):
+    python -m benchmarks.queue_ops --sizes 1000 10000 50000 --ops 200
+"""
+import argparse
+import random
+import time
+from collections import deque
+from utils.queue import MusicQueue, Song
+
+
+class DequeQueue:
+    """Operações da fila antiga, copiadas da versão baseada em deque"""
+
+    def __init__(self):
+        self.queue = deque()
+
+    def add(self, song: Song) -> None:
+        self.queue.append(song)
+
+    def remove_at(self, index: int) -> Song:
+        temp_list = list(self.queue)
+        removed = temp_list.pop(index)
+        self.queue = deque(temp_list)
+        return removed
+
+    def shuffle(self) -> None:
+        temp_list = list(self.queue)
+        random.shuffle(temp_list)
+        self.queue = deque(temp_list)
+
+    def page(self, start: int, stop: int) -> list:
+        return self.get_queue()[start:stop]
+
+    def get_queue(self) -> list:
+        return list(self.queue)
+
+    def total_duration(self) -> int:
+        return sum(song.duration for song in self.queue)
+
+
+class IndexedQueue:
+    """Adaptador da MusicQueue atual para a mesma interface"""
+
+    def __init__(self):
+        self.queue = MusicQueue()
+
+    def add(self, song: Song) -> None:
+        self.queue.add(song)
+
+    def remove_at(self, index: int) -> Song:
+        return self.queue.remove_at(index)
+
+    def shuffle(self) -> None:
+        self.queue.shuffle()
+
+    def page(self, start: int, stop: int) -> list:
+        return self.queue.get_slice(start, stop)
+
+    def total_duration(self) -> int:
+        return self.queue.total_seconds()
+
+
+def timed(func, ops: int) -> float:
+    """Tempo médio por operação, em microssegundos"""
+    start = time.perf_counter()
+    for _ in range(ops):
+        func()
+    return (time.perf_counter() - start) / ops * 1e6
+
+
+def run(factory, size: int, ops: int) -> dict:
+    queue = factory()
+    for i in range(size):
+        queue.add(Song(f"https://www.youtube.com/watch?v={i:011d}", f"Música {i}", 180 + i % 120, "bench"))
+
+    rng = random.Random(0)
+    results = {}
+    # Remove e devolve para manter o tamanho constante
+    def remove_middle():
+        song = queue.remove_at(rng.randrange(size - 1))
+        queue.add(song)
+    results['remove_at'] = timed(remove_middle, ops)
+    results['page'] = timed(lambda: queue.page(size // 2, size // 2 + 10), ops)
+    results['total'] = timed(queue.total_duration, ops)
+    results['shuffle'] = timed(queue.shuffle, max(ops // 20, 1))
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--ops', type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'tamanho':>8} {'operação':>10} {'deque (µs)':>12} {'indexada (µs)':>14} {'ganho':>8}")
+    for size in args.sizes:
+        old = run(DequeQueue, size, args.ops)
+        new = run(IndexedQueue, size, args.ops)
+        for op in old:
+            speedup = old[op] / new[op] if new[op] else float('inf')
+            print(f"{size:>8} {op:>10} {old[op]:>12.1f} {new[op]:>14.1f} {speedup:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
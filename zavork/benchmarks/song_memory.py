@@ -0,0 +1,86 @@
+"""Benchmark: memória de 100k músicas em filas/playlists (antes vs Track compartilhado)
+
+Compara a representação antiga (classe com __dict__ e dataclass sem slots,
+com URL e título duplicados a cada cópia) com Song/PlaylistSong atuais.
+Cenário padrão: 100k entradas sorteadas de 5k vídeos distintos, como várias
+playlists e filas com músicas em comum.
+
+Uso (a partir de zavork/):
+    python -m benchmarks.song_memory --songs 100000 --distinct 5000
+"""
+import argparse
+import gc
+import random
+import tracemalloc
+from dataclasses import dataclass
+from utils.queue import Song
+from utils.playlist import PlaylistSong
+
+
+class OldSong:
+    """Song antiga: atributos em __dict__"""
+
+    def __init__(self, url, title, duration, requester, stream_url=None, stream_expires=None, codec=None):
+        self.url = url
+        self.title = title
+        self.duration = duration
+        self.requester = requester
+        self.stream_url = stream_url
+        self.stream_expires = stream_expires
+        self.codec = codec
+
+
+@dataclass
+class OldPlaylistSong:
+    """PlaylistSong antiga: dataclass sem slots"""
+    url: str
+    title: str
+    duration: int
+
+
+def catalog(distinct: int) -> list:
+    return [(f"{i:011d}", f"Artista {i % 700} - Música número {i}", 120 + i % 300) for i in range(distinct)]
+
+
+def measure(build) -> int:
+    """Bytes alocados pelas estruturas criadas em `build`"""
+    gc.collect()
+    tracemalloc.start()
+    objects = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objects
+    return current
+
+
+def make_entries(songs: int, distinct: int) -> list:
+    rng = random.Random(0)
+    videos = catalog(distinct)
+    # Cada entrada chega com strings novas, como ao ler JSON ou resultados de busca
+    return [
+        (f"https://www.youtube.com/watch?v={video_id}", "".join(title), duration)
+        for video_id, title, duration in (rng.choice(videos) for _ in range(songs))
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--songs', type=int, default=100000)
+    parser.add_argument('--distinct', type=int, default=5000)
+    args = parser.parse_args()
+
+    cases = {
+        'Song antiga': lambda: [OldSong(u, t, d, "usuário") for u, t, d in make_entries(args.songs, args.distinct)],
+        'Song atual': lambda: [Song(u, t, d, "usuário") for u, t, d in make_entries(args.songs, args.distinct)],
+        'PlaylistSong antiga': lambda: [OldPlaylistSong(u, t, d) for u, t, d in make_entries(args.songs, args.distinct)],
+        'PlaylistSong atual': lambda: [PlaylistSong(u, t, d) for u, t, d in make_entries(args.songs, args.distinct)],
+    }
+
+    print(f"{args.songs} músicas, {args.distinct} vídeos distintos")
+    for name, build in cases.items():
+        size = measure(build)
+        print(f"{name:>20}: {size / 1024 ** 2:7.1f} MB ({size / args.songs:6.0f} bytes/música)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""Benchmark: custo de construir um YoutubeDL por chamada vs reusar do YDLPool
+
+Não faz requisições de rede: mede só a preparação que cada extração pagava
+antes (instanciar YoutubeDL, carregar extratores, cookies e sessão HTTP).
+
+Uso (a partir de zavork/):
+    python -m benchmarks.ydl_setup --calls 50
+"""
+import argparse
+import time
+import yt_dlp
+from utils.extractor import YDLPool
+from utils.youtube import YouTubePlayer
+
+
+def per_call(calls: int) -> float:
+    """Comportamento antigo: um YoutubeDL novo dentro de `with` a cada chamada"""
+    start = time.perf_counter()
+    for _ in range(calls):
+        with yt_dlp.YoutubeDL(YouTubePlayer.YDL_OPTIONS) as ydl:
+            ydl.get_info_extractor('Youtube')
+    return time.perf_counter() - start
+
+
+def pooled(calls: int) -> float:
+    """Comportamento novo: instância da thread reaproveitada pelo YDLPool"""
+    pool = YDLPool()
+    start = time.perf_counter()
+    for _ in range(calls):
+        slots = pool._slots()
+        if 'default' not in slots:
+            pool.warm('default', YouTubePlayer.YDL_OPTIONS)
+        slots['default'][0].get_info_extractor('Youtube')
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--calls', type=int, default=50)
+    args = parser.parse_args()
+
+    old = per_call(args.calls)
+    new = pooled(args.calls)
+    print(f"YoutubeDL por chamada: {old:.3f}s ({old / args.calls * 1000:.1f}ms/chamada)")
+    print(f"YDLPool (reuso):       {new:.3f}s ({new / args.calls * 1000:.1f}ms/chamada)")
+    print(f"Economia por chamada:  {(old - new) / args.calls * 1000:.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
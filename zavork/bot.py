@@ -165,19 +165,24 @@ async def help_command(interaction: discord.Interaction):
     
     commands_info = {
         "🎵 **REPRODUÇÃO**": "",
-        "/play <música>": "Reproduz uma música do YouTube",
+        "/play <música>": "Reproduz uma música (ou playlist) do YouTube",
+        "/search <termo>": "Busca músicas e escolhe qual tocar",
+        "/library_search <termo>": "Busca nas playlists salvas de todos e toca na hora",
         "/pause": "Pausa a música atual",
         "/resume": "Retoma a música",
         "/skip": "Vota para pular a música (50% +1 votos)",
         "/forceskip": "[Admin] Pula sem votação",
+        "/sessions": "[Admin] Mostra sessões ativas e uso de memória",
         "/stop": "Para a reprodução e limpa a fila",
         "/volume <0-200>": "Ajusta o volume (padrão: 100%)",
         "/now": "Mostra a música tocando agora",
-        "/queue": "Mostra a fila de músicas",
+        "/queue [página]": "Mostra a fila de músicas",
+        "/history [dias]": "Mostra as músicas tocadas recentemente",
         "\n📚 **PLAYLISTS**": "",
         "/playlist_create <nome>": "Cria uma nova playlist",
         "/playlist_delete <nome>": "Deleta uma playlist",
         "/playlist_add <nome> <música>": "Adiciona música à playlist",
+        "/playlist_import <nome> <url>": "Importa uma playlist do YouTube",
         "/playlist_remove <nome> <posição>": "Remove música da playlist",
         "/playlist_list": "Lista suas playlists",
         "/playlist_show <nome>": "Mostra músicas de uma playlist",
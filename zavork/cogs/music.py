@@ -2,10 +2,24 @@ import discord
 from discord.ext import commands
 from discord import app_commands
 import asyncio
+import functools
 import logging
-from utils.queue import MusicQueue, Song
-from utils.youtube import YouTubePlayer
+import time
+from typing import Optional, Tuple
+from utils.queue import Song, LazySource
+from utils.youtube import YouTubePlayer, UNAVAILABLE_ERRORS
+from utils.cache import MetadataCache, QueryCache
+from utils.extractor import create_extractor
 from utils.playlist import PlaylistManager, PlaylistSong
+from utils.session import SessionManager, GuildSession
+from utils.prefetch import Prefetcher, DetailResolver
+from utils.audio import AudioSourceFactory, TrackedSource, GaplessSource, ensure_encoder, swap_source, FRAME_SECONDS
+from utils.ffmpeg import FFmpegSupervisor, TranscodeLimitError
+from utils.audio_cache import AudioCache
+from utils.history import PlaybackHistory
+from utils.validator import LinkValidator
+from utils.scheduler import PLAYBACK, BACKGROUND
+from utils.resilience import ExtractionGuard, CircuitBreaker
 import os
 from dotenv import load_dotenv
 
@@ -15,16 +29,80 @@ logger = logging.getLogger(__name__)
 class MusicCog(commands.Cog):
     """Cog para comandos de música"""
 
+    # Reprodução que termina antes disso indica stream inválido
+    STALE_STREAM_SECONDS = 3.0
+
+    # Quantidade de opções mostradas pelo /search
+    SEARCH_RESULTS = 5
+
+    # Músicas por página no /queue
+    QUEUE_PAGE_SIZE = 10
+
+    # Músicas de playlist importada gravadas por vez no PlaylistManager
+    IMPORT_BATCH_SIZE = 50
+
     def __init__(self, bot):
         self.bot = bot
-        self.youtube = YouTubePlayer()
-        self.queue = MusicQueue()
-        self.is_playing = False
-        self.current_voice_client = None
-        self.current_volume = 1.0  # Volume padrão (100%)
-        self.playlist_manager = PlaylistManager()
-        self.skip_votes = set()  # IDs dos usuários que votaram para skip
-        self.skip_votes_needed = 0  # Votos necessários para skip
+        self.youtube = YouTubePlayer(
+            metadata_cache=MetadataCache(
+                path=os.getenv('METADATA_CACHE_PATH', os.path.join('data', 'metadata_cache.db')),
+                max_entries=int(os.getenv('METADATA_CACHE_SIZE', '5000'))
+            ),
+            extractor=create_extractor(
+                backend=os.getenv('EXTRACTOR_BACKEND', 'thread'),
+                workers=int(os.getenv('EXTRACTOR_WORKERS', '2')),
+                default_options=YouTubePlayer.YDL_OPTIONS,
+                max_uses=int(os.getenv('EXTRACTOR_MAX_USES', '200'))
+            ),
+            query_cache=QueryCache(
+                max_entries=int(os.getenv('QUERY_CACHE_SIZE', '500')),
+                ttl=float(os.getenv('QUERY_CACHE_TTL', '600'))
+            ),
+            guard=ExtractionGuard(
+                deadline=float(os.getenv('EXTRACTION_DEADLINE', '12')),
+                hedge_percentile=float(os.getenv('EXTRACTION_HEDGE_PERCENTILE', '95')) / 100,
+                breaker=CircuitBreaker(
+                    failure_threshold=int(os.getenv('EXTRACTION_BREAKER_FAILURES', '5')),
+                    reset_timeout=float(os.getenv('EXTRACTION_BREAKER_RESET', '30'))
+                )
+            )
+        )
+        self.playlist_manager = PlaylistManager(
+            backend=os.getenv('PLAYLIST_BACKEND', 'sqlite'),
+            write_delay=float(os.getenv('PLAYLIST_WRITE_DELAY', '2'))
+        )
+
+        # Verificação dos links salvos em playlists, em lotes e com prioridade baixa
+        self.link_validator = LinkValidator(
+            self.youtube.check_videos,
+            self.playlist_manager,
+            is_busy=self._extraction_busy,
+            batch_size=int(os.getenv('LINK_CHECK_BATCH', '5')),
+            interval=float(os.getenv('LINK_CHECK_INTERVAL', '30')),
+            recheck_after=float(os.getenv('LINK_RECHECK_DAYS', '7')) * 86400
+        )
+
+        # Uma sessão de reprodução por servidor, criada sob demanda
+        self.sessions = SessionManager(
+            idle_timeout=float(os.getenv('SESSION_IDLE_TIMEOUT', '300')),
+            on_create=self._setup_session
+        )
+        self._reaper_task = None
+
+        # Quantas músicas da fila resolver antecipadamente
+        self.prefetch_lookahead = int(os.getenv('PREFETCH_LOOKAHEAD', '2'))
+        self.prefetch_probe = os.getenv('PREFETCH_PROBE', 'false').lower() in ('1', 'true', 'yes')
+
+        # Histórico: músicas mantidas em memória por servidor; as antigas vão para disco
+        self.history_depth = int(os.getenv('HISTORY_DEPTH', '50'))
+        if self.history_depth < 1:
+            logger.warning(f"HISTORY_DEPTH={self.history_depth} inválido (mínimo 1), usando 1")
+            self.history_depth = 1
+        self.history_dir = os.getenv('HISTORY_DIR', os.path.join('data', 'history')).strip()
+
+        # Playlists do YouTube: limite de músicas e extrações simultâneas dos detalhes
+        self.playlist_max_songs = int(os.getenv('PLAYLIST_MAX_SONGS', '500'))
+        self.playlist_resolve_concurrency = int(os.getenv('PLAYLIST_RESOLVE_CONCURRENCY', '4'))
 
         # Configurar caminho do FFmpeg
         ffmpeg_env = os.getenv('FFMPEG_PATH', '').strip()
@@ -36,26 +114,122 @@ class MusicCog(commands.Cog):
             self.ffmpeg_path = 'ffmpeg'
 
         logger.info(f"FFmpeg configurado para usar: {self.ffmpeg_path}")
-    
+
+        self.youtube.ffmpeg_path = self.ffmpeg_path
+
+        # Cache local de áudio das músicas mais tocadas (0 bytes desativa)
+        audio_cache_bytes = int(os.getenv('AUDIO_CACHE_MAX_MB', '1024')) * 1024 ** 2
+        self.audio_cache = AudioCache(
+            self.youtube.download_audio,
+            directory=os.getenv('AUDIO_CACHE_DIR', os.path.join('data', 'audio_cache')),
+            max_bytes=audio_cache_bytes,
+            min_plays=int(os.getenv('AUDIO_CACHE_MIN_PLAYS', '3'))
+        ) if audio_cache_bytes > 0 else None
+
+        # Opus do YouTube vai direto ao Discord (sem PCM) quando o volume é 100%
+        self.audio = AudioSourceFactory(
+            self.ffmpeg_path,
+            passthrough=os.getenv('OPUS_PASSTHROUGH', 'true').lower() in ('1', 'true', 'yes'),
+            # Processos FFmpeg por servidor, limite de transcodificações e processos pré-iniciados
+            supervisor=FFmpegSupervisor(
+                max_transcodes=int(os.getenv('FFMPEG_MAX_TRANSCODES', '4')),
+                transcode_wait=float(os.getenv('FFMPEG_TRANSCODE_WAIT', '5')),
+                warm_workers=int(os.getenv('FFMPEG_WARM_WORKERS', '0'))
+            )
+        )
+
+        # Troca sem pausa: a próxima música é aberta perto do fim da atual (0 desativa)
+        self.gapless_preload = float(os.getenv('GAPLESS_PRELOAD_SECONDS', '20'))
+        self.gapless_buffer_frames = int(float(os.getenv('GAPLESS_BUFFER_SECONDS', '3')) / FRAME_SECONDS)
+
+    def _setup_session(self, session: GuildSession):
+        """Configura histórico, prefetch e resolução de detalhes de uma sessão recém-criada"""
+        session.queue.history = PlaybackHistory(
+            depth=self.history_depth,
+            spill_path=os.path.join(self.history_dir, f"{session.guild_id}.jsonl") if self.history_dir else None
+        )
+
+        prober = None
+        if self.prefetch_probe:
+            async def prober(stream_url):
+                return await discord.FFmpegOpusAudio.probe(stream_url, executable=self.ffmpeg_path)
+
+        session.prefetcher = Prefetcher(
+            session.queue,
+            functools.partial(self.youtube.get_stream_url, lane=PLAYBACK, guild_id=session.guild_id),
+            lookahead=self.prefetch_lookahead,
+            prober=prober
+        )
+        session.detail_resolver = DetailResolver(
+            functools.partial(self.youtube.get_info, lane=BACKGROUND, guild_id=session.guild_id),
+            concurrency=self.playlist_resolve_concurrency,
+            on_update=session.queue.duration_changed
+        )
+        session.queue.subscribe(functools.partial(self._check_preload, session))
+
+    def _extraction_busy(self) -> bool:
+        """Indica extrações interativas ou de playlists em andamento (ou extração fora do ar)"""
+        if self.youtube.inflight.stats()['inflight'] or not self.youtube.guard.breaker.closed:
+            return True
+        return any(session.detail_resolver and session.detail_resolver.pending for session in self.sessions)
+
+    async def cog_load(self):
+        """Inicia a limpeza periódica de sessões ociosas"""
+        self._reaper_task = asyncio.create_task(self._reap_idle_sessions())
+        self.youtube.start()
+        self.link_validator.start()
+
+    async def cog_unload(self):
+        """Cancela tarefas de fundo"""
+        if self._reaper_task:
+            self._reaper_task.cancel()
+        # Grava em disco o histórico ainda em memória
+        for session in self.sessions:
+            session.queue.history.clear()
+        self.link_validator.close()
+        self.youtube.close()
+        self.playlist_manager.close()
+        self.audio.supervisor.close()
+        if self.audio_cache:
+            self.audio_cache.close()
+
+    async def _reap_idle_sessions(self):
+        """Remove periodicamente sessões sem reprodução nem conexão"""
+        interval = max(10.0, self.sessions.idle_timeout / 5)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                dropped = self.sessions.drop_idle()
+                if dropped:
+                    logger.info(f"{len(dropped)} sessões ociosas removidas, {len(self.sessions)} ativas")
+                # FFmpeg de servidores sem conexão de voz não tem quem o leia
+                self.audio.supervisor.kill_orphans(session.guild_id for session in self.sessions if session.is_connected())
+            except Exception as e:
+                logger.error(f"Erro ao limpar sessões ociosas: {e}")
+
     @commands.Cog.listener()
     async def on_voice_state_update(self, member, before: discord.VoiceState, after: discord.VoiceState):
         """Detecta quando alguém entra/sai de canal de voz"""
+        session = self.sessions.peek(member.guild.id)
+        if session is None:
+            return
+
         # Se o bot foi desconectado, limpar estado
         if member == self.bot.user:
             if before.channel and not after.channel:
-                logger.info("Bot foi desconectado do canal de voz, limpando estado")
-                self.current_voice_client = None
-                self.is_playing = False
-                self.queue.clear()
+                logger.info(f"Bot foi desconectado do canal de voz (guild {member.guild.id}), limpando estado")
+                session.voice_client = None
+                session.reset()
+                self.audio.supervisor.kill_guild(member.guild.id)
             return
 
         # Se o bot fica sozinho no canal, desconecta
-        if self.current_voice_client and self.current_voice_client.is_connected():
-            if self.current_voice_client.channel and len(self.current_voice_client.channel.members) == 1:
-                logger.info("Bot ficou sozinho no canal, desconectando")
-                await self.disconnect_from_voice()
+        if session.is_connected():
+            if session.voice_client.channel and len(session.voice_client.channel.members) == 1:
+                logger.info(f"Bot ficou sozinho no canal (guild {member.guild.id}), desconectando")
+                await self.disconnect_from_voice(session)
     
-    async def connect_to_voice(self, interaction: discord.Interaction) -> bool:
+    async def connect_to_voice(self, interaction: discord.Interaction, session: GuildSession) -> bool:
         """Conecta o bot ao canal de voz do usuário"""
         if not interaction.user.voice or not interaction.user.voice.channel:
             # Verifica se já respondeu a interação
@@ -74,13 +248,13 @@ class MusicCog(commands.Cog):
         channel = interaction.user.voice.channel
 
         try:
-            if self.current_voice_client and self.current_voice_client.channel == channel:
+            if session.voice_client and session.voice_client.channel == channel:
                 return True
 
-            if self.current_voice_client:
-                await self.current_voice_client.disconnect()
+            if session.voice_client:
+                await session.voice_client.disconnect()
 
-            self.current_voice_client = await channel.connect()
+            session.voice_client = await channel.connect()
             return True
         except Exception as e:
             logger.error(f"Erro ao conectar ao canal de voz: {e}")
@@ -97,98 +271,363 @@ class MusicCog(commands.Cog):
                 )
             return False
     
-    async def disconnect_from_voice(self):
+    async def disconnect_from_voice(self, session: GuildSession):
         """Desconecta o bot do canal de voz"""
-        if self.current_voice_client:
-            await self.current_voice_client.disconnect()
-            self.current_voice_client = None
-            self.is_playing = False
+        if session.voice_client:
+            await session.voice_client.disconnect()
+            session.voice_client = None
+            session.is_playing = False
+            self.audio.supervisor.kill_guild(session.guild_id)
     
-    async def play_song(self, song: Song):
-        """Reproduz uma música"""
-        if not self.current_voice_client:
+    async def play_song(self, session: GuildSession, song: Song, retry: bool = False) -> bool:
+        """Reproduz uma música
+
+        Se o FFmpeg falhar logo no início (URL de stream expirada), a música é
+        tocada de novo uma única vez com `retry=True`, forçando nova extração.
+
+        Returns:
+            False se a música foi descartada e a próxima deve tocar (quem
+            chamou segue a fila; ver `next_song`)
+        """
+        if not session.voice_client:
             logger.warning("Voice client não existe, cancelando reprodução")
-            self.is_playing = False
-            return
+            session.is_playing = False
+            return True
 
         # Verificar se ainda está conectado
-        if not self.current_voice_client.is_connected():
+        if not session.voice_client.is_connected():
             logger.warning("Voice client não está conectado, limpando estado")
-            self.current_voice_client = None
-            self.is_playing = False
-            return
+            session.voice_client = None
+            session.is_playing = False
+            return True
 
         try:
-            self.is_playing = True
-            logger.info(f"Buscando stream URL para: {song.title}")
-            stream_url = await self.youtube.get_stream_url(song.url)
-
+            session.is_playing = True
+            session.stop_requested = False
+            session.touch()
+
+            try:
+                stream_url, codec = await self._resolve_stream(session, song, retry)
+            except UNAVAILABLE_ERRORS as e:
+                # Extração fora do ar não diz nada sobre o vídeo: a fila fica intacta
+                await self._pause_for_extraction(session, e)
+                return True
             if not stream_url:
                 logger.error(f"Não foi possível obter stream para: {song.title}")
-                return
+                # Link salvo pode ter morrido: verifica antes do rodízio normal
+                self.link_validator.report(song.url)
+                session.is_playing = False
+                return False
 
-            logger.info(f"Stream URL obtida: {stream_url[:100]}...")
             logger.info(f"Usando FFmpeg: {self.ffmpeg_path}")
-
-            # Configurar source de áudio
-            audio_source = discord.FFmpegPCMAudio(
-                stream_url,
-                executable=self.ffmpeg_path,
-                before_options="-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5",
-                options="-vn"
+            try:
+                # Com opus, o create já cai para passthrough quando não há vaga
+                audio_source = await self.audio.create(
+                    stream_url, session.volume, codec=codec, guild_id=session.guild_id
+                )
+            except TranscodeLimitError as e:
+                logger.warning(f"Sem vaga de transcodificação para: {song.title} ({e})")
+                await self._notify(
+                    session, f"⚠️ Servidor ocupado: não foi possível tocar **{song.title}** agora, pulando."
+                )
+                session.is_playing = False
+                return False
+
+            # O player toca sempre a mesma fonte, que emenda as próximas músicas já abertas
+            ended_at, session.track_ended_at = session.track_ended_at, None
+            chain = GaplessSource(
+                audio_source,
+                song,
+                preload_lead=self.gapless_preload,
+                ended_at=ended_at,
+                on_preload=lambda: self.bot.loop.call_soon_threadsafe(self._check_preload, session),
+                on_track_start=functools.partial(self._on_track_start, session)
             )
 
-            logger.info("FFmpegPCMAudio criado com sucesso")
-
-            # Aplicar controle de volume
-            audio_source = discord.PCMVolumeTransformer(audio_source, volume=self.current_volume)
-
-            logger.info("PCMVolumeTransformer aplicado")
-
             def after_playback(error):
                 if error:
                     logger.error(f"Erro na reprodução: {error}")
-                # Limpar votos de skip quando a música termina
-                self.skip_votes.clear()
-                asyncio.run_coroutine_threadsafe(self.next_song(), self.bot.loop)
+                if session.gapless is chain:
+                    session.gapless = None
+
+                # Terminou cedo demais: provavelmente a URL de stream expirou
+                ended_song = chain.song  # Última música emendada, não necessariamente a primeira
+                elapsed = time.monotonic() - chain.started_at
+                retried = retry and chain.switches == 0
+                if not retried and self._looks_like_stale_stream(session, ended_song, error, elapsed):
+                    logger.warning(f"Stream falhou após {elapsed:.1f}s, buscando nova URL para: {ended_song.title}")
+                    session.playback_task = asyncio.run_coroutine_threadsafe(
+                        self._retry_song(session, ended_song), self.bot.loop
+                    )
+                    return
 
-            self.current_voice_client.play(audio_source, after=after_playback)
-            logger.info("Reprodução iniciada!")
+                # Limpar votos de skip quando a música termina
+                session.skip_votes.clear()
+                session.track_ended_at = time.monotonic()
+                session.playback_task = asyncio.run_coroutine_threadsafe(
+                    self.next_song(session), self.bot.loop
+                )
 
-            # Calcular votos necessários (50% dos membros no canal, mínimo 2)
-            if self.current_voice_client and self.current_voice_client.channel:
-                members_count = len([m for m in self.current_voice_client.channel.members if not m.bot])
-                self.skip_votes_needed = max(2, (members_count + 1) // 2)
-                logger.info(f"Votos necessários para skip: {self.skip_votes_needed}/{members_count}")
+            session.gapless = chain
+            session.voice_client.play(chain, after=after_playback)
+            logger.info(f"Reprodução iniciada! (guild {session.guild_id})")
+            self._track_started(session, song, retry)
+            if session.resume_task is not None:
+                # Voltou a tocar (por ela ou por outro comando): encerra a espera
+                if session.resume_task is not asyncio.current_task():
+                    session.resume_task.cancel()
+                session.resume_task = None
 
         except Exception as e:
             logger.error(f"Erro ao reproduzir música: {e}")
             import traceback
             logger.error(traceback.format_exc())
-            self.is_playing = False
+            session.is_playing = False
+        return True
+
+    async def _retry_song(self, session: GuildSession, song: Song):
+        """Toca de novo com stream renovado; se não der, segue a fila"""
+        if not await self.play_song(session, song, retry=True):
+            await self.next_song(session)
+
+    async def _pause_for_extraction(self, session: GuildSession, error: Exception):
+        """Extração indisponível (disjuntor aberto ou prazo esgotado): pausa sem descartar a fila
+
+        A música volta para o início da fila, nada é marcado como link morto
+        e a reprodução é tentada de novo depois da janela do disjuntor.
+        """
+        first = session.resume_task is None
+        session.queue.requeue_current()
+        session.is_playing = False
+        delay = self.youtube.guard.breaker.reset_timeout
+        logger.warning(f"Extração indisponível ({YouTubePlayer.describe_error(error)}), "
+                       f"fila pausada por {delay:.0f}s (guild {session.guild_id})")
+        session.resume_task = asyncio.ensure_future(self._resume_after(session, delay))
+        if first:
+            await self._notify(
+                session, f"⏸️ O YouTube não está respondendo. A fila foi mantida e a reprodução "
+                         f"volta a ser tentada a cada {delay:.0f}s."
+            )
+
+    async def _resume_after(self, session: GuildSession, delay: float):
+        """Retoma a fila pausada por `_pause_for_extraction`, se nada mudou nesse meio tempo"""
+        generation = session.queue.generation
+        await asyncio.sleep(delay)
+        if session.queue.generation != generation or session.is_playing or not session.is_connected():
+            session.resume_task = None  # Fila limpa, já voltou a tocar ou bot saiu do canal
+            return
+        await self.next_song(session)
+        if session.resume_task is asyncio.current_task():
+            session.resume_task = None  # Fila terminou sem tocar nem pausar de novo
+
+    async def _notify(self, session: GuildSession, message: str):
+        """Avisa no chat do canal de voz (reprodução automática não tem interação para responder)"""
+        channel = session.voice_client.channel if session.voice_client else None
+        if channel is None:
+            return
+        try:
+            await channel.send(message)
+        except discord.HTTPException as e:
+            logger.warning(f"Não foi possível avisar no canal {channel.id}: {e}")
+
+    async def _resolve_stream(self, session: GuildSession, song: Song,
+                              retry: bool = False) -> Tuple[Optional[str], Optional[str]]:
+        """Retorna (stream ou arquivo local, codec) de uma música, ou (None, None)"""
+        video_id = YouTubePlayer.extract_video_id(song.url)
+        probed_codec = session.prefetcher.pop_codec(song.url)[0] if session.prefetcher else None
+
+        # Música popular já baixada: toca do arquivo local
+        local_path = self.audio_cache.path_for(video_id) if self.audio_cache and video_id else None
+        if local_path:
+            logger.info(f"Tocando do cache local: {song.title}")
+            return local_path, 'opus'
+
+        # Usa o stream resolvido na busca; só extrai de novo se expirou
+        stream_url = None if retry else song.fresh_stream_url(self.youtube.stream_cache.safety_margin)
+        if stream_url:
+            logger.info(f"Usando stream já resolvido para: {song.title}")
+        else:
+            logger.info(f"Buscando stream URL para: {song.title}")
+            stream_url = await self.youtube.get_stream_url(
+                song.url, force_refresh=retry, guild_id=session.guild_id, raise_unavailable=True
+            )
+            if video_id:
+                song.set_stream(
+                    stream_url,
+                    self.youtube.stream_cache.expires_at(video_id),
+                    self.youtube.stream_cache.codec(video_id)
+                )
+
+        if not stream_url:
+            return None, None
+
+        logger.info(f"Stream URL obtida: {stream_url[:100]}...")
+        # Codec vindo da extração ou da sonda do prefetch decide o passthrough
+        return stream_url, song.codec or probed_codec
+
+    def _track_started(self, session: GuildSession, song: Song, retry: bool = False):
+        """Contabiliza a reprodução e recalcula os votos de skip"""
+        video_id = YouTubePlayer.extract_video_id(song.url)
+        if self.audio_cache and video_id and not retry:
+            self.audio_cache.record_play(video_id, song.url)
+
+        # Calcular votos necessários (50% dos membros no canal, mínimo 2)
+        if session.voice_client and session.voice_client.channel:
+            members_count = len([m for m in session.voice_client.channel.members if not m.bot])
+            session.skip_votes_needed = max(2, (members_count + 1) // 2)
+            logger.info(f"Votos necessários para skip: {session.skip_votes_needed}/{members_count}")
+
+    def _on_track_start(self, session: GuildSession, song: Song, gap: Optional[float], gapless: bool):
+        """Primeiro frame de uma música (thread do player): mede o silêncio e avança a fila nas trocas sem pausa"""
+        if gap is not None:
+            session.record_gap(gap, gapless)
+            mode = "sem pausa" if gapless else "a frio"
+            logger.info(f"Silêncio entre músicas: {gap * 1000:.1f}ms ({mode}, guild {session.guild_id})")
+        if gapless:
+            self.bot.loop.call_soon_threadsafe(self._advance_gapless, session, song)
+
+    def _advance_gapless(self, session: GuildSession, song: Song):
+        """Atualiza a fila depois que o player emendou `song` sem pausa"""
+        if session.gapless is None:
+            return
+        if session.queue.peek() is not song:
+            # A fila mudou entre a abertura e a troca: volta ao caminho normal
+            logger.warning(f"Fila mudou durante a troca sem pausa, parando: {song.title}")
+            session.stop_playback()
+            return
+
+        session.queue.next_song()
+        session.skip_votes.clear()
+        session.stop_requested = False
+        session.touch()
+        self._track_started(session, song)
+
+    def _check_preload(self, session: GuildSession):
+        """Mantém aberta a próxima música da fila quando a atual está perto do fim"""
+        chain = session.gapless
+        if chain is None or not session.is_connected():
+            return
+
+        upcoming = session.queue.peek()
+        if chain.next_song is not None and chain.next_song is not upcoming:
+            chain.drop_next()  # A música aberta não é mais a próxima da fila
+        if (chain.preload_due and chain.next_song is None and upcoming is not None
+                and (session.preload_task is None or session.preload_task.done())):
+            session.preload_task = self.bot.loop.create_task(self._preload_next(session, chain, upcoming))
+
+    async def _preload_next(self, session: GuildSession, chain: GaplessSource, song: Song):
+        """Abre o FFmpeg da próxima música e enche o buffer para a troca sem pausa"""
+        source = None
+        stale = False
+        try:
+            stream_url, codec = await self._resolve_stream(session, song)
+            if not stream_url:
+                return  # A reprodução a frio tenta de novo e avisa o validador de links
+
+            volume = session.volume
+            started_at = time.monotonic()
+            # Sem esperar vaga de transcodificação: sem vaga, fica para a reprodução a frio
+            source = await self.audio.create(stream_url, volume, codec=codec, guild_id=session.guild_id, wait=0)
+            frames = await asyncio.get_running_loop().run_in_executor(
+                None, source.prebuffer, self.gapless_buffer_frames
+            )
+            if not frames:
+                logger.warning(f"FFmpeg não entregou áudio ao abrir antecipadamente: {song.title}")
+                return
+
+            stale = session.gapless is not chain or session.queue.peek() is not song or not session.is_connected()
+            if stale or (session.volume != volume and not source.set_volume(session.volume)):
+                return
+
+            ensure_encoder(session.voice_client, source)
+            if chain.set_next(source, song):
+                logger.info(
+                    f"Próxima música aberta em {(time.monotonic() - started_at) * 1000:.0f}ms "
+                    f"com {frames * FRAME_SECONDS:.1f}s em buffer: {song.title}"
+                )
+                source = None
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Erro ao abrir antecipadamente {song.title}: {e}")
+        finally:
+            if source is not None:
+                source.cleanup()
+            if stale:
+                # A fila mudou enquanto abria: tenta com a nova próxima
+                self.bot.loop.call_soon(self._check_preload, session)
     
-    async def next_song(self):
-        """Reproduz próxima música da fila"""
-        self.is_playing = False
-        next_song = self.queue.next_song()
-        
-        if next_song:
-            await self.play_song(next_song)
+    def _looks_like_stale_stream(self, session: GuildSession, song: Song, error, elapsed: float) -> bool:
+        """Indica se a reprodução terminou por falha do stream, e não pelo fim da música"""
+        if session.stop_requested or not session.is_connected() or session.queue.current_song() is not song:
+            return False  # Parado, pulado ou desconectado
+        if error is not None:
+            return True
+        return elapsed < self.STALE_STREAM_SECONDS and song.duration > self.STALE_STREAM_SECONDS
+
+    async def next_song(self, session: GuildSession):
+        """Reproduz próxima música da fila, pulando as que não puderem tocar
+
+        Segue em laço (não por recursão), no máximo uma volta pela fila: com
+        o loop de fila ligado, as mesmas músicas voltariam para sempre.
+        """
+        session.is_playing = False
+        session.playback_task = None
+        for _ in range(session.queue.size() + 1):
+            next_song = session.queue.next_song()
+            if not next_song:
+                break
+            if await self.play_song(session, next_song):
+                return
+            logger.info(f"Pulando para a próxima música (guild {session.guild_id})")
+        else:
+            logger.warning(f"Nenhuma música da fila pôde ser tocada (guild {session.guild_id})")
+        session.track_ended_at = None
     
+    # ===== AUTOCOMPLETE =====
+
+    async def playlist_name_autocomplete(self, interaction: discord.Interaction,
+                                         current: str) -> list[app_commands.Choice[str]]:
+        """Sugere playlists do usuário pelo prefixo digitado"""
+        names = self.playlist_manager.complete_playlists(str(interaction.user.id), current)
+        return [app_commands.Choice(name=name[:100], value=name[:100]) for name in names]
+
+    async def saved_song_autocomplete(self, interaction: discord.Interaction,
+                                      current: str) -> list[app_commands.Choice[str]]:
+        """Sugere músicas das playlists do usuário; o valor é a URL (dispensa busca)"""
+        songs = self.playlist_manager.complete_songs(str(interaction.user.id), current)
+        return [app_commands.Choice(name=title[:100], value=url) for title, url in songs]
+
+    async def library_autocomplete(self, interaction: discord.Interaction,
+                                   current: str) -> list[app_commands.Choice[str]]:
+        """Sugere músicas de todas as playlists salvas; o valor é a URL"""
+        songs = self.playlist_manager.search_library(current, limit=25)
+        return [
+            app_commands.Choice(name=song['title'][:100], value=song['url'])
+            for song in songs if not self.playlist_manager.is_dead(song['url'])
+        ]
+
     @app_commands.command(name="play", description="Reproduz uma música do YouTube")
-    @app_commands.describe(query="Nome ou URL da música")
+    @app_commands.describe(query="Nome ou URL da música ou playlist")
+    @app_commands.autocomplete(query=saved_song_autocomplete)
     async def play(self, interaction: discord.Interaction, query: str):
         """Comando /play"""
+        session = self.sessions.get(interaction.guild.id)
         await interaction.response.defer()
         
         # Conectar ao canal de voz
-        if not await self.connect_to_voice(interaction):
+        if not await self.connect_to_voice(interaction, session):
+            return
+        
+        if YouTubePlayer.is_playlist(query):
+            await interaction.followup.send("📥 Carregando playlist...", ephemeral=True)
+            await self._enqueue_playlist(interaction, session, query)
             return
         
         # Buscar música
         await interaction.followup.send("🔍 Buscando música...", ephemeral=True)
         
-        results = await self.youtube.search(query, limit=1)
+        results = await self.youtube.search(query, limit=1, guild_id=interaction.guild.id)
         if not results:
             await interaction.followup.send(
                 "❌ Nenhuma música encontrada!",
@@ -196,16 +635,22 @@ class MusicCog(commands.Cog):
             )
             return
         
-        result = results[0]
+        await self._enqueue_result(interaction, session, results[0])
+
+    async def _enqueue_result(self, interaction: discord.Interaction, session: GuildSession, result: dict):
+        """Adiciona um resultado de busca à fila e inicia a reprodução se parada"""
         song = Song(
             url=result['url'],
             title=result['title'],
             duration=result['duration'],
-            requester=interaction.user.name
+            requester=interaction.user.name,
+            stream_url=result.get('stream_url'),
+            stream_expires=result.get('stream_expires'),
+            codec=result.get('codec')
         )
         
         # Adicionar à fila
-        position = self.queue.add(song)
+        position = session.queue.add(song)
         
         embed = discord.Embed(
             title="✅ Música Adicionada",
@@ -219,14 +664,106 @@ class MusicCog(commands.Cog):
         await interaction.followup.send(embed=embed)
         
         # Se nada está tocando, iniciar reprodução
-        if not self.is_playing:
-            await self.next_song()
+        if not session.is_playing:
+            await self.next_song(session)
+
+    async def _enqueue_playlist(self, interaction: discord.Interaction, session: GuildSession, url: str):
+        """Adiciona as músicas de uma playlist do YouTube à fila conforme chegam
+
+        Cada música entra com os dados da extração flat; detalhes e stream são
+        resolvidos em segundo plano pelo `DetailResolver` da sessão.
+        """
+        added = 0
+        total_duration = 0
+        generation = session.queue.generation
+        stopped = False
+        async for entry in self.youtube.iter_playlist(url, limit=self.playlist_max_songs):
+            # Bot saiu do canal ou a fila foi limpa (/stop) durante a importação
+            if not session.is_connected() or session.queue.generation != generation:
+                stopped = True
+                break
+
+            song = Song(
+                url=entry['url'],
+                title=entry['title'],
+                duration=entry['duration'],
+                requester=interaction.user.name
+            )
+            session.queue.add(song)
+            session.detail_resolver.submit(song)
+            added += 1
+            total_duration += song.duration
+
+            # A primeira música começa a tocar sem esperar o resto da playlist
+            if not session.is_playing:
+                await self.next_song(session)
+
+        if stopped:
+            await interaction.followup.send(
+                f"⏹️ Importação da playlist interrompida ({added} músicas adicionadas antes)", ephemeral=True
+            )
+            return
+
+        if not added:
+            await interaction.followup.send("❌ Nenhuma música encontrada na playlist!", ephemeral=True)
+            return
+
+        embed = discord.Embed(
+            title="✅ Playlist Adicionada",
+            description=f"**{added}** músicas",
+            color=0x00FF00
+        )
+        embed.add_field(name="Duração total", value=YouTubePlayer.format_duration(total_duration), inline=True)
+        embed.add_field(name="Solicitado por", value=interaction.user.mention, inline=True)
+
+        await interaction.followup.send(embed=embed)
+
+    @app_commands.command(name="search", description="Busca músicas e escolhe qual tocar")
+    @app_commands.describe(query="Termo de busca")
+    async def search(self, interaction: discord.Interaction, query: str):
+        """Comando /search"""
+        await interaction.response.defer(ephemeral=True)
+
+        # Busca rápida: só ID, título e duração; o stream é resolvido ao tocar
+        results = await self.youtube.search(
+            query, limit=self.SEARCH_RESULTS, flat=True, guild_id=interaction.guild.id
+        )
+        if not results:
+            await interaction.followup.send("❌ Nenhuma música encontrada!", ephemeral=True)
+            return
+
+        view = SearchResultsView(self, interaction.user.id, results)
+        await interaction.followup.send("🔍 Escolha uma música:", view=view, ephemeral=True)
     
+    @app_commands.command(name="library_search", description="Busca nas playlists salvas de todos e toca na hora")
+    @app_commands.describe(query="Palavras do título da música")
+    @app_commands.autocomplete(query=library_autocomplete)
+    async def library_search(self, interaction: discord.Interaction, query: str):
+        """Comando /library_search"""
+        session = self.sessions.get(interaction.guild.id)
+        await interaction.response.defer()
+
+        # Escolhida no autocomplete (URL) ou texto livre: melhor resultado do índice
+        song = self.playlist_manager.library_song(query)
+        if song is None:
+            results = self.playlist_manager.search_library(query, limit=10)
+            song = next((r for r in results if not self.playlist_manager.is_dead(r['url'])), None)
+        if song is None:
+            await interaction.followup.send("❌ Nenhuma música encontrada na biblioteca!", ephemeral=True)
+            return
+
+        if not await self.connect_to_voice(interaction, session):
+            return
+
+        # Já temos URL, título e duração: nada de busca no YouTube
+        await self._enqueue_result(interaction, session, song)
+
     @app_commands.command(name="pause", description="Pausa a música")
     async def pause(self, interaction: discord.Interaction):
         """Comando /pause"""
-        if self.current_voice_client and self.current_voice_client.is_playing():
-            self.current_voice_client.pause()
+        session = self.sessions.get(interaction.guild.id)
+        if session.voice_client and session.voice_client.is_playing():
+            session.voice_client.pause()
             await interaction.response.send_message("⏸️ Música pausada")
         else:
             await interaction.response.send_message("❌ Nenhuma música tocando", ephemeral=True)
@@ -234,8 +771,9 @@ class MusicCog(commands.Cog):
     @app_commands.command(name="resume", description="Retoma a música")
     async def resume(self, interaction: discord.Interaction):
         """Comando /resume"""
-        if self.current_voice_client and self.current_voice_client.is_paused():
-            self.current_voice_client.resume()
+        session = self.sessions.get(interaction.guild.id)
+        if session.voice_client and session.voice_client.is_paused():
+            session.voice_client.resume()
             await interaction.response.send_message("▶️ Música retomada")
         else:
             await interaction.response.send_message("❌ Nenhuma música pausada", ephemeral=True)
@@ -243,12 +781,13 @@ class MusicCog(commands.Cog):
     @app_commands.command(name="skip", description="Vota para pular a música atual")
     async def skip(self, interaction: discord.Interaction):
         """Comando /skip com votação"""
-        if not self.current_voice_client or not self.current_voice_client.is_playing():
+        session = self.sessions.get(interaction.guild.id)
+        if not session.voice_client or not session.voice_client.is_playing():
             await interaction.response.send_message("❌ Nenhuma música tocando", ephemeral=True)
             return
 
         # Verificar se usuário está no canal de voz
-        if not interaction.user.voice or interaction.user.voice.channel != self.current_voice_client.channel:
+        if not interaction.user.voice or interaction.user.voice.channel != session.voice_client.channel:
             await interaction.response.send_message(
                 "❌ Você precisa estar no mesmo canal de voz para votar!",
                 ephemeral=True
@@ -258,7 +797,7 @@ class MusicCog(commands.Cog):
         user_id = interaction.user.id
 
         # Verificar se já votou
-        if user_id in self.skip_votes:
+        if user_id in session.skip_votes:
             await interaction.response.send_message(
                 "❌ Você já votou para pular esta música!",
                 ephemeral=True
@@ -266,28 +805,29 @@ class MusicCog(commands.Cog):
             return
 
         # Adicionar voto
-        self.skip_votes.add(user_id)
-        votes_count = len(self.skip_votes)
+        session.skip_votes.add(user_id)
+        votes_count = len(session.skip_votes)
 
         # Verificar se atingiu votos necessários
-        if votes_count >= self.skip_votes_needed:
-            self.current_voice_client.stop()
-            self.skip_votes.clear()
+        if votes_count >= session.skip_votes_needed:
+            session.stop_playback()
+            session.skip_votes.clear()
             await interaction.response.send_message(
-                f"⏭️ Música pulada! ({votes_count}/{self.skip_votes_needed} votos)"
+                f"⏭️ Música pulada! ({votes_count}/{session.skip_votes_needed} votos)"
             )
         else:
             await interaction.response.send_message(
-                f"🗳️ Voto registrado! ({votes_count}/{self.skip_votes_needed} votos necessários)"
+                f"🗳️ Voto registrado! ({votes_count}/{session.skip_votes_needed} votos necessários)"
             )
 
     @app_commands.command(name="forceskip", description="[Admin] Pula a música sem votação")
     @app_commands.default_permissions(administrator=True)
     async def forceskip(self, interaction: discord.Interaction):
         """Comando /forceskip para administradores"""
-        if self.current_voice_client and self.current_voice_client.is_playing():
-            self.current_voice_client.stop()
-            self.skip_votes.clear()
+        session = self.sessions.get(interaction.guild.id)
+        if session.voice_client and session.voice_client.is_playing():
+            session.stop_playback()
+            session.skip_votes.clear()
             await interaction.response.send_message("⏭️ Música pulada (forçado por admin)")
         else:
             await interaction.response.send_message("❌ Nenhuma música tocando", ephemeral=True)
@@ -295,18 +835,24 @@ class MusicCog(commands.Cog):
     @app_commands.command(name="stop", description="Para a reprodução e limpa a fila")
     async def stop(self, interaction: discord.Interaction):
         """Comando /stop"""
-        if self.current_voice_client:
-            self.current_voice_client.stop()
+        session = self.sessions.get(interaction.guild.id)
+        if session.voice_client:
+            session.stop_playback()
         
-        self.queue.clear()
-        self.is_playing = False
+        # Limpar a fila também interrompe uma importação de playlist em andamento
+        session.queue.clear()
+        session.is_playing = False
+        if session.detail_resolver:
+            session.detail_resolver.cancel()
         
         await interaction.response.send_message("⏹️ Reprodução parada e fila limpa")
     
     @app_commands.command(name="queue", description="Mostra a fila de músicas")
-    async def queue(self, interaction: discord.Interaction):
+    @app_commands.describe(page="Página da fila (10 músicas por página)")
+    async def queue(self, interaction: discord.Interaction, page: int = 1):
         """Comando /queue"""
-        if self.queue.is_empty():
+        session = self.sessions.get(interaction.guild.id)
+        if session.queue.is_empty():
             embed = discord.Embed(
                 title="📋 Fila de Músicas",
                 description="A fila está vazia!",
@@ -318,27 +864,32 @@ class MusicCog(commands.Cog):
                 color=0x00FF00
             )
             
-            if self.queue.current_song():
+            if session.queue.current_song():
                 embed.add_field(
                     name="🎵 Tocando agora",
-                    value=str(self.queue.current_song()),
+                    value=str(session.queue.current_song()),
                     inline=False
                 )
             
-            queue_songs = self.queue.get_queue()
+            # Só a página pedida é copiada da fila
+            queue_size = session.queue.size()
+            pages = max((queue_size + self.QUEUE_PAGE_SIZE - 1) // self.QUEUE_PAGE_SIZE, 1)
+            page = min(max(page, 1), pages)
+            start = (page - 1) * self.QUEUE_PAGE_SIZE
+            queue_songs = session.queue.get_slice(start, start + self.QUEUE_PAGE_SIZE)
             queue_text = "\n".join(
-                f"{i+1}. {song}"
-                for i, song in enumerate(queue_songs[:10])
+                f"{start + i + 1}. {song}"
+                for i, song in enumerate(queue_songs)
             )
             
             if queue_songs:
                 embed.add_field(
-                    name=f"Próximas ({len(queue_songs)})",
+                    name=f"Próximas ({queue_size}) — página {page}/{pages}",
                     value=queue_text or "Vazio",
                     inline=False
                 )
             
-            total_h, total_m, total_s = self.queue.total_duration()
+            total_h, total_m, total_s = session.queue.total_duration()
             embed.set_footer(
                 text=f"Duração total: {total_h}h {total_m}m {total_s}s"
             )
@@ -348,7 +899,8 @@ class MusicCog(commands.Cog):
     @app_commands.command(name="now", description="Mostra a música tocando agora")
     async def now(self, interaction: discord.Interaction):
         """Comando /now"""
-        current = self.queue.current_song()
+        session = self.sessions.get(interaction.guild.id)
+        current = session.queue.current_song()
         
         if not current:
             await interaction.response.send_message(
@@ -367,10 +919,37 @@ class MusicCog(commands.Cog):
         
         await interaction.response.send_message(embed=embed)
     
+    @app_commands.command(name="history", description="Mostra as músicas tocadas recentemente")
+    @app_commands.describe(days="Buscar no histórico dos últimos N dias (padrão: só as recentes)")
+    async def history(self, interaction: discord.Interaction, days: int = 0):
+        """Comando /history"""
+        session = self.sessions.get(interaction.guild.id)
+
+        if days > 0:
+            # Registro em disco pode ser grande: lê fora do event loop
+            entries = await session.queue.history.read_since(time.time() - days * 86400)
+            lines = [
+                f"<t:{int(entry['played_at'])}:R> **{entry['title']}** - {entry['requester']}"
+                for entry in reversed(entries[-self.QUEUE_PAGE_SIZE:])
+            ]
+            title = f"📜 Tocadas nos últimos {days} dias ({len(entries)})"
+        else:
+            songs = session.queue.get_history(self.QUEUE_PAGE_SIZE)
+            lines = [str(song) for song in reversed(songs)]
+            title = "📜 Tocadas recentemente"
+
+        embed = discord.Embed(
+            title=title,
+            description="\n".join(lines) or "Nenhuma música no histórico!",
+            color=0x00FF00 if lines else 0xFF0000
+        )
+        await interaction.response.send_message(embed=embed)
+
     @app_commands.command(name="volume", description="Ajusta o volume (0-200)")
     @app_commands.describe(level="Nível de volume (0-200)")
     async def volume(self, interaction: discord.Interaction, level: int):
         """Comando /volume"""
+        session = self.sessions.get(interaction.guild.id)
         if not (0 <= level <= 200):
             await interaction.response.send_message(
                 "❌ Volume deve estar entre 0 e 200",
@@ -379,12 +958,17 @@ class MusicCog(commands.Cog):
             return
 
         # Salvar volume atual
-        self.current_volume = level / 100
+        session.volume = level / 100
 
-        if self.current_voice_client and self.current_voice_client.source:
+        source = session.voice_client.source if session.voice_client else None
+        if source:
             # Aplicar volume à música atual
-            if isinstance(self.current_voice_client.source, discord.PCMVolumeTransformer):
-                self.current_voice_client.source.volume = self.current_volume
+            if isinstance(source, GaplessSource) and not source.set_volume(session.volume):
+                # Passthrough não escala volume: troca para transcodificação na mesma posição
+                await interaction.response.send_message(f"🔊 Volume ajustado para {level}%")
+                if session.volume != 1.0:
+                    await self._switch_to_transcode(session, source.current)
+                return
             await interaction.response.send_message(f"🔊 Volume ajustado para {level}%")
         else:
             # Volume será aplicado na próxima música
@@ -393,6 +977,174 @@ class MusicCog(commands.Cog):
                 ephemeral=True
             )
 
+    async def _switch_to_transcode(self, session: GuildSession, source: TrackedSource):
+        """Reabre a música atual em modo PCM (com volume) a partir da posição atual"""
+        song = session.queue.current_song()
+        if not song or not session.is_connected():
+            return
+
+        video_id = YouTubePlayer.extract_video_id(song.url)
+        stream_url = self.audio_cache.path_for(video_id) if self.audio_cache and video_id else None
+        if not stream_url:
+            stream_url = song.fresh_stream_url(self.youtube.stream_cache.safety_margin)
+        if not stream_url:
+            stream_url = await self.youtube.get_stream_url(song.url, guild_id=session.guild_id)
+        if not stream_url or session.gapless is None or session.gapless.current is not source:
+            return  # Sem stream ou a música mudou enquanto buscava
+
+        try:
+            new_source = await self.audio.create(
+                stream_url, session.volume, codec=None, seek=source.position, guild_id=session.guild_id
+            )
+        except TranscodeLimitError as e:
+            logger.warning(f"Volume mantido em 100% (guild {session.guild_id}): {e}")
+            return
+        if session.gapless is None or session.gapless.current is not source:
+            new_source.cleanup()  # A música mudou enquanto esperava vaga de transcodificação
+            return
+        swap_source(session.voice_client, new_source)
+        logger.info(f"Passthrough trocado por transcodificação em {source.position:.1f}s (guild {session.guild_id})")
+
+    @app_commands.command(name="sessions", description="[Admin] Mostra sessões de reprodução ativas")
+    @app_commands.default_permissions(administrator=True)
+    async def sessions_info(self, interaction: discord.Interaction):
+        """Comando /sessions"""
+        usage = self.sessions.memory_usage()
+        total_kb = sum(usage.values()) / 1024
+
+        embed = discord.Embed(
+            title="🎛️ Sessões de Reprodução",
+            description=f"{len(self.sessions)} sessões ativas ({total_kb:.1f} KB)",
+            color=0x00FF00
+        )
+
+        current = self.sessions.peek(interaction.guild.id)
+        if current:
+            gap_text = ""
+            for label, gapless in (("a frio", False), ("sem pausa", True)):
+                average_gap = current.average_gap(gapless)
+                if average_gap is not None:
+                    gap_text += f", silêncio {label} {average_gap * 1000:.1f}ms"
+            embed.add_field(
+                name="Este servidor",
+                value=f"{current.queue.size()} na fila, {usage.get(current.guild_id, 0) / 1024:.1f} KB{gap_text}",
+                inline=False
+            )
+
+        stream_stats = self.youtube.stream_cache.stats()
+        embed.add_field(
+            name="Cache de streams",
+            value=f"{stream_stats['size']} URLs, {stream_stats['hits']} acertos / {stream_stats['misses']} erros "
+                  f"({stream_stats['hit_rate']:.0%}), {stream_stats['refreshes']} renovadas",
+            inline=False
+        )
+
+        pool = self.youtube.extractor.pool_stats()
+        embed.add_field(
+            name=f"Extração ({self.youtube.extractor.name})",
+            value=f"{pool['created']} instâncias YoutubeDL, {pool['reused']} reusos "
+                  f"(~{pool['setup_ms_avg']:.0f}ms cada, {pool['setup_seconds_saved']:.1f}s economizados)",
+            inline=False
+        )
+
+        if self.audio_cache:
+            audio_stats = self.audio_cache.stats()
+            embed.add_field(
+                name="Cache de áudio local",
+                value=f"{audio_stats['files']} arquivos, {audio_stats['bytes'] / 1024 ** 2:.0f}/"
+                      f"{self.audio_cache.max_bytes / 1024 ** 2:.0f} MB, {audio_stats['hit_rate']:.0%} acertos",
+                inline=False
+            )
+
+        if self.youtube.metadata_cache:
+            stats = self.youtube.metadata_cache.stats()
+            embed.add_field(
+                name="Cache de metadados",
+                value=f"{stats['size']} vídeos, {stats['hits']} acertos / {stats['misses']} erros "
+                      f"({stats['hit_rate']:.0%})",
+                inline=False
+            )
+
+        write_stats = self.playlist_manager.stats()
+        if write_stats:
+            embed.add_field(
+                name=f"Gravação de playlists ({self.playlist_manager.store.name})",
+                value=f"{write_stats['writes']} gravações, {write_stats['coalesced']} mudanças agrupadas, "
+                      f"{write_stats['pending']} pendentes, atraso médio {write_stats['flush_latency_ms_avg']:.0f}ms "
+                      f"(máx. {write_stats['flush_latency_ms_max']:.0f}ms)",
+                inline=False
+            )
+
+        embed.add_field(
+            name="Biblioteca",
+            value=f"{len(self.playlist_manager.library.docs)} vídeos, "
+                  f"{len(self.playlist_manager.library.postings)} palavras indexadas",
+            inline=False
+        )
+
+        scheduler_stats = self.youtube.scheduler.stats()
+        embed.add_field(
+            name=f"Fila de extração ({scheduler_stats['running']} em andamento)",
+            value="\n".join(
+                f"{lane}: {stats['queued']} aguardando, {stats['dispatched']} liberadas, "
+                f"espera média {stats['wait_ms_avg']:.0f}ms (p95 {stats['wait_ms_p95']:.0f}ms)"
+                for lane, stats in scheduler_stats['lanes'].items()
+            ),
+            inline=False
+        )
+
+        guard_stats = self.youtube.guard.stats()
+        latency_text = ", ".join(
+            f"{op} p95 {stats['p95_ms']:.0f}ms / p99 {stats['p99_ms']:.0f}ms"
+            for op, stats in guard_stats['latencies'].items()
+        )
+        embed.add_field(
+            name=f"Resiliência da extração (disjuntor: {guard_stats['breaker']})",
+            value=f"{guard_stats['hedged']} hedges ({guard_stats['hedge_wins']} venceram), "
+                  f"{guard_stats['timeouts']} prazos esgotados, {guard_stats['short_circuited']} recusadas"
+                  + (f"\n{latency_text}" if latency_text else ""),
+            inline=False
+        )
+
+        ffmpeg_stats = self.audio.supervisor.stats()
+        first_frame_text = ", ".join(
+            f"{kind} p50 {stats['p50_ms']:.0f}ms / p95 {stats['p95_ms']:.0f}ms"
+            for kind, stats in ffmpeg_stats['first_frame'].items()
+        )
+        limit = ffmpeg_stats['max_transcodes'] or "∞"
+        warm_text = (
+            f", {ffmpeg_stats['warm_idle']} pré-iniciados ({ffmpeg_stats['warm_hits']} usados)"
+            if self.audio.supervisor.pool else ""
+        )
+        embed.add_field(
+            name="FFmpeg",
+            value=f"{ffmpeg_stats['live']} processos ({ffmpeg_stats['transcodes']}/{limit} transcodificando), "
+                  f"{ffmpeg_stats['transcode_waits']} esperas por vaga, {ffmpeg_stats['orphans_killed']} encerrados "
+                  f"ao desconectar{warm_text}"
+                  + (f"\nPrimeiro frame: {first_frame_text}" if first_frame_text else ""),
+            inline=False
+        )
+
+        link_stats = self.link_validator.stats()
+        embed.add_field(
+            name="Verificação de links",
+            value=f"{link_stats['checked']} verificados, {self.playlist_manager.dead_count()} indisponíveis, "
+                  f"{link_stats['refreshed']} atualizados, {link_stats['deferred']} rodadas adiadas",
+            inline=False
+        )
+
+        query_stats = self.youtube.query_cache.stats()
+        flight_stats = self.youtube.inflight.stats()
+        embed.add_field(
+            name="Cache de buscas",
+            value=f"{query_stats['size']} consultas, {query_stats['hit_rate']:.0%} acertos "
+                  f"({query_stats['negative_hits']} sem resultado), "
+                  f"{flight_stats['coalesced']}/{flight_stats['calls']} extrações agrupadas",
+            inline=False
+        )
+
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
     # ===== COMANDOS DE PLAYLIST =====
 
     @app_commands.command(name="playlist_create", description="Cria uma nova playlist")
@@ -401,7 +1153,7 @@ class MusicCog(commands.Cog):
         """Comando /playlist_create"""
         user_id = str(interaction.user.id)
 
-        if self.playlist_manager.create_playlist(user_id, name, interaction.user.name):
+        if await self.playlist_manager.create_playlist(user_id, name, interaction.user.name):
             await interaction.response.send_message(
                 f"✅ Playlist **{name}** criada com sucesso!",
                 ephemeral=True
@@ -414,11 +1166,12 @@ class MusicCog(commands.Cog):
 
     @app_commands.command(name="playlist_delete", description="Deleta uma playlist")
     @app_commands.describe(name="Nome da playlist")
+    @app_commands.autocomplete(name=playlist_name_autocomplete)
     async def playlist_delete(self, interaction: discord.Interaction, name: str):
         """Comando /playlist_delete"""
         user_id = str(interaction.user.id)
 
-        if self.playlist_manager.delete_playlist(user_id, name):
+        if await self.playlist_manager.delete_playlist(user_id, name):
             await interaction.response.send_message(
                 f"✅ Playlist **{name}** deletada com sucesso!",
                 ephemeral=True
@@ -434,6 +1187,7 @@ class MusicCog(commands.Cog):
         playlist="Nome da playlist",
         query="Nome ou URL da música"
     )
+    @app_commands.autocomplete(playlist=playlist_name_autocomplete, query=saved_song_autocomplete)
     async def playlist_add(self, interaction: discord.Interaction, playlist: str, query: str):
         """Comando /playlist_add"""
         await interaction.response.defer(ephemeral=True)
@@ -441,15 +1195,15 @@ class MusicCog(commands.Cog):
         user_id = str(interaction.user.id)
 
         # Verificar se playlist existe
-        if not self.playlist_manager.get_playlist(user_id, playlist):
+        if not await self.playlist_manager.get_playlist(user_id, playlist):
             await interaction.followup.send(
                 f"❌ Playlist **{playlist}** não encontrada!",
                 ephemeral=True
             )
             return
 
-        # Buscar música
-        results = await self.youtube.search(query, limit=1)
+        # Buscar música (a playlist só guarda URL, título e duração)
+        results = await self.youtube.search(query, limit=1, flat=True, guild_id=interaction.guild.id)
         if not results:
             await interaction.followup.send(
                 "❌ Nenhuma música encontrada!",
@@ -464,7 +1218,7 @@ class MusicCog(commands.Cog):
             duration=result['duration']
         )
 
-        if self.playlist_manager.add_song(user_id, playlist, song):
+        if await self.playlist_manager.add_song(user_id, playlist, song):
             await interaction.followup.send(
                 f"✅ **{song.title}** adicionada à playlist **{playlist}**!",
                 ephemeral=True
@@ -475,17 +1229,57 @@ class MusicCog(commands.Cog):
                 ephemeral=True
             )
 
+    @app_commands.command(name="playlist_import", description="Importa uma playlist do YouTube")
+    @app_commands.describe(
+        playlist="Nome da playlist (criada se não existir)",
+        url="URL da playlist do YouTube"
+    )
+    @app_commands.autocomplete(playlist=playlist_name_autocomplete)
+    async def playlist_import(self, interaction: discord.Interaction, playlist: str, url: str):
+        """Comando /playlist_import"""
+        await interaction.response.defer(ephemeral=True)
+
+        if not YouTubePlayer.is_playlist(url):
+            await interaction.followup.send("❌ URL de playlist do YouTube inválida!", ephemeral=True)
+            return
+
+        user_id = str(interaction.user.id)
+        if not await self.playlist_manager.get_playlist(user_id, playlist):
+            await self.playlist_manager.create_playlist(user_id, playlist, interaction.user.name)
+
+        # Grava em lotes conforme as páginas chegam, em vez de uma vez por música
+        imported = 0
+        batch = []
+        async for entry in self.youtube.iter_playlist(url, limit=self.playlist_max_songs):
+            batch.append(PlaylistSong(url=entry['url'], title=entry['title'], duration=entry['duration']))
+            if len(batch) >= self.IMPORT_BATCH_SIZE:
+                await self.playlist_manager.add_songs(user_id, playlist, batch)
+                imported += len(batch)
+                batch = []
+        if batch:
+            await self.playlist_manager.add_songs(user_id, playlist, batch)
+            imported += len(batch)
+
+        if imported:
+            await interaction.followup.send(
+                f"✅ {imported} músicas importadas para a playlist **{playlist}**!",
+                ephemeral=True
+            )
+        else:
+            await interaction.followup.send("❌ Nenhuma música encontrada na playlist!", ephemeral=True)
+
     @app_commands.command(name="playlist_remove", description="Remove música da playlist")
     @app_commands.describe(
         playlist="Nome da playlist",
         index="Posição da música (começa em 1)"
     )
+    @app_commands.autocomplete(playlist=playlist_name_autocomplete)
     async def playlist_remove(self, interaction: discord.Interaction, playlist: str, index: int):
         """Comando /playlist_remove"""
         user_id = str(interaction.user.id)
 
         # Converter índice de 1-indexed para 0-indexed
-        if self.playlist_manager.remove_song(user_id, playlist, index - 1):
+        if await self.playlist_manager.remove_song(user_id, playlist, index - 1):
             await interaction.response.send_message(
                 f"✅ Música #{index} removida da playlist **{playlist}**!",
                 ephemeral=True
@@ -500,7 +1294,7 @@ class MusicCog(commands.Cog):
     async def playlist_list(self, interaction: discord.Interaction):
         """Comando /playlist_list"""
         user_id = str(interaction.user.id)
-        playlists = self.playlist_manager.get_user_playlists(user_id)
+        playlists = await self.playlist_manager.get_user_playlists(user_id)
 
         if not playlists:
             await interaction.response.send_message(
@@ -515,7 +1309,7 @@ class MusicCog(commands.Cog):
         )
 
         for name in playlists:
-            playlist = self.playlist_manager.get_playlist(user_id, name)
+            playlist = await self.playlist_manager.get_playlist(user_id, name)
             if playlist:
                 embed.add_field(
                     name=name,
@@ -527,10 +1321,11 @@ class MusicCog(commands.Cog):
 
     @app_commands.command(name="playlist_show", description="Mostra músicas de uma playlist")
     @app_commands.describe(playlist="Nome da playlist")
+    @app_commands.autocomplete(playlist=playlist_name_autocomplete)
     async def playlist_show(self, interaction: discord.Interaction, playlist: str):
         """Comando /playlist_show"""
         user_id = str(interaction.user.id)
-        pl = self.playlist_manager.get_playlist(user_id, playlist)
+        pl = await self.playlist_manager.get_playlist(user_id, playlist)
 
         if not pl:
             await interaction.response.send_message(
@@ -553,7 +1348,8 @@ class MusicCog(commands.Cog):
         )
 
         songs_text = "\n".join(
-            f"{i+1}. **{song.title}** ({YouTubePlayer.format_duration(song.duration)})"
+            f"{i+1}. {'💀 ' if self.playlist_manager.is_dead(song.url) else ''}"
+            f"**{song.title}** ({YouTubePlayer.format_duration(song.duration)})"
             for i, song in enumerate(pl.songs[:10])
         )
 
@@ -563,6 +1359,10 @@ class MusicCog(commands.Cog):
             inline=False
         )
 
+        dead = sum(1 for song in pl.songs if self.playlist_manager.is_dead(song.url))
+        if dead:
+            embed.add_field(name="💀 Indisponíveis", value=f"{dead} músicas não existem mais no YouTube", inline=False)
+
         if len(pl.songs) > 10:
             embed.set_footer(text=f"Mostrando 10 de {len(pl.songs)} músicas")
 
@@ -570,42 +1370,43 @@ class MusicCog(commands.Cog):
 
     @app_commands.command(name="playlist_load", description="Carrega uma playlist na fila")
     @app_commands.describe(playlist="Nome da playlist")
+    @app_commands.autocomplete(playlist=playlist_name_autocomplete)
     async def playlist_load(self, interaction: discord.Interaction, playlist: str):
         """Comando /playlist_load"""
+        session = self.sessions.get(interaction.guild.id)
         await interaction.response.defer()
 
         # Conectar ao canal de voz
-        if not await self.connect_to_voice(interaction):
+        if not await self.connect_to_voice(interaction, session):
             return
 
         user_id = str(interaction.user.id)
-        pl = self.playlist_manager.get_playlist(user_id, playlist)
+        summary = await self.playlist_manager.playlist_summary(user_id, playlist)
 
-        if not pl:
+        if summary is None:
             await interaction.followup.send(
                 f"❌ Playlist **{playlist}** não encontrada!",
                 ephemeral=True
             )
             return
 
-        if not pl.songs:
+        added_count, total_seconds = summary
+        if not added_count:
             await interaction.followup.send(
                 f"❌ Playlist **{playlist}** está vazia!",
                 ephemeral=True
             )
             return
 
-        # Adicionar todas as músicas à fila
-        added_count = 0
-        for playlist_song in pl.songs:
-            song = Song(
-                url=playlist_song.url,
-                title=playlist_song.title,
-                duration=playlist_song.duration,
-                requester=interaction.user.name
-            )
-            self.queue.add(song)
-            added_count += 1
+        # A fila guarda um cursor para a playlist e só cria as músicas
+        # (compartilhando o Track) conforme a reprodução se aproxima
+        source = LazySource(
+            functools.partial(self.playlist_manager.get_songs_page, user_id, playlist),
+            count=added_count,
+            total_seconds=total_seconds,
+            requester=interaction.user.name
+        )
+        session.queue.add_lazy(source)
 
         embed = discord.Embed(
             title="✅ Playlist Carregada",
@@ -613,13 +1414,51 @@ class MusicCog(commands.Cog):
             color=0x00FF00
         )
         embed.add_field(name="Músicas adicionadas", value=str(added_count), inline=True)
+        embed.add_field(name="Duração total", value=YouTubePlayer.format_duration(total_seconds), inline=True)
         embed.add_field(name="Solicitado por", value=interaction.user.mention, inline=True)
 
         await interaction.followup.send(embed=embed)
 
         # Se nada está tocando, iniciar reprodução
-        if not self.is_playing:
-            await self.next_song()
+        if not session.is_playing:
+            await self.next_song(session)
+
+class SearchResultsView(discord.ui.View):
+    """Lista de resultados do /search para o usuário escolher"""
+
+    def __init__(self, cog: MusicCog, user_id: int, results: list):
+        super().__init__(timeout=60)
+        self.cog = cog
+        self.user_id = user_id
+        self.results = results
+
+        select = discord.ui.Select(
+            placeholder="Selecione uma música",
+            options=[
+                discord.SelectOption(
+                    label=result['title'][:100] if result['title'] else result['id'],
+                    description=YouTubePlayer.format_duration(result['duration']),
+                    value=str(i)
+                )
+                for i, result in enumerate(results)
+            ]
+        )
+        select.callback = self.on_select
+        self.add_item(select)
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        return interaction.user.id == self.user_id
+
+    async def on_select(self, interaction: discord.Interaction):
+        result = self.results[int(interaction.data['values'][0])]
+        self.stop()
+        await interaction.response.edit_message(content=f"🎵 Selecionada: **{result['title']}**", view=None)
+
+        session = self.cog.sessions.get(interaction.guild.id)
+        if not await self.cog.connect_to_voice(interaction, session):
+            return
+        await self.cog._enqueue_result(interaction, session, result)
+
 
 async def setup(bot):
     """Função de setup do cog"""
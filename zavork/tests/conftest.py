@@ -0,0 +1,5 @@
+"""Os módulos do bot são importados a partir de zavork/ (ex.: `from utils.queue import ...`)"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,64 @@
+"""Estados do CircuitBreaker"""
+import pytest
+
+from utils import resilience
+from utils.resilience import CircuitBreaker
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Relógio controlado pelo teste (substitui time.monotonic do módulo)"""
+    now = [1000.0]
+    monkeypatch.setattr(resilience.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_abre_apos_falhas_seguidas(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    assert breaker.opens == 1
+
+
+def test_sucesso_zera_a_contagem(clock):
+    breaker = CircuitBreaker(failure_threshold=2)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.closed
+
+
+def test_meio_aberto_libera_uma_chamada_de_teste(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock[0] += 30
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()
+
+    # Teste sem resposta por um período inteiro: outra chamada pode testar
+    clock[0] += 30
+    assert breaker.allow()
+
+    breaker.record_success()
+    assert breaker.closed and breaker.allow()
+
+
+def test_teste_que_falha_reabre_por_mais_um_periodo(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock[0] += 30
+    assert breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    clock[0] += 29
+    assert not breaker.allow()
+    clock[0] += 1
+    assert breaker.allow()
+    assert breaker.opens == 1
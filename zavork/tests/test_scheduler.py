@@ -0,0 +1,123 @@
+"""Ordem de liberação do ExtractionScheduler"""
+import asyncio
+
+from utils.scheduler import BACKGROUND, INTERACTIVE, PLAYBACK, ExtractionScheduler
+
+
+async def _occupy(scheduler: ExtractionScheduler, lane: str = INTERACTIVE):
+    """Ocupa uma vaga até o evento devolvido ser disparado"""
+    gate = asyncio.Event()
+    task = asyncio.create_task(scheduler.run(lane, 'busy', gate.wait))
+    await asyncio.sleep(0)
+    return gate, task
+
+
+def _queue(scheduler: ExtractionScheduler, order: list, lane: str, guild_id, name: str, key=None):
+    async def work():
+        order.append(name)
+    return asyncio.create_task(scheduler.run(lane, guild_id, work, key=key))
+
+
+def test_fila_mais_prioritaria_primeiro():
+    async def main():
+        scheduler = ExtractionScheduler(concurrency=1)
+        gate, busy = await _occupy(scheduler)
+        order = []
+        tasks = [
+            _queue(scheduler, order, BACKGROUND, 'g', 'fundo'),
+            _queue(scheduler, order, PLAYBACK, 'g', 'reprodução'),
+            _queue(scheduler, order, INTERACTIVE, 'g', 'interativa'),
+        ]
+        await asyncio.sleep(0)
+        gate.set()
+        await asyncio.gather(busy, *tasks)
+        assert order == ['interativa', 'reprodução', 'fundo']
+        assert scheduler.running == 0
+    asyncio.run(main())
+
+
+def test_rodizio_entre_servidores():
+    async def main():
+        scheduler = ExtractionScheduler(concurrency=1)
+        gate, busy = await _occupy(scheduler)
+        order = []
+        tasks = [_queue(scheduler, order, BACKGROUND, 'a', f'a{i}') for i in range(3)]
+        tasks.append(_queue(scheduler, order, BACKGROUND, 'b', 'b0'))
+        await asyncio.sleep(0)
+        gate.set()
+        await asyncio.gather(busy, *tasks)
+        assert order == ['a0', 'b0', 'a1', 'a2']
+    asyncio.run(main())
+
+
+def test_fundo_nao_ocupa_a_vaga_reservada():
+    async def main():
+        scheduler = ExtractionScheduler(concurrency=2, reserved=1)
+        gate, busy = await _occupy(scheduler, BACKGROUND)
+        order = []
+        waiting = _queue(scheduler, order, BACKGROUND, 'g', 'fundo')
+        await asyncio.sleep(0)
+        assert order == [] and scheduler.running == 1
+
+        # A vaga reservada continua livre para um /play
+        await _queue(scheduler, order, INTERACTIVE, 'g', 'interativa')
+        assert order == ['interativa']
+
+        gate.set()
+        await asyncio.gather(busy, waiting)
+        assert order == ['interativa', 'fundo']
+    asyncio.run(main())
+
+
+def test_promote_sobe_pedido_que_ja_esperava():
+    async def main():
+        scheduler = ExtractionScheduler(concurrency=1)
+        gate, busy = await _occupy(scheduler)
+        order = []
+        tasks = [
+            _queue(scheduler, order, BACKGROUND, 'g', 'promovido', key='video'),
+            _queue(scheduler, order, PLAYBACK, 'g', 'reprodução'),
+        ]
+        await asyncio.sleep(0)
+        scheduler.promote('video', INTERACTIVE)
+        scheduler.promote('desconhecido', INTERACTIVE)
+        gate.set()
+        await asyncio.gather(busy, *tasks)
+        assert order == ['promovido', 'reprodução']
+        assert scheduler.promoted == 1
+    asyncio.run(main())
+
+
+def test_cancelar_na_fila_nao_executa_nem_prende_vaga():
+    async def main():
+        scheduler = ExtractionScheduler(concurrency=1)
+        gate, busy = await _occupy(scheduler)
+        order = []
+        cancelled = _queue(scheduler, order, PLAYBACK, 'g', 'cancelado', key='video')
+        other = _queue(scheduler, order, PLAYBACK, 'g', 'outro')
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await asyncio.sleep(0)
+        assert scheduler.stats()['lanes'][PLAYBACK]['queued'] == 1
+
+        gate.set()
+        await asyncio.gather(busy, other)
+        assert cancelled.cancelled()
+        assert order == ['outro']
+        assert scheduler.running == 0
+    asyncio.run(main())
+
+
+def test_vaga_volta_so_quando_o_trabalho_termina():
+    async def main():
+        scheduler = ExtractionScheduler(concurrency=1)
+        gate, busy = await _occupy(scheduler)
+        # Quem esperava desistiu, mas o trabalho segue ocupando a vaga
+        busy.cancel()
+        await asyncio.sleep(0)
+        assert scheduler.running == 1
+        gate.set()
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        assert scheduler.running == 0
+    asyncio.run(main())
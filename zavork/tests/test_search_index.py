@@ -0,0 +1,128 @@
+"""Índices de autocomplete e busca das playlists"""
+from utils.search_index import InvertedIndex, PrefixIndex, apply_changes, normalize
+
+
+def test_normalize():
+    assert normalize('  Canção   do  MAR ') == 'cancao do mar'
+
+
+class TestPrefixIndex:
+    def test_busca_pelo_inicio_de_qualquer_palavra(self):
+        index = PrefixIndex()
+        index.add('u1', 'playlist', 'Rock Nacional')
+        index.add('u1', 'playlist', 'Classic Rock')
+        index.add('u1', 'playlist', 'Jazz')
+
+        assert sorted(text for text, _ in index.search('u1', 'playlist', 'rock')) == ['Classic Rock', 'Rock Nacional']
+        assert index.search('u1', 'playlist', 'JA') == [('Jazz', '')]
+        assert index.search('u1', 'playlist', 'pop') == []
+
+    def test_ignora_acentos_e_separa_usuarios_e_tipos(self):
+        index = PrefixIndex()
+        index.add('u1', 'song', 'Canção Nova', 'url-1')
+
+        assert index.search('u1', 'song', 'cancao') == [('Canção Nova', 'url-1')]
+        assert index.search('u2', 'song', 'cancao') == []
+        assert index.search('u1', 'playlist', 'cancao') == []
+
+    def test_remove_uma_ocorrencia(self):
+        index = PrefixIndex()
+        index.add('u1', 'song', 'Mesma Música', 'url-1')
+        index.add('u1', 'song', 'Mesma Música', 'url-1')
+
+        index.remove('u1', 'song', 'Mesma Música', 'url-1')
+        assert index.search('u1', 'song', 'mesma') == [('Mesma Música', 'url-1')]
+        index.remove('u1', 'song', 'Mesma Música', 'url-1')
+        assert index.search('u1', 'song', 'mesma') == []
+        assert index.size() == 0
+
+    def test_limite(self):
+        index = PrefixIndex()
+        for i in range(40):
+            index.add('u1', 'playlist', f'Lista {i}')
+        assert len(index.search('u1', 'playlist', 'lista', limit=25)) == 25
+
+    def test_mudancas_aplicadas_reproduzem_o_indice(self):
+        index = PrefixIndex()
+        index.add('u1', 'playlist', 'Rock')
+        index.add('u2', 'playlist', 'Samba')
+        saved = {}
+        apply_changes(saved, index.take_changes())
+        assert saved == index.to_dict()
+
+        # Só a lista alterada vem na próxima leitura; lista esvaziada vem como None
+        index.remove('u2', 'playlist', 'Samba')
+        index.add('u1', 'song', 'Forró', 'url-1')
+        changes = index.take_changes()
+        assert set(changes) == {'u2\x1fplaylist', 'u1\x1fsong'}
+        assert changes['u2\x1fplaylist'] is None
+        apply_changes(saved, changes)
+        assert saved == index.to_dict()
+        assert index.take_changes() == {}
+
+        restored = PrefixIndex.from_dict(saved)
+        assert restored.search('u1', 'song', 'forro') == [('Forró', 'url-1')]
+        assert restored.search('u2', 'playlist', 'samba') == []
+
+
+class TestInvertedIndex:
+    def test_todas_as_palavras_com_a_ultima_como_prefixo(self):
+        index = InvertedIndex()
+        index.add('url-1', 'Aquarela do Brasil', 180)
+        index.add('url-2', 'Aquarela', 200)
+        index.add('url-3', 'Brasileirinho', 120)
+
+        assert [r['url'] for r in index.search('aquarela bra')] == ['url-1']
+        assert sorted(r['url'] for r in index.search('bras')) == ['url-1', 'url-3']
+        assert index.search('samba') == []
+        assert index.search('') == []
+
+    def test_referencias_ordenam_e_controlam_remocao(self):
+        index = InvertedIndex()
+        index.add('url-1', 'Samba A', 100)
+        index.add('url-2', 'Samba B', 100)
+        index.add('url-2', 'Samba B', 100)
+
+        assert [r['url'] for r in index.search('samba')] == ['url-2', 'url-1']
+        assert index.get('url-2')['refs'] == 2
+
+        index.remove('url-2')
+        assert index.get('url-2')['refs'] == 1
+        index.remove('url-2')
+        assert index.get('url-2') is None
+        assert [r['url'] for r in index.search('samba')] == ['url-1']
+
+    def test_update_troca_titulo_e_mantem_referencias(self):
+        index = InvertedIndex()
+        index.add('url-1', 'Titulo Antigo', 100)
+        index.add('url-1', 'Titulo Antigo', 100)
+
+        index.update('url-1', 'Nome Novo', 150)
+        assert index.search('antigo') == []
+        assert index.search('novo') == [{'url': 'url-1', 'title': 'Nome Novo', 'duration': 150, 'refs': 2}]
+
+    def test_mudancas_aplicadas_reproduzem_o_indice(self):
+        index = InvertedIndex()
+        index.add('url-1', 'Choro Antigo', 100)
+        index.add('url-2', 'Choro Novo', 90)
+        saved = {'docs': {}, 'postings': {}}
+
+        def save():
+            changes = index.take_changes()
+            apply_changes(saved['docs'], changes['docs'])
+            apply_changes(saved['postings'], changes['postings'])
+
+        save()
+        index.remove('url-1')
+        index.add('url-3', 'Frevo', 80)
+        save()
+
+        expected = index.to_dict()
+        assert saved['docs'] == expected['docs']
+        assert {token: set(urls) for token, urls in saved['postings'].items()} == \
+               {token: set(urls) for token, urls in expected['postings'].items()}
+        assert 'antigo' not in saved['postings']
+
+        restored = InvertedIndex.from_dict(saved)
+        assert [r['url'] for r in restored.search('choro')] == ['url-2']
+        assert [r['url'] for r in restored.search('fre')] == ['url-3']
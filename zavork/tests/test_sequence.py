@@ -0,0 +1,83 @@
+"""ChunkedList comparada com uma list comum"""
+import random
+
+import pytest
+
+from utils.sequence import ChunkedList
+
+
+def assert_same(seq: ChunkedList, expected: list) -> None:
+    assert len(seq) == len(expected)
+    assert bool(seq) == bool(expected)
+    assert list(seq) == expected
+    for i in range(len(expected)):
+        assert seq[i] == expected[i]
+        assert seq[-i - 1] == expected[-i - 1]
+
+
+def test_operacoes_aleatorias_batem_com_list():
+    # Blocos pequenos para dividir e unir blocos o tempo todo
+    rng = random.Random(1234)
+    seq = ChunkedList(range(50), load=4)
+    expected = list(range(50))
+    counter = 50
+
+    for _ in range(2000):
+        op = rng.random()
+        if op < 0.3:
+            index = rng.randint(-len(expected) - 2, len(expected) + 2)
+            seq.insert(index, counter)
+            expected.insert(index, counter)
+            counter += 1
+        elif op < 0.45:
+            seq.append(counter)
+            expected.append(counter)
+            counter += 1
+        elif op < 0.5:
+            items = list(range(counter, counter + rng.randint(0, 12)))
+            seq.extend(items)
+            expected.extend(items)
+            counter += len(items)
+        elif op < 0.8 and expected:
+            index = rng.randrange(-len(expected), len(expected))
+            assert seq.pop(index) == expected.pop(index)
+        elif expected:
+            source = rng.randrange(len(expected))
+            destination = rng.randrange(len(expected))
+            item = expected.pop(source)
+            expected.insert(destination, item)
+            assert seq.move(source, destination) == item
+        if rng.random() < 0.05:
+            assert_same(seq, expected)
+
+    assert_same(seq, expected)
+
+
+def test_fatias():
+    seq = ChunkedList(range(100), load=4)
+    expected = list(range(100))
+    for start, stop in [(0, 10), (7, 33), (95, 200), (-5, 3), (50, 50), (60, 40)]:
+        assert seq.slice(start, stop) == expected[max(start, 0):stop]
+    assert seq[10:20] == expected[10:20]
+    assert seq[-10:] == expected[-10:]
+    assert seq[::3] == expected[::3]
+
+
+def test_indice_fora_da_sequencia():
+    seq = ChunkedList([1, 2, 3])
+    with pytest.raises(IndexError):
+        seq[3]
+    with pytest.raises(IndexError):
+        seq[-4]
+    with pytest.raises(IndexError):
+        ChunkedList().pop()
+
+
+def test_clear_e_replace_all():
+    seq = ChunkedList(range(20), load=4)
+    seq.clear()
+    assert_same(seq, [])
+    seq.append('a')
+    assert_same(seq, ['a'])
+    seq.replace_all(range(30, 0, -1))
+    assert_same(seq, list(range(30, 0, -1)))
@@ -0,0 +1,324 @@
+"""Criação das fontes de áudio (FFmpeg) para o voice client"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional
+import discord
+from utils.ffmpeg import FFmpegSupervisor, PooledFFmpegOpusAudio, PooledFFmpegPCMAudio, TranscodeLimitError
+from utils.queue import Song
+
+logger = logging.getLogger(__name__)
+
+# Reconexão automática do FFmpeg para streams HTTP
+RECONNECT_OPTIONS = "-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5"
+
+# Codecs que podem ir direto para o Discord sem decodificar
+OPUS_CODECS = ('opus', 'libopus')
+
+# Duração de um frame de áudio do Discord, em segundos
+FRAME_SECONDS = 0.02
+
+
+class TrackedSource(discord.AudioSource):
+    """Envolve uma fonte de áudio contando frames lidos (posição na música)"""
+
+    def __init__(self, original: discord.AudioSource, mode: str, start_offset: float = 0.0):
+        self.original = original
+        self.mode = mode  # 'passthrough' ou 'transcode'
+        self.start_offset = start_offset  # Posição inicial (após seek), em segundos
+        self.frames = 0
+        self._buffer: deque = deque()  # Frames lidos antecipadamente (prebuffer)
+        self.on_first_frame: Optional[Callable[[], None]] = None  # Primeiro frame do FFmpeg
+        self.on_cleanup: Optional[Callable[[], None]] = None
+        self._started = False
+
+    @property
+    def position(self) -> float:
+        """Posição atual na música, em segundos"""
+        return self.start_offset + self.frames * FRAME_SECONDS
+
+    @property
+    def supports_volume(self) -> bool:
+        return isinstance(self.original, discord.PCMVolumeTransformer)
+
+    def set_volume(self, volume: float) -> bool:
+        """Ajusta o volume. Retorna False se a fonte não permite (passthrough)"""
+        if not self.supports_volume:
+            return False
+        self.original.volume = volume
+        return True
+
+    def prebuffer(self, frames: int) -> int:
+        """Lê antecipadamente até `frames` frames. Retorna quantos estão no buffer
+
+        Bloqueia até o FFmpeg entregar os frames: chamar fora do event loop.
+        """
+        while len(self._buffer) < frames:
+            data = self._read_original()
+            if not data:
+                break
+            self._buffer.append(data)
+        return len(self._buffer)
+
+    def _read_original(self) -> bytes:
+        data = self.original.read()
+        if data and not self._started:
+            self._started = True
+            if self.on_first_frame:
+                self.on_first_frame()
+        return data
+
+    def read(self) -> bytes:
+        data = self._buffer.popleft() if self._buffer else self._read_original()
+        if data:
+            self.frames += 1
+        return data
+
+    def is_opus(self) -> bool:
+        return self.original.is_opus()
+
+    def cleanup(self) -> None:
+        self._buffer.clear()
+        self.original.cleanup()
+        if self.on_cleanup:
+            on_cleanup, self.on_cleanup = self.on_cleanup, None
+            on_cleanup()
+
+
+class GaplessSource(discord.AudioSource):
+    """Fonte contínua do player: emenda a próxima música sem parar o voice client
+
+    O voice client toca sempre esta fonte, que repassa os frames da música
+    atual. Faltando `preload_lead` segundos para o fim, `on_preload` é
+    chamado para que a próxima música seja aberta (FFmpeg já iniciado e com
+    alguns segundos em buffer) e entregue com `set_next`. Quando a atual
+    acaba, a troca acontece dentro da mesma leitura de 20ms: sem `after`,
+    sem esperar o event loop e sem iniciar FFmpeg.
+
+    Os callbacks rodam na thread do player do discord.py.
+    """
+
+    def __init__(self, source: TrackedSource, song: Song, preload_lead: float = 0.0,
+                 ended_at: Optional[float] = None,
+                 on_preload: Optional[Callable[[], None]] = None,
+                 on_track_start: Optional[Callable[[Song, Optional[float], bool], None]] = None):
+        self.current = source
+        self.song = song
+        self.preload_lead = preload_lead  # Segundos antes do fim para abrir a próxima (0 desativa)
+        self.on_preload = on_preload
+        self.on_track_start = on_track_start  # (música, silêncio em segundos, sem pausa?)
+        self.started_at = time.monotonic()  # Início da música atual
+        self.preload_due = False  # A música atual já chegou ao ponto de abrir a próxima
+        self.switches = 0
+
+        self._ended_at = ended_at  # Fim da música anterior (reprodução a frio)
+        self._first_frame = True
+        self._next: Optional[TrackedSource] = None
+        self._next_song: Optional[Song] = None
+        self._skip = False
+        self._lock = threading.Lock()
+
+    @property
+    def next_song(self) -> Optional[Song]:
+        """Música já aberta para tocar em seguida"""
+        return self._next_song
+
+    def set_next(self, source: TrackedSource, song: Song) -> bool:
+        """Entrega a fonte da próxima música. Retorna False se já havia uma"""
+        with self._lock:
+            if self._next is not None:
+                return False
+            self._next = source
+            self._next_song = song
+            return True
+
+    def drop_next(self) -> None:
+        """Descarta a próxima música aberta (ex.: a fila mudou)"""
+        with self._lock:
+            source, self._next, self._next_song = self._next, None, None
+            self.preload_due = False  # Ainda perto do fim: a próxima leitura pede outra
+        if source is not None:
+            source.cleanup()
+
+    def skip(self) -> bool:
+        """Pula para a próxima música aberta. Retorna False se não há nenhuma
+
+        Se a próxima for descartada antes da troca, a música atual só termina
+        (e o player para, como num `stop()`).
+        """
+        with self._lock:
+            if self._next is None:
+                return False
+            self._skip = True
+            return True
+
+    def replace(self, source: TrackedSource) -> None:
+        """Troca a fonte da música atual (ex.: passthrough -> transcodificação)"""
+        with self._lock:
+            old, self.current = self.current, source
+        old.cleanup()
+
+    def set_volume(self, volume: float) -> bool:
+        """Ajusta o volume da atual e da próxima. Retorna False se a atual não permite"""
+        with self._lock:
+            upcoming = self._next
+        if upcoming is not None and not upcoming.set_volume(volume):
+            self.drop_next()  # Passthrough aberto com o volume antigo
+        return self.current.set_volume(volume)
+
+    def read(self) -> bytes:
+        data = b'' if self._skip else self.current.read()
+        if data:
+            if self._first_frame:
+                self._track_started(None if self._ended_at is None else time.monotonic() - self._ended_at, False)
+            self._check_preload()
+            return data
+
+        ended_at = time.monotonic()
+        with self._lock:
+            upcoming, song = self._next, self._next_song
+            self._next = self._next_song = None
+            self._skip = False
+            if upcoming is None:
+                return b''  # Nada aberto: o player para e o `after` segue a fila
+            finished, self.current, self.song = self.current, upcoming, song
+
+        data = upcoming.read()
+        self.started_at = time.monotonic()
+        self.preload_due = False
+        self.switches += 1
+        self._track_started(self.started_at - ended_at, True)
+        finished.cleanup()
+        return data
+
+    def _track_started(self, gap: Optional[float], gapless: bool) -> None:
+        self._first_frame = False
+        if self.on_track_start:
+            self.on_track_start(self.song, gap, gapless)
+
+    def _check_preload(self) -> None:
+        if self.preload_due or self.preload_lead <= 0 or not self.song.duration:
+            return
+        if self.current.position >= self.song.duration - self.preload_lead:
+            self.preload_due = True
+            if self.on_preload:
+                self.on_preload()
+
+    def is_opus(self) -> bool:
+        return self.current.is_opus()
+
+    def cleanup(self) -> None:
+        with self._lock:
+            upcoming, self._next, self._next_song = self._next, None, None
+        if upcoming is not None:
+            upcoming.cleanup()
+        self.current.cleanup()
+
+
+class AudioSourceFactory:
+    """Escolhe entre passthrough de opus e transcodificação para PCM
+
+    Passthrough (`-c:a copy`): o FFmpeg só remuxa o opus do YouTube para ogg e
+    o discord.py envia os pacotes como estão — sem decodificar, sem escalar
+    volume em Python e sem recodificar com libopus. Só vale com volume 100%.
+    """
+
+    def __init__(self, ffmpeg_path: str = 'ffmpeg', passthrough: bool = True,
+                 supervisor: Optional[FFmpegSupervisor] = None):
+        self.ffmpeg_path = ffmpeg_path
+        self.passthrough = passthrough
+        self.supervisor = supervisor if supervisor is not None else FFmpegSupervisor()
+
+    def can_passthrough(self, codec: Optional[str], volume: float) -> bool:
+        """Verifica se o stream pode ser enviado sem transcodificar"""
+        return self.passthrough and codec in OPUS_CODECS and volume == 1.0
+
+    async def create(self, stream_url: str, volume: float, codec: Optional[str] = None,
+                     seek: float = 0.0, guild_id: Optional[int] = None,
+                     wait: Optional[float] = None) -> TrackedSource:
+        """Cria a fonte de áudio para um stream, registrada no supervisor
+
+        Args:
+            stream_url: URL do stream (ou caminho de arquivo local)
+            volume: Volume (1.0 = 100%)
+            codec: Codec de áudio do stream, se conhecido
+            seek: Posição inicial em segundos
+            guild_id: Servidor dono do processo
+            wait: Espera máxima por vaga de transcodificação (None = padrão do supervisor)
+
+        Raises:
+            TranscodeLimitError: sem vaga para transcodificar e sem opus para passthrough
+        """
+        local = os.path.exists(stream_url)
+        # Opções de reconexão só existem para HTTP: num arquivo local o FFmpeg aborta
+        before_options = "" if local else RECONNECT_OPTIONS
+        if seek > 0:
+            before_options = f"-ss {seek:.2f} {before_options}"
+
+        passthrough = self.can_passthrough(codec, volume)
+        if not passthrough and not await self.supervisor.acquire_transcode(wait):
+            if not (self.passthrough and codec in OPUS_CODECS):
+                raise TranscodeLimitError(f"{self.supervisor.max_transcodes} transcodificações em andamento")
+            logger.warning("Limite de transcodificações atingido, tocando em passthrough (volume 100%)")
+            passthrough = True
+
+        # Arquivo local do início: entrada por stdin, que aceita um FFmpeg pré-iniciado
+        if self.supervisor.pool is not None and local and seek <= 0:
+            inputs = {'source': open(stream_url, 'rb'), 'pipe': True, 'warm_pool': self.supervisor.pool}
+        else:
+            inputs = {'source': stream_url}
+
+        spawned_at = time.monotonic()
+        try:
+            if passthrough:
+                source = PooledFFmpegOpusAudio(
+                    codec='copy',
+                    executable=self.ffmpeg_path,
+                    before_options=before_options,
+                    options="-vn",
+                    **inputs
+                )
+            else:
+                source = PooledFFmpegPCMAudio(
+                    executable=self.ffmpeg_path,
+                    before_options=before_options,
+                    options="-vn",
+                    **inputs
+                )
+        except Exception:
+            # Sem processo não há thread de escrita para fechar o arquivo
+            if inputs.get('pipe'):
+                inputs['source'].close()
+            raise
+
+        if passthrough:
+            logger.info("Fonte opus em passthrough (sem transcodificação)")
+            tracked = TrackedSource(source, 'passthrough', seek)
+        else:
+            logger.info(f"Fonte PCM com volume {volume:.0%} (codec de origem: {codec or 'desconhecido'})")
+            tracked = TrackedSource(discord.PCMVolumeTransformer(source, volume=volume), 'transcode', seek)
+
+        self.supervisor.register(guild_id, tracked, source, spawned_at)
+        return tracked
+
+
+def ensure_encoder(voice_client: discord.VoiceClient, source: discord.AudioSource) -> None:
+    """Cria o encoder opus se uma fonte PCM vai entrar num player que começou em passthrough"""
+    if not source.is_opus() and getattr(voice_client, 'encoder', None) in (None, discord.utils.MISSING):
+        # O encoder só é criado por play() quando a primeira fonte é PCM
+        voice_client.encoder = discord.opus.Encoder()
+
+
+def swap_source(voice_client: discord.VoiceClient, source: discord.AudioSource) -> None:
+    """Troca a fonte do player sem disparar o callback `after`"""
+    ensure_encoder(voice_client, source)
+
+    old = voice_client.source
+    if isinstance(old, GaplessSource):
+        old.replace(source)
+        return
+    voice_client.source = source
+    if old is not None:
+        old.cleanup()
@@ -0,0 +1,174 @@
+"""Cache local de áudio para as músicas mais tocadas"""
+import asyncio
+import json
+import os
+import time
+import logging
+from typing import Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+Downloader = Callable[[str, str], Awaitable[Optional[str]]]
+
+
+class AudioCache:
+    """Baixa em segundo plano músicas populares e as mantém em disco
+
+    Uma música é baixada quando atinge `min_plays` reproduções. O diretório é
+    mantido abaixo de `max_bytes` removendo os arquivos acessados há mais
+    tempo (LRU). O índice (contagem de plays, tamanho e último acesso) fica em
+    `index.json` dentro do diretório.
+    """
+
+    # Máximo de vídeos com contagem de plays mantida (sem arquivo)
+    MAX_TRACKED = 10000
+
+    def __init__(self, downloader: Downloader, directory: str = os.path.join("data", "audio_cache"),
+                 max_bytes: int = 1024 ** 3, min_plays: int = 3):
+        self.downloader = downloader
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.min_plays = min_plays
+        self.index_file = os.path.join(directory, "index.json")
+
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+            logger.info(f"Diretório de cache de áudio criado: {directory}")
+
+        # video_id -> {'plays', 'file', 'size', 'last_access'}
+        self.entries: Dict[str, Dict] = self._load_index()
+        self.downloading: Dict[str, asyncio.Task] = {}
+        self._dirty = False
+
+        self.hits = 0
+        self.misses = 0
+        self.downloads = 0
+        self.evictions = 0
+
+    def _load_index(self) -> Dict[str, Dict]:
+        """Carrega o índice, descartando arquivos que sumiram do disco"""
+        if not os.path.exists(self.index_file):
+            return {}
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        except Exception as e:
+            logger.error(f"Erro ao carregar índice do cache de áudio: {e}")
+            return {}
+
+        for entry in entries.values():
+            if entry.get('file') and not os.path.exists(entry['file']):
+                entry.pop('file', None)
+                entry.pop('size', None)
+        return entries
+
+    def _save_index(self) -> None:
+        """Grava o índice de forma atômica (arquivo temporário + rename)"""
+        temp_file = self.index_file + ".tmp"
+        try:
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f)
+            os.replace(temp_file, self.index_file)
+            self._dirty = False
+        except Exception as e:
+            logger.error(f"Erro ao salvar índice do cache de áudio: {e}")
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(entry.get('size', 0) for entry in self.entries.values())
+
+    def path_for(self, video_id: str) -> Optional[str]:
+        """Retorna o arquivo local de um vídeo, se estiver em cache"""
+        entry = self.entries.get(video_id)
+        if entry and entry.get('file') and os.path.exists(entry['file']):
+            entry['last_access'] = time.time()
+            self._dirty = True
+            self.hits += 1
+            return entry['file']
+        self.misses += 1
+        return None
+
+    def record_play(self, video_id: str, url: str) -> None:
+        """Conta uma reprodução e agenda o download se passou do limite"""
+        entry = self.entries.setdefault(video_id, {'plays': 0})
+        entry['plays'] = entry.get('plays', 0) + 1
+        entry['last_access'] = time.time()
+        self._dirty = True
+
+        if entry['plays'] >= self.min_plays and not entry.get('file') and video_id not in self.downloading:
+            self.downloading[video_id] = asyncio.get_running_loop().create_task(self._download(video_id, url))
+
+        if len(self.entries) > self.MAX_TRACKED:
+            self._prune_counts()
+
+    def _prune_counts(self) -> None:
+        """Esquece as contagens mais antigas de vídeos que não estão em disco"""
+        uncached = sorted(
+            (entry.get('last_access', 0), video_id)
+            for video_id, entry in self.entries.items()
+            if not entry.get('file') and video_id not in self.downloading
+        )
+        for _, video_id in uncached[:len(self.entries) - self.MAX_TRACKED]:
+            del self.entries[video_id]
+
+    async def _download(self, video_id: str, url: str) -> None:
+        """Baixa o áudio e aplica o limite de espaço"""
+        try:
+            path = await self.downloader(url, self.directory)
+            if not path or not os.path.exists(path):
+                return
+
+            entry = self.entries.setdefault(video_id, {'plays': 0})
+            entry['file'] = path
+            entry['size'] = os.path.getsize(path)
+            entry['last_access'] = time.time()
+            self.downloads += 1
+            logger.info(f"Áudio em cache: {video_id} ({entry['size'] / 1024 ** 2:.1f} MB)")
+
+            self._enforce_budget(keep=video_id)
+            self._save_index()
+        except Exception as e:
+            logger.error(f"Erro ao baixar áudio para cache ({video_id}): {e}")
+        finally:
+            self.downloading.pop(video_id, None)
+
+    def _enforce_budget(self, keep: Optional[str] = None) -> None:
+        """Remove arquivos menos acessados até caber em `max_bytes`"""
+        cached = sorted(
+            (entry.get('last_access', 0), video_id)
+            for video_id, entry in self.entries.items()
+            if entry.get('file') and video_id != keep
+        )
+        total = self.total_bytes
+        for _, video_id in cached:
+            if total <= self.max_bytes:
+                break
+            entry = self.entries[video_id]
+            try:
+                os.remove(entry['file'])
+            except OSError as e:
+                logger.warning(f"Erro ao remover {entry['file']}: {e}")
+            total -= entry.pop('size', 0)
+            entry.pop('file', None)
+            self.evictions += 1
+
+    def stats(self) -> Dict:
+        """Retorna contadores do cache de áudio"""
+        total = self.hits + self.misses
+        return {
+            'files': sum(1 for entry in self.entries.values() if entry.get('file')),
+            'bytes': self.total_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'downloads': self.downloads,
+            'evictions': self.evictions,
+        }
+
+    def close(self) -> None:
+        """Cancela downloads pendentes e salva o índice"""
+        for task in self.downloading.values():
+            task.cancel()
+        self.downloading.clear()
+        if self._dirty:
+            self._save_index()
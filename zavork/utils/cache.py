@@ -0,0 +1,385 @@
+"""Caches usados pelo player do YouTube"""
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
+from urllib.parse import urlparse, parse_qs
+
+logger = logging.getLogger(__name__)
+
+
+class MetadataCache:
+    """Cache persistente (SQLite) de metadados de vídeos, indexado por ID
+
+    Cada campo tem seu próprio TTL e timestamp, então resultados parciais
+    (ex.: busca sem thumbnail) podem ser gravados sem invalidar o resto.
+    A remoção segue LRU pelo último acesso quando `max_entries` é excedido.
+
+    Leituras não gravam no disco: o último acesso fica em memória e é
+    gravado em lote junto com a próxima escrita (antes da remoção LRU), ao
+    fechar ou quando se acumulam `ACCESS_FLUSH_SIZE` acessos.
+    """
+
+    FIELDS = ('title', 'duration', 'thumbnail', 'uploader')
+
+    # TTL padrão de cada campo, em segundos
+    DEFAULT_TTLS = {
+        'title': 7 * 24 * 3600,
+        'duration': 30 * 24 * 3600,
+        'thumbnail': 24 * 3600,
+        'uploader': 7 * 24 * 3600,
+    }
+
+    # Acessos pendentes que forçam a gravação do lote
+    ACCESS_FLUSH_SIZE = 256
+
+    def __init__(self, path: str = os.path.join("data", "metadata_cache.db"),
+                 max_entries: int = 5000, ttls: Optional[Dict[str, int]] = None):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttls = dict(self.DEFAULT_TTLS)
+        if ttls:
+            self.ttls.update(ttls)
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._accessed: Dict[str, float] = {}  # video_id -> último acesso ainda não gravado
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        columns = ", ".join(f"{field}, {field}_at REAL" for field in self.FIELDS)
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS videos ("
+            f"video_id TEXT PRIMARY KEY, {columns}, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_videos_last_access ON videos(last_access)")
+        self._conn.commit()
+        logger.info(f"Cache de metadados aberto: {path}")
+
+    def get(self, video_id: str, fields: Iterable[str] = ('title', 'duration')) -> Optional[Dict]:
+        """Retorna os campos pedidos se todos estiverem válidos, senão None"""
+        fields = tuple(fields)
+        now = time.time()
+        columns = ", ".join(f"{field}, {field}_at" for field in self.FIELDS)
+
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {columns} FROM videos WHERE video_id = ?", (video_id,)
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            data = {'id': video_id}
+            for i, field in enumerate(self.FIELDS):
+                value, updated_at = row[2 * i], row[2 * i + 1]
+                if updated_at is not None and now - updated_at < self.ttls[field]:
+                    data[field] = value
+
+            if any(field not in data for field in fields):
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._accessed[video_id] = now
+            if len(self._accessed) >= self.ACCESS_FLUSH_SIZE:
+                self._flush_access()
+                self._conn.commit()
+        return data
+
+    def _flush_access(self) -> None:
+        """Grava os últimos acessos pendentes (chamado com o lock, antes de um commit)"""
+        if not self._accessed:
+            return
+        self._conn.executemany(
+            "UPDATE videos SET last_access = MAX(last_access, ?) WHERE video_id = ?",
+            [(accessed, video_id) for video_id, accessed in self._accessed.items()]
+        )
+        self._accessed.clear()
+
+    def put(self, video_id: str, info: Dict) -> None:
+        """Grava os campos presentes em `info` (ignora valores vazios)"""
+        values = {field: info.get(field) for field in self.FIELDS if info.get(field) is not None}
+        if not video_id or not values:
+            return
+
+        now = time.time()
+        assignments = ", ".join(f"{field} = excluded.{field}, {field}_at = excluded.{field}_at" for field in values)
+        columns = ", ".join(f"{field}, {field}_at" for field in values)
+        placeholders = ", ".join("?, ?" for _ in values)
+        params = [video_id]
+        for value in values.values():
+            params.extend((value, now))
+        params.append(now)
+
+        with self._lock:
+            self._conn.execute(
+                f"INSERT INTO videos (video_id, {columns}, last_access) VALUES (?, {placeholders}, ?) "
+                f"ON CONFLICT(video_id) DO UPDATE SET {assignments}, last_access = excluded.last_access",
+                params
+            )
+            # A remoção LRU precisa dos acessos recentes
+            self._flush_access()
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        """Remove as entradas menos usadas recentemente acima do limite"""
+        count = self._conn.execute("SELECT COUNT(*) FROM videos").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM videos WHERE video_id IN "
+                "(SELECT video_id FROM videos ORDER BY last_access LIMIT ?)",
+                (excess,)
+            )
+            self.evictions += excess
+
+    def invalidate(self, video_id: str) -> None:
+        """Remove um vídeo do cache"""
+        with self._lock:
+            self._accessed.pop(video_id, None)
+            self._conn.execute("DELETE FROM videos WHERE video_id = ?", (video_id,))
+            self._conn.commit()
+
+    def stats(self) -> Dict:
+        """Retorna contadores de acerto/erro do cache"""
+        total = self.hits + self.misses
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM videos").fetchone()[0]
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'evictions': self.evictions,
+            'size': size,
+        }
+
+    def close(self) -> None:
+        """Grava os acessos pendentes e fecha a conexão com o banco"""
+        with self._lock:
+            self._flush_access()
+            self._conn.commit()
+            self._conn.close()
+
+
+class StreamCache:
+    """Cache em memória de URLs de stream, válido até pouco antes do `expire`
+
+    As URLs do googlevideo trazem o parâmetro `expire` (timestamp Unix).
+    Entradas usadas recentemente e próximas de expirar são listadas por
+    `due_for_refresh` para serem renovadas em segundo plano.
+    """
+
+    # TTL usado quando a URL não traz `expire`
+    DEFAULT_TTL = 3600
+
+    def __init__(self, safety_margin: float = 300.0, refresh_window: float = 900.0,
+                 max_entries: int = 1000, active_window: float = 3600.0):
+        self.safety_margin = safety_margin  # Margem antes do expire em que a URL deixa de valer
+        self.refresh_window = refresh_window  # Antecedência para renovar em segundo plano
+        self.active_window = active_window  # Só renova URLs usadas nesse intervalo
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[str, List]" = OrderedDict()  # video_id -> [url, expires_at, last_used, codec]
+
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+
+    @staticmethod
+    def parse_expiry(stream_url: str) -> Optional[float]:
+        """Lê o parâmetro `expire` de uma URL de stream"""
+        try:
+            query = parse_qs(urlparse(stream_url).query)
+            if 'expire' in query:
+                return float(query['expire'][0])
+            # Algumas URLs trazem os parâmetros no caminho (/expire/123/...)
+            parts = urlparse(stream_url).path.split('/')
+            if 'expire' in parts:
+                return float(parts[parts.index('expire') + 1])
+        except (ValueError, IndexError):
+            pass
+        return None
+
+    def get(self, video_id: str) -> Optional[str]:
+        """Retorna a URL de stream se ainda for válida"""
+        entry = self.entries.get(video_id)
+        if entry is None or time.time() >= entry[1] - self.safety_margin:
+            self.misses += 1
+            return None
+
+        entry[2] = time.time()
+        self.entries.move_to_end(video_id)
+        self.hits += 1
+        return entry[0]
+
+    def get_stale(self, video_id: str) -> Optional[str]:
+        """Retorna a URL mesmo dentro da margem de segurança, se ainda não expirou"""
+        entry = self.entries.get(video_id)
+        if entry is None or time.time() >= entry[1]:
+            return None
+        return entry[0]
+
+    def expires_at(self, video_id: str) -> Optional[float]:
+        """Retorna o timestamp de expiração de uma entrada"""
+        entry = self.entries.get(video_id)
+        return entry[1] if entry else None
+
+    def codec(self, video_id: str) -> Optional[str]:
+        """Retorna o codec de áudio do stream em cache, se conhecido"""
+        entry = self.entries.get(video_id)
+        return entry[3] if entry else None
+
+    def put(self, video_id: str, stream_url: str, expires_at: Optional[float] = None,
+            codec: Optional[str] = None) -> None:
+        """Grava uma URL de stream"""
+        if not video_id or not stream_url:
+            return
+
+        now = time.time()
+        if expires_at is None:
+            expires_at = self.parse_expiry(stream_url) or now + self.DEFAULT_TTL
+
+        previous = self.entries.get(video_id)
+        last_used = previous[2] if previous else now
+        self.entries[video_id] = [stream_url, expires_at, last_used, codec]
+        self.entries.move_to_end(video_id)
+
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, video_id: str) -> None:
+        """Descarta a URL de um vídeo (ex.: FFmpeg falhou com ela)"""
+        self.entries.pop(video_id, None)
+
+    def due_for_refresh(self) -> List[str]:
+        """Lista vídeos usados recentemente cuja URL expira em breve"""
+        now = time.time()
+        return [
+            video_id for video_id, (_, expires_at, last_used, _) in self.entries.items()
+            if expires_at - now < self.refresh_window and now - last_used < self.active_window
+        ]
+
+    def stats(self) -> Dict:
+        """Retorna contadores do cache"""
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'refreshes': self.refreshes,
+            'size': len(self.entries),
+        }
+
+
+class QueryCache:
+    """Cache em memória (LRU + TTL) de resultados de busca por texto
+
+    A consulta é normalizada (minúsculas, espaços colapsados), então
+    "Never Gonna" e "  never  gonna " compartilham a mesma entrada. Buscas sem
+    resultado também ficam em cache, com TTL menor (cache negativo).
+    """
+
+    def __init__(self, max_entries: int = 500, ttl: float = 600.0, negative_ttl: float = 60.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.entries: "OrderedDict[tuple, tuple]" = OrderedDict()  # chave -> (expires_at, resultados)
+
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(query: str, limit: int = 1, flat: bool = False) -> tuple:
+        """Chave normalizada de uma busca"""
+        return (' '.join(query.casefold().split()), limit, flat)
+
+    def get(self, key: tuple) -> Optional[List[Dict]]:
+        """Retorna cópias dos resultados em cache (lista vazia = busca sem resultados)"""
+        entry = self.entries.get(key)
+        if entry is None or time.time() >= entry[0]:
+            # Expiradas continuam guardadas (até sair pelo LRU) para get_stale
+            self.misses += 1
+            return None
+
+        self.entries.move_to_end(key)
+        if entry[1]:
+            self.hits += 1
+        else:
+            self.negative_hits += 1
+        return [dict(result) for result in entry[1]]
+
+    def get_stale(self, key: tuple) -> Optional[List[Dict]]:
+        """Resultados em cache mesmo expirados (quando a extração está fora do ar)"""
+        entry = self.entries.get(key)
+        if entry is None or not entry[1]:
+            return None
+        return [dict(result) for result in entry[1]]
+
+    def put(self, key: tuple, results: List[Dict]) -> None:
+        """Grava os resultados de uma busca"""
+        ttl = self.ttl if results else self.negative_ttl
+        self.entries[key] = (time.time() + ttl, [dict(result) for result in results])
+        self.entries.move_to_end(key)
+
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def stats(self) -> Dict:
+        """Retorna contadores do cache"""
+        total = self.hits + self.negative_hits + self.misses
+        return {
+            'hits': self.hits,
+            'negative_hits': self.negative_hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits + self.negative_hits) / total if total else 0.0,
+            'size': len(self.entries),
+        }
+
+
+class SingleFlight:
+    """Agrupa chamadas concorrentes idênticas em uma única execução
+
+    A primeira chamada com uma chave executa a corrotina; as que chegam
+    enquanto ela está em andamento aguardam o mesmo resultado (ou exceção).
+    Cancelar quem está esperando não cancela a execução compartilhada.
+    """
+
+    def __init__(self):
+        self.inflight: Dict[object, asyncio.Task] = {}
+
+        self.calls = 0
+        self.coalesced = 0
+
+    async def run(self, key, factory: Callable[[], Awaitable]):
+        """Executa `factory()` ou se junta à execução em andamento para `key`"""
+        self.calls += 1
+        task = self.inflight.get(key)
+        if task is None:
+            task = asyncio.get_running_loop().create_task(factory())
+            self.inflight[key] = task
+            task.add_done_callback(lambda _: self.inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict:
+        """Retorna contadores de agrupamento"""
+        return {
+            'calls': self.calls,
+            'coalesced': self.coalesced,
+            'inflight': len(self.inflight),
+        }
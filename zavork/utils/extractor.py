@@ -0,0 +1,342 @@
+"""Backends de extração do yt-dlp (threads ou processos)"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, List, Optional
+import yt_dlp
+
+logger = logging.getLogger(__name__)
+
+# Campos repassados ao chamador; o resto do dict do yt-dlp (formatos,
+# legendas, http_headers...) é descartado para reduzir o custo de IPC
+INFO_FIELDS = (
+    '_type', 'id', 'title', 'duration', 'url', 'webpage_url', 'thumbnail',
+    'uploader', 'upload_date', 'acodec', 'abr', 'asr', 'ext', 'ie_key',
+)
+
+
+class ExtractionError(Exception):
+    """Falha de extração do yt-dlp (serializável entre processos)"""
+
+
+def sanitize_info(info: Optional[Dict]) -> Optional[Dict]:
+    """Reduz o resultado do yt-dlp aos campos usados pelo bot"""
+    if info is None:
+        return None
+    data = {field: info.get(field) for field in INFO_FIELDS if info.get(field) is not None}
+    if info.get('entries') is not None:
+        data['entries'] = [sanitize_info(entry) for entry in info['entries'] if entry]
+    return data
+
+
+class YDLPool:
+    """Instâncias YoutubeDL de longa duração, uma por thread e perfil de opções
+
+    Reaproveitar a instância mantém extratores, cookies e conexões HTTP
+    (keep-alive) entre chamadas. Cada instância é reciclada após `max_uses`
+    extrações ou imediatamente após um erro.
+    """
+
+    def __init__(self, max_uses: int = 200):
+        self.max_uses = max_uses
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+        self.created = 0
+        self.reused = 0
+        self.recycled = 0
+        self.setup_seconds = 0.0  # Tempo total gasto construindo instâncias
+
+    def _slots(self) -> Dict[str, list]:
+        """Instâncias da thread atual: perfil -> [ydl, usos]"""
+        slots = getattr(self._local, 'slots', None)
+        if slots is None:
+            slots = self._local.slots = {}
+        return slots
+
+    def warm(self, profile: str, options: Dict) -> None:
+        """Cria antecipadamente a instância de um perfil na thread atual"""
+        slots = self._slots()
+        if profile not in slots:
+            slots[profile] = [self._build(options), 0]
+
+    def _build(self, options: Dict) -> yt_dlp.YoutubeDL:
+        start = time.perf_counter()
+        ydl = yt_dlp.YoutubeDL(options)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.created += 1
+            self.setup_seconds += elapsed
+        return ydl
+
+    def _discard(self, slots: Dict[str, list], profile: str) -> None:
+        entry = slots.pop(profile, None)
+        if entry is None:
+            return
+        with self._lock:
+            self.recycled += 1
+        try:
+            entry[0].close()
+        except Exception:
+            pass
+
+    def extract(self, target: str, options: Dict, profile: str = 'default') -> Optional[Dict]:
+        """Extrai com a instância da thread atual, criando-a se preciso"""
+        slots = self._slots()
+        entry = slots.get(profile)
+        if entry is None:
+            entry = slots[profile] = [self._build(options), 0]
+        elif entry[1] > 0:
+            with self._lock:
+                self.reused += 1
+
+        try:
+            info = entry[0].extract_info(target, download=False)
+        except Exception:
+            # Estado da instância (sessão HTTP, cookies) pode estar corrompido
+            self._discard(slots, profile)
+            raise
+
+        entry[1] += 1
+        if entry[1] >= self.max_uses:
+            self._discard(slots, profile)
+        return info
+
+    def extract_many(self, targets: List[str], options: Dict, profile: str = 'default') -> List[Dict]:
+        """Extrai vários alvos em sequência com a mesma instância
+
+        Uma falha não interrompe o lote: cada item retorna `info` ou `error`.
+        """
+        results = []
+        for target in targets:
+            try:
+                results.append({'info': sanitize_info(self.extract(target, options, profile)), 'error': None})
+            except Exception as e:
+                results.append({'info': None, 'error': str(e)})
+        return results
+
+    def stats(self) -> Dict:
+        """Retorna contadores e o custo de construção evitado"""
+        with self._lock:
+            average = self.setup_seconds / self.created if self.created else 0.0
+            return {
+                'created': self.created,
+                'reused': self.reused,
+                'recycled': self.recycled,
+                'setup_ms_avg': average * 1000,
+                'setup_seconds_saved': average * self.reused,
+            }
+
+
+def merge_pool_stats(snapshots) -> Dict:
+    """Soma estatísticas de vários YDLPool (ex.: um por processo)"""
+    snapshots = list(snapshots)
+    created = sum(s['created'] for s in snapshots)
+    setup_ms_total = sum(s['setup_ms_avg'] * s['created'] for s in snapshots)
+    return {
+        'created': created,
+        'reused': sum(s['reused'] for s in snapshots),
+        'recycled': sum(s['recycled'] for s in snapshots),
+        'setup_ms_avg': setup_ms_total / created if created else 0.0,
+        'setup_seconds_saved': sum(s['setup_seconds_saved'] for s in snapshots),
+    }
+
+
+# ===== LADO DO WORKER (processo) =====
+
+_worker_pool: Optional[YDLPool] = None
+
+
+def _init_worker(profile: str, options: Dict, max_uses: int) -> None:
+    """Inicializa o worker com uma instância YoutubeDL pronta"""
+    global _worker_pool
+    _worker_pool = YDLPool(max_uses=max_uses)
+    _worker_pool.warm(profile, options)
+
+
+def _worker_extract(target: str, options: Dict, profile: str) -> Dict:
+    """Executa a extração com a instância de longa duração do worker"""
+    try:
+        info = sanitize_info(_worker_pool.extract(target, options, profile))
+    except Exception as e:
+        # Exceções do yt-dlp carregam tracebacks que não passam por pickle
+        raise ExtractionError(str(e)) from None
+    # Estatísticas do pool viajam junto com o resultado
+    return {'info': info, 'pid': os.getpid(), 'pool': _worker_pool.stats()}
+
+
+def _worker_extract_batch(targets: List[str], options: Dict, profile: str) -> Dict:
+    """Executa um lote de extrações num único worker (uma ida e volta de IPC)"""
+    results = _worker_pool.extract_many(targets, options, profile)
+    return {'results': results, 'pid': os.getpid(), 'pool': _worker_pool.stats()}
+
+
+def _worker_ping() -> int:
+    """Verificação de saúde: retorna o PID do worker"""
+    return os.getpid()
+
+
+# ===== BACKENDS =====
+
+class ThreadExtractor:
+    """Extração em threads (compartilha o GIL com o event loop)"""
+
+    name = 'thread'
+
+    def __init__(self, workers: int = 2, max_uses: int = 200):
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='yt-dlp')
+        self.pool = YDLPool(max_uses=max_uses)
+
+    def start(self) -> None:
+        pass
+
+    async def extract(self, target: str, options: Dict, profile: str = 'default') -> Optional[Dict]:
+        """Extrai informações de uma URL ou busca"""
+        def _extract():
+            try:
+                return sanitize_info(self.pool.extract(target, options, profile))
+            except Exception as e:
+                raise ExtractionError(str(e)) from e
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, _extract)
+
+    async def extract_batch(self, targets: List[str], options: Dict, profile: str = 'default') -> List[Dict]:
+        """Extrai um lote ocupando um único worker; cada item tem `info` ou `error`"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.pool.extract_many, targets, options, profile)
+
+    def pool_stats(self) -> Dict:
+        """Estatísticas de reuso das instâncias YoutubeDL"""
+        return self.pool.stats()
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class ProcessExtractor:
+    """Extração em processos com workers aquecidos
+
+    Cada worker mantém uma instância YoutubeDL de longa duração por perfil de
+    opções. Uma tarefa de saúde verifica os workers periodicamente e recria o
+    pool se algum processo morrer.
+    """
+
+    name = 'process'
+
+    def __init__(self, workers: int = 2, default_options: Optional[Dict] = None,
+                 health_interval: float = 30.0, max_uses: int = 200):
+        self.workers = workers
+        self.default_options = default_options or {}
+        self.max_uses = max_uses
+        self._worker_stats: Dict[int, Dict] = {}  # pid -> estatísticas do YDLPool do worker
+        self.health_interval = health_interval
+        self.restarts = 0
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self._restart_lock = threading.Lock()
+        self._health_task: Optional[asyncio.Task] = None
+        self._create_pool()
+
+    def _create_pool(self) -> None:
+        """Cria o pool de processos (spawn é seguro com as threads do discord.py)"""
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=('default', self.default_options, self.max_uses),
+        )
+        # Aquece todos os workers já na criação
+        for _ in range(self.workers):
+            self.executor.submit(_worker_ping)
+
+    def _restart_pool(self, reason: str, broken: ProcessPoolExecutor) -> None:
+        """Descarta o pool `broken` (matando os processos) e cria outro
+
+        Várias chamadas em andamento recebem o mesmo BrokenProcessPool: só a
+        primeira recria o pool; as demais encontram um pool novo e não o matam.
+        """
+        with self._restart_lock:
+            if self.executor is not broken:
+                return
+            logger.warning(f"Reiniciando pool de extração: {reason}")
+            processes = list((getattr(broken, '_processes', None) or {}).values())
+            broken.shutdown(wait=False, cancel_futures=True)
+            for process in processes:
+                if process.is_alive():
+                    process.kill()
+            self.restarts += 1
+            self._create_pool()
+
+    def start(self) -> None:
+        """Inicia a verificação periódica de saúde"""
+        if self._health_task is None:
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    async def _health_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.health_interval)
+            executor = self.executor
+            if not self.check_health():
+                self._restart_pool("worker morto na verificação de saúde", executor)
+
+    def check_health(self) -> bool:
+        """Verifica se todos os processos do pool estão vivos
+
+        Não passa pela fila de tarefas: um pool ocupado com extrações longas
+        está saudável, só não teria vaga para responder a tempo.
+        """
+        executor = self.executor
+        if executor is None or getattr(executor, '_broken', False):
+            return False
+        processes = getattr(executor, '_processes', None) or {}
+        return all(process.is_alive() for process in list(processes.values()))
+
+    async def _run(self, func: Callable, *args) -> Dict:
+        """Executa `func` num worker; se o pool quebrar, recria uma vez e tenta de novo"""
+        loop = asyncio.get_running_loop()
+        executor = self.executor
+        try:
+            return await loop.run_in_executor(executor, func, *args)
+        except BrokenProcessPool:
+            # Um worker morreu: recria o pool (se ninguém recriou ainda) e tenta uma vez mais
+            self._restart_pool("worker encerrado inesperadamente", executor)
+            return await loop.run_in_executor(self.executor, func, *args)
+
+    async def extract(self, target: str, options: Dict, profile: str = 'default') -> Optional[Dict]:
+        """Extrai informações de uma URL ou busca"""
+        result = await self._run(_worker_extract, target, options, profile)
+        self._worker_stats[result['pid']] = result['pool']
+        return result['info']
+
+    async def extract_batch(self, targets: List[str], options: Dict, profile: str = 'default') -> List[Dict]:
+        """Extrai um lote ocupando um único worker; cada item tem `info` ou `error`"""
+        result = await self._run(_worker_extract_batch, targets, options, profile)
+        self._worker_stats[result['pid']] = result['pool']
+        return result['results']
+
+    def pool_stats(self) -> Dict:
+        """Estatísticas de reuso das instâncias YoutubeDL somadas entre workers"""
+        return merge_pool_stats(self._worker_stats.values())
+
+    def close(self) -> None:
+        if self._health_task:
+            self._health_task.cancel()
+            self._health_task = None
+        if self.executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def create_extractor(backend: str = 'thread', workers: int = 2,
+                     default_options: Optional[Dict] = None, max_uses: int = 200):
+    """Cria o backend de extração configurado"""
+    if backend == 'process':
+        return ProcessExtractor(workers=workers, default_options=default_options, max_uses=max_uses)
+    if backend != 'thread':
+        logger.warning(f"Backend de extração desconhecido '{backend}', usando threads")
+    return ThreadExtractor(workers=workers, max_uses=max_uses)
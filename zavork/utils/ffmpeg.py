@@ -0,0 +1,311 @@
+"""Supervisão dos processos FFmpeg: registro por servidor, limites e processos pré-iniciados"""
+import asyncio
+import logging
+import subprocess
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Hashable, Iterable, List, Optional, Tuple
+import discord
+from discord.player import CREATE_NO_WINDOW
+from utils.resilience import LatencyTracker
+
+logger = logging.getLogger(__name__)
+
+
+class TranscodeLimitError(Exception):
+    """Limite de transcodificações simultâneas atingido"""
+
+
+class WarmPool:
+    """Processos FFmpeg iniciados antes de serem pedidos, esperando a entrada por stdin
+
+    Só serve para entrada por pipe (arquivos do cache local): a linha de
+    comando não contém a origem, então todas as reproduções de um mesmo modo
+    usam exatamente os mesmos argumentos. O pool aprende cada linha de
+    comando na primeira abertura a frio e passa a manter `size` processos
+    ociosos para ela, repostos em segundo plano a cada uso.
+    """
+
+    def __init__(self, size: int = 1):
+        self.size = size
+        self._idle: Dict[Tuple[str, ...], List[subprocess.Popen]] = {}
+        self._kwargs: Dict[Tuple[str, ...], Dict] = {}
+        self._lock = threading.Lock()
+        self._closed = False
+
+        self.hits = 0
+        self.misses = 0
+        self.spawned = 0
+
+    def take(self, args: List[str], kwargs: Dict) -> Optional[subprocess.Popen]:
+        """Retorna um processo ocioso com os mesmos argumentos (ou None) e repõe o pool"""
+        key = tuple(args)
+        process = None
+        with self._lock:
+            self._kwargs[key] = kwargs
+            idle = self._idle.setdefault(key, [])
+            while idle:
+                candidate = idle.pop()
+                if candidate.poll() is None:
+                    process = candidate
+                    break
+        if process is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+        threading.Thread(target=self._replenish, args=(key,), daemon=True, name='ffmpeg-warm-pool').start()
+        return process
+
+    def _replenish(self, key: Tuple[str, ...]) -> None:
+        while True:
+            with self._lock:
+                if self._closed or len(self._idle.get(key, ())) >= self.size:
+                    return
+                kwargs = self._kwargs[key]
+            try:
+                process = subprocess.Popen(list(key), creationflags=CREATE_NO_WINDOW, **kwargs)
+            except Exception as e:
+                logger.warning(f"Não foi possível pré-iniciar FFmpeg: {e}")
+                return
+            self.spawned += 1
+            with self._lock:
+                if self._closed:
+                    process.kill()
+                    return
+                self._idle[key].append(process)
+
+    @property
+    def idle(self) -> int:
+        with self._lock:
+            return sum(len(processes) for processes in self._idle.values())
+
+    def close(self) -> None:
+        """Encerra os processos ociosos"""
+        with self._lock:
+            self._closed = True
+            processes = [process for idle in self._idle.values() for process in idle]
+            self._idle.clear()
+        for process in processes:
+            process.kill()
+            process.wait()
+
+
+class _PooledSpawn:
+    """Usa um processo do WarmPool, se houver, em vez de iniciar o FFmpeg"""
+
+    def __init__(self, *args, warm_pool: Optional[WarmPool] = None, **kwargs):
+        self.warm_pool = warm_pool
+        self.adopted = False  # Processo veio pré-iniciado do pool
+        super().__init__(*args, **kwargs)
+
+    def _spawn_process(self, args, **subprocess_kwargs) -> subprocess.Popen:
+        if self.warm_pool is not None:
+            process = self.warm_pool.take(args, subprocess_kwargs)
+            if process is not None:
+                self.adopted = True
+                return process
+        return super()._spawn_process(args, **subprocess_kwargs)
+
+    def _pipe_writer(self, source) -> None:
+        try:
+            super()._pipe_writer(source)
+        except AttributeError:
+            pass  # Processo encerrado pelo cleanup no meio de uma escrita
+        finally:
+            source.close()
+
+
+class PooledFFmpegPCMAudio(_PooledSpawn, discord.FFmpegPCMAudio):
+    pass
+
+
+class PooledFFmpegOpusAudio(_PooledSpawn, discord.FFmpegOpusAudio):
+    pass
+
+
+class _Process:
+    """Processo FFmpeg vivo registrado no supervisor"""
+
+    __slots__ = ('guild_id', 'source', 'mode', 'pid', 'warm', 'spawned_at', 'first_frame')
+
+    def __init__(self, guild_id: Hashable, source, mode: str, pid: Optional[int], warm: bool, spawned_at: float):
+        self.guild_id = guild_id
+        self.source = source
+        self.mode = mode
+        self.pid = pid
+        self.warm = warm
+        self.spawned_at = spawned_at
+        self.first_frame: Optional[float] = None  # Segundos do spawn até o primeiro frame
+
+
+class FFmpegSupervisor:
+    """Acompanha os processos FFmpeg de cada servidor
+
+    - Registra cada fonte aberta (servidor, modo, PID) até o `cleanup`.
+    - Mede o tempo do spawn até o primeiro frame, separado por modo e por
+      processo pré-iniciado.
+    - Limita as transcodificações (PCM + volume + opus em Python, as que
+      custam CPU) a `max_transcodes` simultâneas (0 = sem limite); quem passa
+      do limite espera até `transcode_wait` segundos por uma vaga.
+    - Encerra os processos de um servidor desconectado e os órfãos de
+      servidores sem conexão.
+    - Com `warm_workers` > 0, mantém processos pré-iniciados (`WarmPool`).
+
+    `release` e a medição do primeiro frame rodam na thread do player.
+    """
+
+    # Primeiro frame acima disso é registrado no log
+    SLOW_FIRST_FRAME_SECONDS = 2.0
+
+    def __init__(self, max_transcodes: int = 0, transcode_wait: float = 5.0, warm_workers: int = 0):
+        self.max_transcodes = max_transcodes
+        self.transcode_wait = transcode_wait
+        self.pool = WarmPool(warm_workers) if warm_workers > 0 else None
+        self._processes: Dict[Hashable, Dict[int, _Process]] = {}  # guild -> id(fonte) -> processo
+        self._lock = threading.Lock()
+        self._waiters: Deque[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = deque()
+        self.first_frame: Dict[str, LatencyTracker] = {}  # passthrough / transcode / warm
+
+        self.spawned = 0
+        self.transcode_waits = 0
+        self.transcode_rejected = 0
+        self.orphans_killed = 0
+
+    @property
+    def transcodes(self) -> int:
+        """Transcodificações vivas"""
+        with self._lock:
+            return sum(
+                1 for processes in self._processes.values() for process in processes.values()
+                if process.mode == 'transcode'
+            )
+
+    def live(self, guild_id: Optional[Hashable] = None) -> int:
+        """Processos vivos (de um servidor ou de todos)"""
+        with self._lock:
+            if guild_id is not None:
+                return len(self._processes.get(guild_id, ()))
+            return sum(len(processes) for processes in self._processes.values())
+
+    async def acquire_transcode(self, timeout: Optional[float] = None) -> bool:
+        """Espera uma vaga de transcodificação. Retorna False se o prazo acabou
+
+        A vaga é ocupada ao registrar a fonte, então não pode haver `await`
+        entre esta chamada e o `register`.
+        """
+        if self.max_transcodes <= 0:
+            return True
+        deadline = time.monotonic() + (self.transcode_wait if timeout is None else timeout)
+        waited = False
+        while self.transcodes >= self.max_transcodes:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.transcode_rejected += 1
+                return False
+            if not waited:
+                waited = True
+                self.transcode_waits += 1
+            loop = asyncio.get_running_loop()
+            waiter = (loop, loop.create_future())
+            with self._lock:
+                self._waiters.append(waiter)
+            try:
+                await asyncio.wait_for(waiter[1], remaining)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                with self._lock:
+                    if waiter in self._waiters:
+                        self._waiters.remove(waiter)
+        return True
+
+    def register(self, guild_id: Optional[Hashable], source, original: discord.FFmpegAudio,
+                 spawned_at: float) -> None:
+        """Passa a acompanhar o processo de uma fonte recém-criada (TrackedSource)"""
+        process = getattr(original, '_process', None)
+        entry = _Process(
+            guild_id, source, source.mode, getattr(process, 'pid', None),
+            getattr(original, 'adopted', False), spawned_at
+        )
+        with self._lock:
+            self._processes.setdefault(guild_id, {})[id(source)] = entry
+        self.spawned += 1
+        source.on_first_frame = lambda: self._first_frame(entry)
+        source.on_cleanup = lambda: self.release(entry)
+
+    def _first_frame(self, entry: _Process) -> None:
+        entry.first_frame = time.monotonic() - entry.spawned_at
+        kind = 'warm' if entry.warm else entry.mode
+        tracker = self.first_frame.get(kind)
+        if tracker is None:
+            tracker = self.first_frame[kind] = LatencyTracker()
+        tracker.record(entry.first_frame)
+        if entry.first_frame >= self.SLOW_FIRST_FRAME_SECONDS:
+            logger.warning(f"FFmpeg {entry.pid} ({kind}) levou {entry.first_frame:.1f}s até o primeiro frame")
+        else:
+            logger.debug(f"FFmpeg {entry.pid} ({kind}): primeiro frame em {entry.first_frame * 1000:.0f}ms")
+
+    def release(self, entry: _Process) -> None:
+        """Tira um processo do registro (chamado pelo `cleanup` da fonte)"""
+        with self._lock:
+            processes = self._processes.get(entry.guild_id)
+            if processes is None or processes.pop(id(entry.source), None) is None:
+                return
+            if not processes:
+                del self._processes[entry.guild_id]
+            waiters = list(self._waiters) if entry.mode == 'transcode' else []
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_wake, future)
+
+    def kill_guild(self, guild_id: Hashable) -> int:
+        """Encerra os processos de um servidor (ex.: desconectado). Retorna quantos"""
+        with self._lock:
+            entries = list(self._processes.get(guild_id, {}).values())
+        for entry in entries:
+            entry.source.cleanup()
+        if entries:
+            self.orphans_killed += len(entries)
+            logger.info(f"{len(entries)} processos FFmpeg encerrados (guild {guild_id})")
+        return len(entries)
+
+    def kill_orphans(self, active_guilds: Iterable[Hashable]) -> int:
+        """Encerra processos de servidores fora de `active_guilds`. Retorna quantos"""
+        active = set(active_guilds)
+        with self._lock:
+            orphaned = [guild_id for guild_id in self._processes if guild_id not in active]
+        return sum(self.kill_guild(guild_id) for guild_id in orphaned)
+
+    def close(self) -> None:
+        """Encerra todos os processos, inclusive os pré-iniciados"""
+        with self._lock:
+            guilds = list(self._processes)
+        for guild_id in guilds:
+            self.kill_guild(guild_id)
+        if self.pool:
+            self.pool.close()
+
+    def stats(self) -> Dict:
+        """Processos vivos, limites e latência até o primeiro frame (ms)"""
+        first_frame = {}
+        for kind, tracker in self.first_frame.items():
+            p50, p95 = (tracker.percentile(p) for p in (0.5, 0.95))
+            first_frame[kind] = {'p50_ms': (p50 or 0.0) * 1000, 'p95_ms': (p95 or 0.0) * 1000, 'samples': len(tracker)}
+        return {
+            'live': self.live(),
+            'transcodes': self.transcodes,
+            'max_transcodes': self.max_transcodes,
+            'spawned': self.spawned,
+            'transcode_waits': self.transcode_waits,
+            'transcode_rejected': self.transcode_rejected,
+            'orphans_killed': self.orphans_killed,
+            'warm_idle': self.pool.idle if self.pool else 0,
+            'warm_hits': self.pool.hits if self.pool else 0,
+            'warm_misses': self.pool.misses if self.pool else 0,
+            'first_frame': first_frame,
+        }
+
+
+def _wake(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
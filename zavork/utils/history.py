@@ -0,0 +1,156 @@
+"""Histórico de reprodução com limite em memória e registro em disco"""
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class PlaybackHistory:
+    """Últimas `depth` músicas tocadas em memória; as mais antigas vão para disco
+
+    Cada música que sai do buffer circular é gravada como uma linha JSON
+    compacta em `spill_path` (horário, URL, título, duração, solicitante).
+    Quando o arquivo passa de `max_spill_bytes`, ele é rotacionado para
+    `<arquivo>.1`, mantendo uma geração anterior.
+
+    A gravação (e a leitura de `read_since`) roda fora do event loop, numa
+    thread compartilhada por todos os servidores: uma leitura sempre vê as
+    gravações pedidas antes dela.
+    """
+
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='history-write')
+
+    def __init__(self, depth: int = 50, spill_path: Optional[str] = None,
+                 max_spill_bytes: int = 5 * 1024 ** 2):
+        # Com 0, last() seria sempre None (loop sem efeito) e nada iria para o disco
+        if depth < 1:
+            raise ValueError(f"profundidade do histórico deve ser pelo menos 1 (recebido {depth})")
+        self.entries: Deque[Tuple[float, object]] = deque(maxlen=depth)  # (tocada em, música)
+        self.spill_path = spill_path
+        self.max_spill_bytes = max_spill_bytes
+        self.spilled = 0
+
+        if spill_path:
+            directory = os.path.dirname(spill_path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+                logger.info(f"Diretório de histórico criado: {directory}")
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def append(self, song) -> None:
+        """Registra uma música tocada"""
+        if self.entries.maxlen and len(self.entries) == self.entries.maxlen:
+            self._spill([self.entries[0]])
+        self.entries.append((time.time(), song))
+
+    def last(self):
+        """Retorna a última música tocada"""
+        return self.entries[-1][1] if self.entries else None
+
+    def recent(self, limit: int = 10) -> List:
+        """Retorna as últimas `limit` músicas (mais recente por último)"""
+        if limit <= 0:
+            return []
+        start = max(len(self.entries) - limit, 0)
+        return [song for _, song in list(self.entries)[start:]]
+
+    def clear(self) -> None:
+        """Esvazia a memória, preservando as músicas no registro em disco"""
+        self._spill(self.entries)
+        self.entries.clear()
+
+    # ===== DISCO =====
+
+    @staticmethod
+    def _record(played_at: float, song) -> Dict:
+        return {
+            't': round(played_at),
+            'u': song.url,
+            'ti': song.title,
+            'd': int(song.duration or 0),
+            'r': song.requester,
+        }
+
+    def _spill(self, entries) -> None:
+        """Acrescenta entradas ao registro em disco (em segundo plano, se houver event loop)"""
+        if not self.spill_path or not entries:
+            return
+        # Os registros são montados aqui: as músicas podem mudar depois
+        records = [self._record(played_at, song) for played_at, song in entries]
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            self._write(records)  # Fora do event loop (ex.: scripts): grava na hora
+            return
+        self.executor.submit(self._write, records)
+
+    def _write(self, records: List[Dict]) -> None:
+        try:
+            self._rotate()
+            with open(self.spill_path, 'a', encoding='utf-8') as f:
+                for record in records:
+                    f.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')))
+                    f.write('\n')
+                    self.spilled += 1
+        except Exception as e:
+            logger.error(f"Erro ao gravar histórico em disco: {e}")
+
+    def _rotate(self) -> None:
+        try:
+            if os.path.getsize(self.spill_path) >= self.max_spill_bytes:
+                os.replace(self.spill_path, self.spill_path + '.1')
+        except FileNotFoundError:
+            pass
+
+    def _read_spilled(self) -> Iterator[Dict]:
+        """Lê o registro em disco, da geração mais antiga para a mais nova"""
+        for path in (self.spill_path + '.1', self.spill_path):
+            if not os.path.exists(path):
+                continue
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # Linha truncada (ex.: queda durante a escrita)
+
+    async def read_since(self, timestamp: float) -> List[Dict]:
+        """`since` fora do event loop, depois das gravações pendentes"""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self.since, timestamp)
+
+    def since(self, timestamp: float) -> List[Dict]:
+        """Músicas tocadas desde `timestamp` (disco + memória), em ordem cronológica
+
+        Returns:
+            Dicts com played_at, url, title, duration e requester
+        """
+        results = []
+        if self.spill_path:
+            for record in self._read_spilled():
+                if record.get('t', 0) >= timestamp:
+                    results.append({
+                        'played_at': record['t'],
+                        'url': record.get('u'),
+                        'title': record.get('ti'),
+                        'duration': record.get('d', 0),
+                        'requester': record.get('r'),
+                    })
+        # Cópia da memória de uma vez só: pode ser chamado fora do event loop
+        for played_at, song in list(self.entries):
+            if played_at >= timestamp:
+                results.append({
+                    'played_at': played_at,
+                    'url': song.url,
+                    'title': song.title,
+                    'duration': int(song.duration or 0),
+                    'requester': song.requester,
+                })
+        return results
@@ -1,26 +1,53 @@
 """Sistema de gerenciamento de playlists"""
+import asyncio
+from abc import ABC, abstractmethod
+from bisect import bisect_right
 import json
 import os
-from typing import List, Dict, Optional
-from dataclasses import dataclass, asdict
+import secrets
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator, List, Dict, Optional
+from dataclasses import dataclass
 import logging
+from utils.track import Track, shared_text
+from utils.search_index import PrefixIndex, InvertedIndex, apply_changes
 
 logger = logging.getLogger(__name__)
 
-@dataclass
 class PlaylistSong:
-    """Representa uma música em uma playlist"""
-    url: str
-    title: str
-    duration: int
+    """Representa uma música em uma playlist (URL no `Track` compartilhado)"""
+
+    __slots__ = ('track', 'title', 'duration')
+
+    def __init__(self, url: str, title: str, duration: int):
+        self.track = Track.intern(url)
+        self.title = shared_text(title)
+        self.duration = int(duration or 0)
+
+    @property
+    def url(self) -> str:
+        return self.track.url
 
     def to_dict(self) -> dict:
-        return asdict(self)
+        return {'url': self.url, 'title': self.title, 'duration': self.duration}
 
     @classmethod
     def from_dict(cls, data: dict):
         return cls(**data)
 
+    def __eq__(self, other) -> bool:
+        return isinstance(other, PlaylistSong) and self.track is other.track
+
+    def __hash__(self) -> int:
+        return id(self.track)
+
+    def __repr__(self) -> str:
+        return f"PlaylistSong(url={self.url!r}, title={self.title!r}, duration={self.duration})"
+
 @dataclass
 class Playlist:
     """Representa uma playlist"""
@@ -43,60 +70,320 @@ class Playlist:
             songs=[PlaylistSong.from_dict(s) for s in data.get('songs', [])]
         )
 
-class PlaylistManager:
-    """Gerencia playlists dos usuários"""
+# ===== GRAVAÇÃO ADIADA =====
 
-    def __init__(self, data_dir: str = "data"):
-        self.data_dir = data_dir
-        self.playlists_file = os.path.join(data_dir, "playlists.json")
-        self._ensure_data_dir()
-        self.playlists: Dict[str, Dict[str, Playlist]] = self._load_playlists()
+class WriteBehind:
+    """Agrupa mudanças em uma única gravação feita fora do event loop
 
-    def _ensure_data_dir(self):
-        """Garante que o diretório de dados existe"""
-        if not os.path.exists(self.data_dir):
-            os.makedirs(self.data_dir)
-            logger.info(f"Diretório de dados criado: {self.data_dir}")
+    Cada mudança só marca os dados como sujos. A primeira marca agenda uma
+    gravação para daqui a `debounce` segundos; as marcas que chegam nesse
+    intervalo entram na mesma gravação. O retrato dos dados (`snapshot`) é
+    tirado no event loop e a escrita (`write`) roda numa thread dedicada,
+    então gravações nunca se sobrepõem.
+    """
+
+    def __init__(self, snapshot: Callable[[], object], write: Callable[[object], None],
+                 debounce: float = 2.0):
+        self.snapshot = snapshot
+        self.write = write
+        self.debounce = debounce
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='playlist-write')
+        self._task: Optional[asyncio.Task] = None
+
+        self.pending = 0  # Mudanças ainda não gravadas
+        self._first_dirty: Optional[float] = None
+        self.writes = 0
+        self.coalesced = 0  # Mudanças que pegaram carona em outra gravação
+        self.failures = 0
+        self.latencies: deque = deque(maxlen=100)  # Da primeira mudança até estar em disco
+        self.write_seconds = 0.0
+
+    def mark_dirty(self) -> None:
+        """Registra uma mudança e agenda a gravação"""
+        self.pending += 1
+        if self._first_dirty is None:
+            self._first_dirty = time.monotonic()
+
+        if self._task is None or self._task.done():
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                self.flush_now()  # Fora do event loop (ex.: scripts): grava na hora
+                return
+            self._task = loop.create_task(self._run())
+
+    async def _run(self) -> None:
+        while self.pending:
+            await asyncio.sleep(self.debounce)
+            await self.flush()
+
+    def _take(self):
+        """Retira as mudanças pendentes e tira o retrato dos dados"""
+        marks, first = self.pending, self._first_dirty
+        self.pending = 0
+        self._first_dirty = None
+        return marks, first, self.snapshot()
+
+    def _done(self, marks: int, first: float, elapsed: float) -> None:
+        self.writes += 1
+        self.coalesced += marks - 1
+        self.write_seconds += elapsed
+        self.latencies.append(time.monotonic() - first)
+
+    def _failed(self, marks: int, first: float, error: Exception) -> None:
+        # Devolve as mudanças para a próxima tentativa
+        self.pending += marks
+        self._first_dirty = min(first, self._first_dirty) if self._first_dirty else first
+        self.failures += 1
+        logger.error(f"Erro ao gravar playlists: {error}")
+
+    async def flush(self) -> None:
+        """Grava agora as mudanças pendentes (sem bloquear o event loop)"""
+        if not self.pending:
+            return
+        marks, first, data = self._take()
+        start = time.perf_counter()
+        try:
+            await asyncio.get_running_loop().run_in_executor(self.executor, self.write, data)
+        except Exception as e:
+            self._failed(marks, first, e)
+            return
+        self._done(marks, first, time.perf_counter() - start)
+
+    def flush_now(self) -> None:
+        """Grava de forma síncrona (desligamento ou uso fora do event loop)"""
+        if not self.pending:
+            return
+        marks, first, data = self._take()
+        start = time.perf_counter()
+        try:
+            self.write(data)
+        except Exception as e:
+            self._failed(marks, first, e)
+            return
+        self._done(marks, first, time.perf_counter() - start)
+
+    def close(self) -> None:
+        """Cancela a gravação agendada e grava o que estiver pendente"""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        # Espera uma gravação em andamento na thread antes da final
+        self.executor.shutdown(wait=True)
+        self.flush_now()
+
+    def stats(self) -> Dict:
+        """Retorna contadores de gravação"""
+        latencies = list(self.latencies)
+        return {
+            'writes': self.writes,
+            'coalesced': self.coalesced,
+            'pending': self.pending,
+            'failures': self.failures,
+            'flush_latency_ms_avg': sum(latencies) / len(latencies) * 1000 if latencies else 0.0,
+            'flush_latency_ms_max': max(latencies) * 1000 if latencies else 0.0,
+            'write_ms_avg': self.write_seconds / self.writes * 1000 if self.writes else 0.0,
+        }
+
+
+# ===== BACKENDS DE ARMAZENAMENTO =====
+
+class PlaylistStore(ABC):
+    """Interface dos backends de armazenamento de playlists
+
+    Um backend que não implemente todos os métodos abstratos falha ao ser
+    criado, e não no meio de um comando.
+    """
+
+    name = 'base'
+
+    # Operações fazem I/O de disco (o gerenciador as tira do event loop)
+    blocking = False
+
+    @abstractmethod
+    def create_playlist(self, user_id: str, name: str, owner: str) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_playlist(self, user_id: str, name: str) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    def add_songs(self, user_id: str, playlist_name: str, songs: List[PlaylistSong]) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    def remove_song(self, user_id: str, playlist_name: str, index: int) -> Optional[PlaylistSong]:
+        """Remove pelo índice e retorna a música removida"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_playlist(self, user_id: str, name: str) -> Optional[Playlist]:
+        raise NotImplementedError
+
+    def playlist_summary(self, user_id: str, name: str) -> Optional[tuple[int, int]]:
+        """Quantidade de músicas e duração total (segundos), sem carregar as músicas"""
+        playlist = self.get_playlist(user_id, name)
+        if playlist is None:
+            return None
+        return len(playlist.songs), sum(song.duration for song in playlist.songs)
+
+    @abstractmethod
+    def get_songs_page(self, user_id: str, name: str, after: int, limit: int) -> List[tuple[int, PlaylistSong]]:
+        """Até `limit` músicas depois da chave `after` (-1 = início), como pares (chave, música)
+
+        As chaves crescem com a ordem e são estáveis: remover uma música não
+        muda a chave das seguintes, então quem pagina não pula nenhuma.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def update_song_metadata(self, url: str, title: str, duration: int) -> List[tuple[str, str]]:
+        """Atualiza título e duração de todas as ocorrências de um vídeo
+
+        Returns:
+            Pares (user_id, título antigo), um por ocorrência alterada
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_user_playlists(self, user_id: str) -> List[str]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_all_playlists(self) -> List[tuple[str, str, int]]:
+        raise NotImplementedError
+
+    def is_empty(self) -> bool:
+        return not self.get_all_playlists()
+
+    @abstractmethod
+    def revision(self) -> int:
+        """Contador de mudanças, gravado junto com os dados (cresce a cada escrita)"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def identity(self) -> str:
+        """Identifica este armazenamento: backend, caminho e um id aleatório gravado junto com os dados
+
+        Dois armazenamentos diferentes podem estar na mesma revisão (ex.: ambos
+        novos, na revisão 0); a identidade é o que os distingue.
+        """
+        raise NotImplementedError
+
+    def iter_songs(self) -> Iterator[tuple[str, str, str, str, int]]:
+        """Percorre todas as músicas salvas: (user_id, playlist, título, url, duração)"""
+        for user_id, name, _ in self.get_all_playlists():
+            playlist = self.get_playlist(user_id, name)
+            for song in playlist.songs if playlist else []:
+                yield user_id, name, song.title, song.url, song.duration
+
+    def stats(self) -> Optional[Dict]:
+        """Contadores de gravação, se o backend tiver"""
+        return None
+
+    def close(self) -> None:
+        pass
+
+
+def read_playlists_file(path: str) -> tuple[int, Optional[str], Dict[str, Dict[str, Playlist]]]:
+    """Lê um playlists.json: (contador de mudanças, id do arquivo, user_id -> nome -> playlist)
+
+    Raises:
+        OSError, ValueError: arquivo ilegível ou fora do formato
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if not isinstance(data, dict):
+        raise ValueError(f"{path} não contém um objeto JSON")
+
+    revision = data.pop(JsonPlaylistStore.REVISION_KEY, 0)
+    store_id = data.pop(JsonPlaylistStore.STORE_ID_KEY, None)
+    playlists = {}
+    for user_id, user_playlists in data.items():
+        playlists[user_id] = {}
+        for playlist_name, playlist_data in user_playlists.items():
+            playlists[user_id][playlist_name] = Playlist.from_dict(playlist_data)
+    return revision, store_id, playlists
+
+
+class JsonPlaylistStore(PlaylistStore):
+    """Todas as playlists em memória, gravadas em um arquivo JSON
+
+    Mudanças valem na hora em memória; a gravação do arquivo é adiada e
+    agrupada pelo `WriteBehind` (arquivo temporário + rename).
+    """
+
+    name = 'json'
+
+    # Chaves do arquivo com o contador de mudanças e o id do arquivo (as demais são user_ids)
+    REVISION_KEY = '__revision__'
+    STORE_ID_KEY = '__store_id__'
+
+    def __init__(self, path: str, debounce: float = 2.0):
+        self.path = path
+        self._revision = 0
+        self._store_id: Optional[str] = None
+        self.playlists: Dict[str, Dict[str, Playlist]] = self._load_playlists()
+        # Chaves de página (só em memória), paralelas a `songs`: criadas na
+        # primeira página lida e mantidas por add_songs/remove_song
+        self._page_keys: Dict[tuple[str, str], List[int]] = {}
+        self.writer = WriteBehind(self._snapshot, self._write, debounce=debounce)
+        if self._store_id is None:
+            # Arquivo novo ou anterior ao id: grava um, senão muda a cada inicialização
+            self._store_id = secrets.token_hex(8)
+            self.writer.mark_dirty()
 
     def _load_playlists(self) -> Dict[str, Dict[str, Playlist]]:
         """Carrega playlists do arquivo JSON"""
-        if not os.path.exists(self.playlists_file):
+        if not os.path.exists(self.path):
             return {}
 
         try:
-            with open(self.playlists_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-
-            playlists = {}
-            for user_id, user_playlists in data.items():
-                playlists[user_id] = {}
-                for playlist_name, playlist_data in user_playlists.items():
-                    playlists[user_id][playlist_name] = Playlist.from_dict(playlist_data)
-
+            self._revision, self._store_id, playlists = read_playlists_file(self.path)
             logger.info(f"Playlists carregadas: {len(playlists)} usuários")
             return playlists
         except Exception as e:
             logger.error(f"Erro ao carregar playlists: {e}")
+            # Id só desta execução: não regrava o arquivo ilegível por conta própria
+            self._store_id = secrets.token_hex(8)
             return {}
 
     def _save_playlists(self):
-        """Salva playlists no arquivo JSON"""
-        try:
-            data = {}
-            for user_id, user_playlists in self.playlists.items():
-                data[user_id] = {}
-                for playlist_name, playlist in user_playlists.items():
-                    data[user_id][playlist_name] = playlist.to_dict()
+        """Marca as playlists para gravação (adiada e agrupada)"""
+        self._revision += 1
+        self.writer.mark_dirty()
 
-            with open(self.playlists_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
+    def _snapshot(self) -> Dict:
+        """Cópia serializável das playlists (tirada no event loop)"""
+        data = {self.REVISION_KEY: self._revision, self.STORE_ID_KEY: self._store_id}
+        for user_id, user_playlists in self.playlists.items():
+            data[user_id] = {}
+            for playlist_name, playlist in user_playlists.items():
+                data[user_id][playlist_name] = playlist.to_dict()
+        return data
 
-            logger.info("Playlists salvas com sucesso")
-        except Exception as e:
-            logger.error(f"Erro ao salvar playlists: {e}")
+    def _write(self, data: Dict) -> None:
+        """Salva playlists no arquivo JSON (arquivo temporário + rename)"""
+        temp_file = self.path + ".tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        os.replace(temp_file, self.path)
+        logger.info("Playlists salvas com sucesso")
+
+    def revision(self) -> int:
+        return self._revision
+
+    def identity(self) -> str:
+        return f"{self.name}:{os.path.abspath(self.path)}:{self._store_id}"
+
+    def stats(self) -> Optional[Dict]:
+        return self.writer.stats()
+
+    def close(self) -> None:
+        self.writer.close()
 
     def create_playlist(self, user_id: str, name: str, owner: str) -> bool:
-        """Cria uma nova playlist"""
         if user_id not in self.playlists:
             self.playlists[user_id] = {}
 
@@ -108,52 +395,655 @@ class PlaylistManager:
         return True
 
     def delete_playlist(self, user_id: str, name: str) -> bool:
-        """Deleta uma playlist"""
         if user_id not in self.playlists or name not in self.playlists[user_id]:
             return False
 
         del self.playlists[user_id][name]
+        self._page_keys.pop((user_id, name), None)
         self._save_playlists()
         return True
 
-    def add_song(self, user_id: str, playlist_name: str, song: PlaylistSong) -> bool:
-        """Adiciona uma música à playlist"""
+    def add_songs(self, user_id: str, playlist_name: str, songs: List[PlaylistSong]) -> bool:
         if user_id not in self.playlists or playlist_name not in self.playlists[user_id]:
             return False
 
-        self.playlists[user_id][playlist_name].songs.append(song)
+        self.playlists[user_id][playlist_name].songs.extend(songs)
+        keys = self._page_keys.get((user_id, playlist_name))
+        if keys is not None:
+            start = keys[-1] + 1 if keys else 0
+            keys.extend(range(start, start + len(songs)))
         self._save_playlists()
         return True
 
-    def remove_song(self, user_id: str, playlist_name: str, index: int) -> bool:
-        """Remove uma música da playlist pelo índice"""
+    def remove_song(self, user_id: str, playlist_name: str, index: int) -> Optional[PlaylistSong]:
         if user_id not in self.playlists or playlist_name not in self.playlists[user_id]:
-            return False
+            return None
 
         playlist = self.playlists[user_id][playlist_name]
         if index < 0 or index >= len(playlist.songs):
-            return False
+            return None
 
-        playlist.songs.pop(index)
+        removed = playlist.songs.pop(index)
+        keys = self._page_keys.get((user_id, playlist_name))
+        if keys is not None:
+            keys.pop(index)
         self._save_playlists()
-        return True
+        return removed
+
+    def get_songs_page(self, user_id: str, name: str, after: int, limit: int) -> List[tuple[int, PlaylistSong]]:
+        playlist = self.get_playlist(user_id, name)
+        if playlist is None:
+            return []
+        keys = self._page_keys.get((user_id, name))
+        if keys is None:
+            keys = self._page_keys[(user_id, name)] = list(range(len(playlist.songs)))
+        start = bisect_right(keys, after)
+        return list(zip(keys[start:start + limit], playlist.songs[start:start + limit]))
+
+    def update_song_metadata(self, url: str, title: str, duration: int) -> List[tuple[str, str]]:
+        matches = [
+            (user_id, song)
+            for user_id, user_playlists in self.playlists.items()
+            for playlist in user_playlists.values()
+            for song in playlist.songs
+            if song.url == url
+        ]
+        changed = [(user_id, song.title) for user_id, song in matches]
+        for _, song in matches:
+            song.title = shared_text(title)
+            song.duration = int(duration or 0)
+        if changed:
+            self._save_playlists()
+        return changed
 
     def get_playlist(self, user_id: str, name: str) -> Optional[Playlist]:
-        """Obtém uma playlist"""
         if user_id not in self.playlists or name not in self.playlists[user_id]:
             return None
         return self.playlists[user_id][name]
 
     def get_user_playlists(self, user_id: str) -> List[str]:
-        """Lista todas as playlists de um usuário"""
         if user_id not in self.playlists:
             return []
         return list(self.playlists[user_id].keys())
 
     def get_all_playlists(self) -> List[tuple[str, str, int]]:
-        """Retorna todas as playlists (user_id, nome, quantidade de músicas)"""
         result = []
         for user_id, user_playlists in self.playlists.items():
             for name, playlist in user_playlists.items():
                 result.append((user_id, name, len(playlist.songs)))
         return result
+
+
+class SqlitePlaylistStore(PlaylistStore):
+    """Playlists em SQLite: cada operação grava só as linhas afetadas
+
+    As músicas têm uma posição inteira crescente dentro da playlist. Remover
+    deixa um buraco na sequência em vez de renumerar as seguintes; a ordem
+    vem sempre do índice (playlist_id, position).
+    """
+
+    name = 'sqlite'
+    blocking = True
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS users (
+            user_id TEXT PRIMARY KEY,
+            created_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS playlists (
+            id INTEGER PRIMARY KEY,
+            user_id TEXT NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+            name TEXT NOT NULL,
+            owner TEXT NOT NULL,
+            song_count INTEGER NOT NULL DEFAULT 0,
+            UNIQUE (user_id, name)
+        );
+        CREATE TABLE IF NOT EXISTS songs (
+            playlist_id INTEGER NOT NULL REFERENCES playlists(id) ON DELETE CASCADE,
+            position INTEGER NOT NULL,
+            url TEXT NOT NULL,
+            title TEXT NOT NULL,
+            duration INTEGER NOT NULL,
+            PRIMARY KEY (playlist_id, position)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS songs_url ON songs (url);
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        );
+        INSERT OR IGNORE INTO meta (key, value) VALUES ('revision', 0);
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(self.SCHEMA)
+        # Id aleatório do banco, criado uma vez (bancos antigos ganham um ao abrir)
+        self._conn.execute(
+            "INSERT OR IGNORE INTO meta (key, value) VALUES ('store_id', ?)", (secrets.randbits(62),)
+        )
+        self._conn.commit()
+        self._store_id = self._conn.execute("SELECT value FROM meta WHERE key = 'store_id'").fetchone()[0]
+        logger.info(f"Banco de playlists aberto: {path}")
+
+    def _playlist_id(self, user_id: str, name: str) -> Optional[int]:
+        row = self._conn.execute(
+            "SELECT id FROM playlists WHERE user_id = ? AND name = ?", (user_id, name)
+        ).fetchone()
+        return row[0] if row else None
+
+    def _bump_revision(self) -> None:
+        """Conta uma mudança (chamado dentro da transação que a grava)"""
+        self._conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'revision'")
+
+    def create_playlist(self, user_id: str, name: str, owner: str) -> bool:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO users (user_id, created_at) VALUES (?, ?)", (user_id, time.time())
+            )
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO playlists (user_id, name, owner) VALUES (?, ?, ?)", (user_id, name, owner)
+            )
+            if cursor.rowcount != 1:
+                return False
+            self._bump_revision()
+            return True
+
+    def delete_playlist(self, user_id: str, name: str) -> bool:
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "DELETE FROM playlists WHERE user_id = ? AND name = ?", (user_id, name)
+            )
+            if cursor.rowcount != 1:
+                return False
+            self._bump_revision()
+            return True
+
+    def add_songs(self, user_id: str, playlist_name: str, songs: List[PlaylistSong]) -> bool:
+        with self._lock, self._conn:
+            playlist_id = self._playlist_id(user_id, playlist_name)
+            if playlist_id is None:
+                return False
+            last = self._conn.execute(
+                "SELECT MAX(position) FROM songs WHERE playlist_id = ?", (playlist_id,)
+            ).fetchone()[0]
+            start = 0 if last is None else last + 1
+            self._conn.executemany(
+                "INSERT INTO songs (playlist_id, position, url, title, duration) VALUES (?, ?, ?, ?, ?)",
+                [(playlist_id, start + i, song.url, song.title, song.duration) for i, song in enumerate(songs)]
+            )
+            self._conn.execute(
+                "UPDATE playlists SET song_count = song_count + ? WHERE id = ?", (len(songs), playlist_id)
+            )
+            self._bump_revision()
+            return True
+
+    def remove_song(self, user_id: str, playlist_name: str, index: int) -> Optional[PlaylistSong]:
+        if index < 0:
+            return None
+        with self._lock, self._conn:
+            playlist_id = self._playlist_id(user_id, playlist_name)
+            if playlist_id is None:
+                return None
+            row = self._conn.execute(
+                "SELECT position, url, title, duration FROM songs WHERE playlist_id = ? "
+                "ORDER BY position LIMIT 1 OFFSET ?",
+                (playlist_id, index)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("DELETE FROM songs WHERE playlist_id = ? AND position = ?", (playlist_id, row[0]))
+            self._conn.execute("UPDATE playlists SET song_count = song_count - 1 WHERE id = ?", (playlist_id,))
+            self._bump_revision()
+        return PlaylistSong(row[1], row[2], row[3])
+
+    def get_playlist(self, user_id: str, name: str) -> Optional[Playlist]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, owner FROM playlists WHERE user_id = ? AND name = ?", (user_id, name)
+            ).fetchone()
+            if row is None:
+                return None
+            songs = self._conn.execute(
+                "SELECT url, title, duration FROM songs WHERE playlist_id = ? ORDER BY position", (row[0],)
+            ).fetchall()
+        return Playlist(
+            name=name,
+            owner=row[1],
+            songs=[PlaylistSong(url, title, duration) for url, title, duration in songs]
+        )
+
+    def update_song_metadata(self, url: str, title: str, duration: int) -> List[tuple[str, str]]:
+        with self._lock, self._conn:
+            changed = self._conn.execute(
+                "SELECT p.user_id, s.title FROM songs s JOIN playlists p ON p.id = s.playlist_id WHERE s.url = ?",
+                (url,)
+            ).fetchall()
+            if changed:
+                self._conn.execute(
+                    "UPDATE songs SET title = ?, duration = ? WHERE url = ?", (title, int(duration or 0), url)
+                )
+                self._bump_revision()
+        return [(user_id, old_title) for user_id, old_title in changed]
+
+    def playlist_summary(self, user_id: str, name: str) -> Optional[tuple[int, int]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT p.song_count, (SELECT COALESCE(SUM(duration), 0) FROM songs WHERE playlist_id = p.id) "
+                "FROM playlists p WHERE p.user_id = ? AND p.name = ?", (user_id, name)
+            ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def get_songs_page(self, user_id: str, name: str, after: int, limit: int) -> List[tuple[int, PlaylistSong]]:
+        # A chave é a coluna position: a página seguinte continua pelo índice,
+        # mesmo que músicas anteriores tenham sido removidas nesse meio tempo
+        with self._lock:
+            playlist_id = self._playlist_id(user_id, name)
+            if playlist_id is None:
+                return []
+            rows = self._conn.execute(
+                "SELECT position, url, title, duration FROM songs WHERE playlist_id = ? AND position > ? "
+                "ORDER BY position LIMIT ?", (playlist_id, after, limit)
+            ).fetchall()
+        return [(position, PlaylistSong(url, title, duration)) for position, url, title, duration in rows]
+
+    def get_user_playlists(self, user_id: str) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT name FROM playlists WHERE user_id = ? ORDER BY id", (user_id,)
+            ).fetchall()
+        return [name for (name,) in rows]
+
+    def get_all_playlists(self) -> List[tuple[str, str, int]]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT user_id, name, song_count FROM playlists ORDER BY id"
+            ).fetchall()
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM playlists LIMIT 1").fetchone() is None
+
+    def revision(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT value FROM meta WHERE key = 'revision'").fetchone()[0]
+
+    def identity(self) -> str:
+        return f"{self.name}:{os.path.abspath(self.path)}:{self._store_id}"
+
+    def iter_songs(self) -> Iterator[tuple[str, str, str, str, int]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT p.user_id, p.name, s.title, s.url, s.duration "
+                "FROM songs s JOIN playlists p ON p.id = s.playlist_id"
+            ).fetchall()
+        return iter(rows)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def migrate_json_to_sqlite(json_path: str, store: SqlitePlaylistStore) -> int:
+    """Importa o playlists.json para o SQLite (uma única vez)
+
+    Só roda com o banco vazio. O JSON é renomeado para `.migrated` ao final,
+    então não é importado de novo e continua disponível como cópia. Se o
+    arquivo não puder ser lido, o erro sobe e o JSON fica onde está: a
+    migração é tentada de novo na próxima inicialização.
+
+    Returns:
+        Quantidade de playlists importadas
+
+    Raises:
+        OSError, ValueError: playlists.json ilegível ou fora do formato
+    """
+    if not os.path.exists(json_path) or not store.is_empty():
+        return 0
+
+    revision, _, playlists = read_playlists_file(json_path)
+    migrated = 0
+    with store._lock, store._conn:
+        for user_id, user_playlists in playlists.items():
+            store._conn.execute(
+                "INSERT OR IGNORE INTO users (user_id, created_at) VALUES (?, ?)", (user_id, time.time())
+            )
+            for name, playlist in user_playlists.items():
+                cursor = store._conn.execute(
+                    "INSERT INTO playlists (user_id, name, owner, song_count) VALUES (?, ?, ?, ?)",
+                    (user_id, name, playlist.owner, len(playlist.songs))
+                )
+                store._conn.executemany(
+                    "INSERT INTO songs (playlist_id, position, url, title, duration) VALUES (?, ?, ?, ?, ?)",
+                    [(cursor.lastrowid, i, song.url, song.title, song.duration)
+                     for i, song in enumerate(playlist.songs)]
+                )
+                migrated += 1
+        # Mesmo conteúdo do JSON: herda o contador (o índice é reconstruído, a identidade muda)
+        store._conn.execute("UPDATE meta SET value = ? WHERE key = 'revision'", (revision,))
+
+    os.replace(json_path, json_path + ".migrated")
+    logger.info(f"{migrated} playlists migradas de {json_path} para SQLite")
+    return migrated
+
+
+# ===== GERENCIADOR =====
+
+class PlaylistManager:
+    """Gerencia playlists dos usuários
+
+    O armazenamento é delegado a um backend: 'json' (arquivo único, tudo em
+    memória) ou 'sqlite' (gravações por linha, transacionais). Ao abrir o
+    SQLite pela primeira vez, um playlists.json existente é migrado.
+
+    As operações que passam pelo backend são corrotinas: as do SQLite rodam
+    numa thread dedicada, fora do event loop. Autocomplete e busca usam só
+    os índices em memória e continuam síncronos.
+    """
+
+    def __init__(self, data_dir: str = "data", backend: str = "sqlite", write_delay: float = 2.0):
+        self.data_dir = data_dir
+        self.write_delay = write_delay
+        self.playlists_file = os.path.join(data_dir, "playlists.json")
+        self._ensure_data_dir()
+        self.store = self._create_store(backend)
+        # Backend com I/O (SQLite) roda numa thread só dele, uma operação por vez
+        self.store_executor = (
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix='playlist-db') if self.store.blocking else None
+        )
+        # Autocomplete (por usuário) e busca global, salvos em disco para não
+        # reindexar tudo a cada inicialização
+        self.index = PrefixIndex()
+        self.library = InvertedIndex()
+        self.index_file = os.path.join(data_dir, "library_index.json")
+        # Conteúdo já gravado dos índices; a thread de gravação aplica nele só o
+        # que mudou desde a última gravação (`take_changes`)
+        self._index_data: Dict = {'prefix': {}, 'library': {'docs': {}, 'postings': {}}}
+        self.index_writer = WriteBehind(self._index_snapshot, self._write_index, debounce=write_delay)
+        self._load_indexes()
+        # Resultado da verificação de links: url -> [verificado em, morto (0/1), motivo]
+        self.link_status_file = os.path.join(data_dir, "link_status.json")
+        self.link_status: Dict[str, list] = self._load_link_status()
+        self.link_writer = WriteBehind(self._link_snapshot, self._write_link_status, debounce=write_delay)
+
+    def _ensure_data_dir(self):
+        """Garante que o diretório de dados existe"""
+        if not os.path.exists(self.data_dir):
+            os.makedirs(self.data_dir)
+            logger.info(f"Diretório de dados criado: {self.data_dir}")
+
+    def _create_store(self, backend: str) -> PlaylistStore:
+        """Cria o backend configurado"""
+        if backend == 'sqlite':
+            store = SqlitePlaylistStore(os.path.join(self.data_dir, "playlists.db"))
+            try:
+                migrate_json_to_sqlite(self.playlists_file, store)
+            except Exception as e:
+                logger.error(
+                    f"Erro ao migrar playlists para SQLite: {e}. {self.playlists_file} foi mantido e a "
+                    f"migração será tentada de novo na próxima inicialização; até lá as playlists antigas não aparecem"
+                )
+            return store
+        if backend != 'json':
+            logger.warning(f"Backend de playlists desconhecido '{backend}', usando JSON")
+        return JsonPlaylistStore(self.playlists_file, debounce=self.write_delay)
+
+    # ===== ÍNDICES =====
+
+    def _load_indexes(self) -> None:
+        """Carrega os índices salvos ou, se desatualizados, reconstrói a partir do backend
+
+        O arquivo guarda a identidade e a revisão do backend em que foi
+        gravado; outro backend (ou outro banco) ou qualquer escrita depois
+        disso (inclusive renomear um título) invalida o arquivo.
+        """
+        start = time.perf_counter()
+        revision = self._index_revision = self.store.revision()
+        identity = self._store_identity = self.store.identity()
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('store') == identity and data.get('revision') == revision:
+                index, library = PrefixIndex.from_dict(data['prefix']), InvertedIndex.from_dict(data['library'])
+                self.index, self.library = index, library
+                self._index_data = {'prefix': data['prefix'], 'library': data['library']}
+                logger.info(f"Índices de playlists carregados em {time.perf_counter() - start:.2f}s")
+                return
+            logger.info("Índices de playlists desatualizados, reconstruindo")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.error(f"Erro ao carregar índices de playlists: {e}")
+
+        for user_id, name, _ in self.store.get_all_playlists():
+            self.index.add(user_id, 'playlist', name)
+        for user_id, _, title, url, duration in self.store.iter_songs():
+            self.index.add(user_id, 'song', title, url)
+            self.library.add(url, title, duration)
+        logger.info(f"Índices de playlists reconstruídos: {self.index.size()} prefixos, "
+                    f"{len(self.library.docs)} vídeos em {time.perf_counter() - start:.2f}s")
+        self.index_writer.mark_dirty()
+
+    def _index_snapshot(self) -> Dict:
+        """Identidade e revisão do backend e cópia só do que mudou nos índices (tirada no event loop)"""
+        return {
+            'store': self._store_identity,
+            'revision': self._index_revision,
+            'prefix': self.index.take_changes(),
+            'library': self.library.take_changes(),
+        }
+
+    def _write_index(self, changes: Dict) -> None:
+        """Aplica as mudanças no conteúdo gravado e salva os índices (arquivo temporário + rename)"""
+        # Aplicadas antes de gravar: se a escrita falhar, entram na próxima mesmo assim
+        data = self._index_data
+        apply_changes(data['prefix'], changes['prefix'])
+        apply_changes(data['library']['docs'], changes['library']['docs'])
+        apply_changes(data['library']['postings'], changes['library']['postings'])
+        temp_file = self.index_file + ".tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump({'store': changes['store'], 'revision': changes['revision'], **data}, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(temp_file, self.index_file)
+
+    def _index_song(self, user_id: str, song: PlaylistSong) -> None:
+        self.index.add(user_id, 'song', song.title, song.url)
+        self.library.add(song.url, song.title, song.duration)
+
+    def _unindex_song(self, user_id: str, song: PlaylistSong) -> None:
+        self.index.remove(user_id, 'song', song.title, song.url)
+        self.library.remove(song.url)
+
+    # ===== VERIFICAÇÃO DE LINKS =====
+
+    def _load_link_status(self) -> Dict[str, list]:
+        try:
+            with open(self.link_status_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            # Descarta vídeos que já saíram de todas as playlists
+            return {url: status for url, status in data.items() if url in self.library.docs}
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.error(f"Erro ao carregar verificação de links: {e}")
+            return {}
+
+    def _link_snapshot(self) -> Dict:
+        return dict(self.link_status)
+
+    def _write_link_status(self, data: Dict) -> None:
+        temp_file = self.link_status_file + ".tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(temp_file, self.link_status_file)
+
+    def saved_urls(self) -> List[str]:
+        """URLs distintas de todas as playlists salvas"""
+        return list(self.library.docs)
+
+    def last_checked(self, url: str) -> Optional[float]:
+        """Quando o link foi verificado pela última vez (None se nunca)"""
+        status = self.link_status.get(url)
+        return status[0] if status else None
+
+    def is_dead(self, url: str) -> bool:
+        """Indica se a última verificação encontrou o vídeo indisponível"""
+        status = self.link_status.get(url)
+        return bool(status and status[1])
+
+    def mark_link(self, url: str, dead: bool, reason: str = '') -> None:
+        """Registra o resultado da verificação de um link"""
+        self.link_status[url] = [round(time.time()), int(dead), reason[:200] if dead else '']
+        self.link_writer.mark_dirty()
+
+    def dead_count(self) -> int:
+        """Links salvos marcados como indisponíveis"""
+        return sum(1 for url, status in self.link_status.items() if status[1] and url in self.library.docs)
+
+    # ===== OPERAÇÕES NO BACKEND =====
+
+    async def _store_call(self, func: Callable, *args):
+        """Executa uma operação do backend; com I/O (SQLite), fora do event loop
+
+        As operações rodam uma por vez, na ordem em que foram pedidas, e os
+        resultados voltam nessa mesma ordem.
+        """
+        if self.store_executor is None:
+            return func(*args)
+        return await asyncio.get_running_loop().run_in_executor(self.store_executor, func, *args)
+
+    async def _store_write(self, func: Callable, *args):
+        """Como `_store_call`, retornando também a revisão do backend logo depois da escrita
+
+        Quem chama guarda a revisão em `_index_revision` ao atualizar os
+        índices: o arquivo dos índices nunca declara uma revisão cujas
+        mudanças ainda não aplicou.
+        """
+        def write():
+            return func(*args), self.store.revision()
+        return await self._store_call(write)
+
+    def _take_playlist(self, user_id: str, name: str) -> Optional[Playlist]:
+        """Lê e apaga uma playlist numa única operação do backend"""
+        playlist = self.store.get_playlist(user_id, name)
+        if playlist is None or not self.store.delete_playlist(user_id, name):
+            return None
+        return playlist
+
+    async def update_song_metadata(self, url: str, title: str, duration: int) -> int:
+        """Atualiza título e duração de um vídeo em todas as playlists
+
+        Returns:
+            Quantas ocorrências foram alteradas
+        """
+        changed, self._index_revision = await self._store_write(self.store.update_song_metadata, url, title, duration)
+        for user_id, old_title in changed:
+            self.index.remove(user_id, 'song', old_title, url)
+            self.index.add(user_id, 'song', title, url)
+        if changed:
+            self.library.update(url, title, duration)
+            self.index_writer.mark_dirty()
+        return len(changed)
+
+    async def create_playlist(self, user_id: str, name: str, owner: str) -> bool:
+        """Cria uma nova playlist"""
+        created, self._index_revision = await self._store_write(self.store.create_playlist, user_id, name, owner)
+        if not created:
+            return False
+        self.index.add(user_id, 'playlist', name)
+        self.index_writer.mark_dirty()
+        return True
+
+    async def delete_playlist(self, user_id: str, name: str) -> bool:
+        """Deleta uma playlist"""
+        playlist, self._index_revision = await self._store_write(self._take_playlist, user_id, name)
+        if playlist is None:
+            return False
+        self.index.remove(user_id, 'playlist', name)
+        for song in playlist.songs:
+            self._unindex_song(user_id, song)
+        self.index_writer.mark_dirty()
+        return True
+
+    async def add_song(self, user_id: str, playlist_name: str, song: PlaylistSong) -> bool:
+        """Adiciona uma música à playlist"""
+        return await self.add_songs(user_id, playlist_name, [song])
+
+    async def add_songs(self, user_id: str, playlist_name: str, songs: List[PlaylistSong]) -> bool:
+        """Adiciona várias músicas à playlist, salvando uma única vez"""
+        added, self._index_revision = await self._store_write(self.store.add_songs, user_id, playlist_name, songs)
+        if not added:
+            return False
+        for song in songs:
+            self._index_song(user_id, song)
+        self.index_writer.mark_dirty()
+        return True
+
+    async def remove_song(self, user_id: str, playlist_name: str, index: int) -> bool:
+        """Remove uma música da playlist pelo índice"""
+        removed, self._index_revision = await self._store_write(self.store.remove_song, user_id, playlist_name, index)
+        if removed is None:
+            return False
+        self._unindex_song(user_id, removed)
+        self.index_writer.mark_dirty()
+        return True
+
+    def complete_playlists(self, user_id: str, prefix: str, limit: int = 25) -> List[str]:
+        """Nomes de playlists do usuário que começam com `prefix`"""
+        return [name for name, _ in self.index.search(user_id, 'playlist', prefix, limit)]
+
+    def complete_songs(self, user_id: str, prefix: str, limit: int = 25) -> List[tuple[str, str]]:
+        """Músicas salvas pelo usuário cujo título começa com `prefix`: (título, url)"""
+        return self.index.search(user_id, 'song', prefix, limit)
+
+    def search_library(self, query: str, limit: int = 10) -> List[Dict]:
+        """Busca por palavras nos títulos de todas as playlists salvas
+
+        Returns:
+            Dicts com url, title, duration e refs (em quantas playlists aparece)
+        """
+        return self.library.search(query, limit)
+
+    def library_song(self, url: str) -> Optional[Dict]:
+        """Dados de uma música da biblioteca pela URL"""
+        return self.library.get(url)
+
+    async def get_playlist(self, user_id: str, name: str) -> Optional[Playlist]:
+        """Obtém uma playlist"""
+        return await self._store_call(self.store.get_playlist, user_id, name)
+
+    async def playlist_summary(self, user_id: str, name: str) -> Optional[tuple[int, int]]:
+        """Quantidade de músicas e duração total de uma playlist"""
+        return await self._store_call(self.store.playlist_summary, user_id, name)
+
+    def get_songs_page(self, user_id: str, name: str, after: int, limit: int) -> List[tuple[int, PlaylistSong]]:
+        """Página de músicas de uma playlist, continuando depois da chave `after`
+
+        Síncrona: a fila lê as páginas conforme anda (`LazySource`). É só uma
+        leitura pela chave primária, sem gravação.
+        """
+        return self.store.get_songs_page(user_id, name, after, limit)
+
+    async def get_user_playlists(self, user_id: str) -> List[str]:
+        """Lista todas as playlists de um usuário"""
+        return await self._store_call(self.store.get_user_playlists, user_id)
+
+    async def get_all_playlists(self) -> List[tuple[str, str, int]]:
+        """Retorna todas as playlists (user_id, nome, quantidade de músicas)"""
+        return await self._store_call(self.store.get_all_playlists)
+
+    def stats(self) -> Optional[Dict]:
+        """Contadores de gravação do backend (None se grava direto)"""
+        return self.store.stats()
+
+    def close(self) -> None:
+        """Grava pendências e fecha o backend de armazenamento"""
+        # Termina as operações em andamento antes das gravações finais
+        if self.store_executor is not None:
+            self.store_executor.shutdown(wait=True)
+        self.index_writer.close()
+        self.link_writer.close()
+        self.store.close()
@@ -0,0 +1,148 @@
+"""Resolução antecipada das próximas músicas da fila"""
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Set, Tuple
+from utils.queue import MusicQueue, Song
+
+logger = logging.getLogger(__name__)
+
+Resolver = Callable[[str], Awaitable[Optional[str]]]
+Prober = Callable[[str], Awaitable[Tuple[Optional[str], Optional[int]]]]
+
+
+class Prefetcher:
+    """Resolve em segundo plano as URLs de stream das próximas N músicas
+
+    Observa a fila: a cada mudança (adição, remoção, shuffle, clear) recalcula
+    a janela de lookahead, cancela tarefas de músicas que saíram dela e agenda
+    as que entraram.
+    """
+
+    # Codecs sondados guardados até a música tocar (os mais antigos saem primeiro)
+    MAX_CODECS = 64
+
+    def __init__(self, queue: MusicQueue, resolver: Resolver,
+                 lookahead: int = 2, prober: Optional[Prober] = None):
+        self.queue = queue
+        self.resolver = resolver
+        self.lookahead = lookahead
+        self.prober = prober
+
+        self.tasks: Dict[int, asyncio.Task] = {}  # id(song) -> tarefa de resolução
+        self.codecs: "OrderedDict[str, Tuple[Optional[str], Optional[int]]]" = OrderedDict()  # url -> (codec, bitrate)
+
+        self.resolved = 0
+        self.cancelled = 0
+
+        queue.subscribe(self.refresh)
+
+    def refresh(self) -> None:
+        """Sincroniza as tarefas com a janela atual da fila"""
+        if self.lookahead <= 0:
+            return
+
+        window = {id(song): song for song in self.queue.peek_many(self.lookahead)}
+
+        for key in list(self.tasks):
+            if key not in window:
+                task = self.tasks.pop(key)
+                if not task.done():
+                    task.cancel()
+                    self.cancelled += 1
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # Fora do event loop (ex.: limpeza no shutdown)
+
+        for key, song in window.items():
+            if key not in self.tasks:
+                self.tasks[key] = loop.create_task(self._resolve(song))
+
+    async def _resolve(self, song: Song) -> None:
+        """Resolve (e opcionalmente sonda) o stream de uma música"""
+        try:
+            stream_url = await self.resolver(song.url)
+            if not stream_url:
+                return
+            self.resolved += 1
+
+            if self.prober and song.url not in self.codecs:
+                self.codecs[song.url] = await self.prober(stream_url)
+                # Músicas que saíram da fila sem tocar não chegam a chamar pop_codec
+                while len(self.codecs) > self.MAX_CODECS:
+                    self.codecs.popitem(last=False)
+            logger.debug(f"Prefetch concluído: {song.title}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Erro no prefetch de {song.title}: {e}")
+
+    def pop_codec(self, url: str) -> Tuple[Optional[str], Optional[int]]:
+        """Retorna e descarta (codec, bitrate) sondados para uma música"""
+        return self.codecs.pop(url, (None, None))
+
+    def close(self) -> None:
+        """Cancela todas as tarefas pendentes"""
+        for task in self.tasks.values():
+            if not task.done():
+                task.cancel()
+                self.cancelled += 1
+        self.tasks.clear()
+        self.codecs.clear()
+
+
+class DetailResolver:
+    """Completa em segundo plano músicas adicionadas a partir de extração flat
+
+    Músicas vindas de playlists entram na fila só com ID, título e duração.
+    Cada uma é extraída por completo depois (título definitivo, duração e URL
+    de stream), com no máximo `concurrency` extrações simultâneas.
+    """
+
+    def __init__(self, resolver: Callable[[str], Awaitable[Optional[Dict]]], concurrency: int = 4,
+                 on_update: Optional[Callable[[Song, int], None]] = None):
+        self.resolver = resolver
+        self.on_update = on_update  # Chamado com (música, duração anterior) após atualizar
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.tasks: Set[asyncio.Task] = set()
+
+        self.resolved = 0
+        self.failed = 0
+
+    @property
+    def pending(self) -> int:
+        return len(self.tasks)
+
+    def submit(self, song: Song) -> None:
+        """Agenda a resolução de uma música"""
+        task = asyncio.get_running_loop().create_task(self._resolve(song))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _resolve(self, song: Song) -> None:
+        async with self.semaphore:
+            # Pode já ter sido resolvida pela busca ou pelo prefetch
+            if song.fresh_stream_url():
+                return
+            info = await self.resolver(song.url)
+
+        if not info or not info.get('url'):
+            self.failed += 1
+            logger.warning(f"Não foi possível resolver detalhes de: {song.title}")
+            return
+
+        old_duration = song.duration
+        song.title = info.get('title') or song.title
+        song.duration = int(info.get('duration') or song.duration)
+        song.set_stream(info['url'], info.get('stream_expires'), info.get('acodec'))
+        self.resolved += 1
+        if self.on_update and song.duration != old_duration:
+            self.on_update(song, old_duration)
+
+    def cancel(self) -> None:
+        """Cancela as resoluções pendentes (ex.: fila limpa)"""
+        for task in self.tasks:
+            task.cancel()
+        self.tasks.clear()
@@ -1,54 +1,300 @@
 import asyncio
+import sys
+import time
 from collections import deque
-from typing import List, Optional
+from typing import Callable, Deque, Dict, List, Optional, Tuple, Union
 import random
+from utils.sequence import ChunkedList
+from utils.history import PlaybackHistory
+from utils.track import Track, shared_text
 
 class Song:
-    """Representa uma música na fila"""
-    def __init__(self, url: str, title: str, duration: int, requester: str):
-        self.url = url
-        self.title = title
-        self.duration = duration  # em segundos
-        self.requester = requester
+    """Representa uma música na fila
+
+    A URL fica no `Track` compartilhado do vídeo. Título e duração são desta
+    música: atualizá-los não afeta outras filas nem as playlists salvas.
+    """
+
+    __slots__ = ('track', 'title', 'duration', 'requester', 'stream_url', 'stream_expires', 'codec')
+
+    def __init__(self, url: str, title: str, duration: int, requester: str,
+                 stream_url: Optional[str] = None, stream_expires: Optional[float] = None,
+                 codec: Optional[str] = None):
+        self.track = Track.intern(url)
+        self.title = shared_text(title)
+        self.duration = int(duration or 0)  # em segundos
+        self.requester = sys.intern(requester)
+        # URL de stream já resolvida na busca (evita nova extração ao tocar)
+        self.stream_url = stream_url
+        self.stream_expires = stream_expires  # timestamp Unix do `expire`
+        self.codec = codec  # Codec de áudio do stream (ex.: 'opus')
+
+    @classmethod
+    def from_entry(cls, entry, requester: str) -> 'Song':
+        """Cria uma música a partir de uma entrada de playlist, com cópia do título e da duração"""
+        song = cls.__new__(cls)
+        song.track = entry.track
+        song.title = entry.title
+        song.duration = entry.duration
+        song.requester = sys.intern(requester)
+        song.stream_url = None
+        song.stream_expires = None
+        song.codec = None
+        return song
+
+    @property
+    def url(self) -> str:
+        return self.track.url
+
+    def fresh_stream_url(self, margin: float = 300.0) -> Optional[str]:
+        """Retorna a URL de stream se ainda faltar mais que `margin` segundos para expirar"""
+        if not self.stream_url or not self.stream_expires:
+            return None
+        if time.time() >= self.stream_expires - margin:
+            return None
+        return self.stream_url
+
+    def set_stream(self, stream_url: Optional[str], expires: Optional[float],
+                   codec: Optional[str] = None) -> None:
+        """Guarda a URL de stream resolvida"""
+        self.stream_url = stream_url
+        self.stream_expires = expires
+        if codec:
+            self.codec = codec
 
     def __str__(self):
         mins, secs = divmod(self.duration, 60)
         return f"**{self.title}** ({mins}:{secs:02d}) - Solicitado por {self.requester}"
 
 
+class LazySource:
+    """Trecho da fila ainda não materializado (ex.: uma playlist salva)
+
+    Guarda só um cursor para o armazenamento: `fetch(after, limit)` retorna
+    até `limit` pares (chave, entrada de playlist) depois da chave `after`. As
+    músicas são criadas conforme a fila pede. Quantidade e duração restantes
+    vêm dos metadados salvos, então a fila sabe seu tamanho sem carregar tudo.
+    """
+
+    PAGE_SIZE = 50
+
+    def __init__(self, fetch: Callable[[int, int], List[Tuple[int, object]]],
+                 count: int, total_seconds: int, requester: str):
+        self.fetch = fetch
+        self.requester = sys.intern(requester)
+        self.remaining = count
+        self.remaining_seconds = total_seconds
+        self._after = -1  # Chave do último item já lido
+        self._buffer: Deque = deque()  # Entradas lidas do armazenamento, ainda não entregues
+
+    def _read(self, limit: int) -> bool:
+        """Lê a próxima página para o buffer. Retorna False se acabou"""
+        page = self.fetch(self._after, max(limit, self.PAGE_SIZE))
+        if not page:
+            return False
+        self._after = page[-1][0]
+        self._buffer.extend(entry for _, entry in page)
+        return True
+
+    def take(self, limit: int) -> List[Song]:
+        """Materializa e retorna até `limit` próximas músicas"""
+        songs = []
+        while len(songs) < limit and self.remaining > 0:
+            if not self._buffer and not self._read(limit - len(songs)):
+                self.remaining = 0  # Playlist encolheu depois de carregada
+                break
+            entry = self._buffer.popleft()
+            songs.append(Song.from_entry(entry, self.requester))
+            self.remaining -= 1
+            self.remaining_seconds -= entry.duration
+        if self.remaining <= 0:
+            self.remaining_seconds = 0
+        return songs
+
+    def preview(self, start: int, count: int) -> List[Song]:
+        """Músicas nas posições [start, start + count) deste trecho, sem avançar o cursor
+
+        As músicas retornadas são só para exibição (não entram na fila).
+        """
+        stop = min(start + count, self.remaining)
+        entries = list(self._buffer)
+        if len(entries) < stop:
+            page = self.fetch(self._after, stop - len(entries))
+            entries.extend(entry for _, entry in page)
+        return [Song.from_entry(entry, self.requester) for entry in entries[start:stop]]
+
+
 class MusicQueue:
-    """Sistema de fila para músicas"""
+    """Sistema de fila para músicas
+
+    A fila é uma `ChunkedList`: inserir, remover e mover em qualquer posição
+    custa O(log n) para localizar mais o deslocamento de um único bloco. A
+    duração total é mantida incrementalmente.
+
+    Depois das músicas materializadas pode vir um `backlog` de trechos
+    preguiçosos (`LazySource`) e de músicas adicionadas depois deles. Só
+    `window` músicas ficam materializadas à frente da reprodução; o resto é
+    criado conforme a fila anda.
+    """
     
-    def __init__(self):
-        self.queue: deque = deque()
+    def __init__(self, history: Optional[PlaybackHistory] = None, window: int = 25):
+        self.queue: ChunkedList[Song] = ChunkedList()
+        self.window = window
+        self.backlog: Deque[Union[Song, LazySource]] = deque()
+        self._backlog_size = 0  # Músicas no backlog (incluindo as ainda não lidas)
+        self._lazy_seconds = 0  # Duração restante dos trechos preguiçosos
         self.current: Optional[Song] = None
-        self.history: List[Song] = []
+        self.history = history if history is not None else PlaybackHistory()
         self.is_looping = False
         self.is_loop_queue = False
+        self._listeners: List[Callable[[], None]] = []
+        self._total_seconds = 0  # Soma das durações das músicas na fila
+        # id(song) -> [ocorrências na fila, duração somada ao total por ocorrência]
+        self._members: Dict[int, List[int]] = {}
+        # Muda a cada clear(): quem adiciona em segundo plano (importação de
+        # playlist) compara com o valor do início e para se a fila foi limpa
+        self.generation = 0
+
+    def subscribe(self, callback: Callable[[], None]) -> None:
+        """Registra função chamada sempre que a fila muda"""
+        self._listeners.append(callback)
+
+    def _notify(self) -> None:
+        """Avisa os interessados que a fila mudou"""
+        for callback in self._listeners:
+            callback()
+
+    def _track(self, song: Song) -> None:
+        member = self._members.get(id(song))
+        if member is None:
+            member = self._members[id(song)] = [0, int(song.duration or 0)]
+        member[0] += 1
+        self._total_seconds += member[1]
+
+    def _untrack(self, song: Song) -> None:
+        # Desconta o que foi somado, mesmo que a duração da música tenha mudado depois
+        member = self._members.get(id(song))
+        if member is None:
+            return
+        self._total_seconds -= member[1]
+        member[0] -= 1
+        if member[0] <= 0:
+            del self._members[id(song)]
+
+    def duration_changed(self, song: Song, old_duration: Optional[int] = None) -> None:
+        """Corrige a duração total quando uma música na fila é atualizada
+
+        A diferença é calculada contra a duração somada no `_track`, não contra
+        `old_duration` (mantido pela assinatura do `on_update` do DetailResolver).
+        """
+        member = self._members.get(id(song))
+        if member is None:
+            return
+        duration = int(song.duration or 0)
+        self._total_seconds += (duration - member[1]) * member[0]
+        member[1] = duration
     
     def add(self, song: Song) -> int:
         """Adiciona música à fila. Retorna posição na fila"""
-        self.queue.append(song)
-        return len(self.queue)
+        if self.backlog:
+            # Há trechos preguiçosos antes: a música espera a vez no backlog
+            self.backlog.append(song)
+            self._backlog_size += 1
+        else:
+            self.queue.append(song)
+        self._track(song)
+        self._notify()
+        return self.size()
+
+    def add_lazy(self, source: LazySource) -> int:
+        """Adiciona um trecho preguiçoso ao fim da fila. Retorna a posição da primeira música"""
+        position = self.size() + 1
+        if source.remaining <= 0:
+            return position
+        self.backlog.append(source)
+        self._backlog_size += source.remaining
+        self._lazy_seconds += source.remaining_seconds
+        self._fill(self.window)
+        self._notify()
+        return position
+
+    def _fill(self, target: int) -> None:
+        """Materializa músicas do backlog até a fila ter `target` músicas"""
+        while len(self.queue) < target and self.backlog:
+            item = self.backlog[0]
+            if isinstance(item, LazySource):
+                count, seconds = item.remaining, item.remaining_seconds
+                for song in item.take(target - len(self.queue)):
+                    self.queue.append(song)
+                    self._track(song)
+                self._backlog_size -= count - item.remaining
+                self._lazy_seconds -= seconds - item.remaining_seconds
+                if item.remaining <= 0:
+                    self.backlog.popleft()
+            else:
+                self.backlog.popleft()
+                self.queue.append(item)  # Já contada em _track ao ser adicionada
+                self._backlog_size -= 1
+
+    def _preview_backlog(self, start: int, count: int) -> List[Song]:
+        """Músicas do backlog nas posições [start, start + count), sem materializar"""
+        songs: List[Song] = []
+        for item in self.backlog:
+            if len(songs) >= count:
+                break
+            length = item.remaining if isinstance(item, LazySource) else 1
+            if start >= length:
+                start -= length
+                continue
+            if isinstance(item, LazySource):
+                songs.extend(item.preview(start, count - len(songs)))
+            else:
+                songs.append(item)
+            start = 0
+        return songs
     
     def add_to_front(self, song: Song) -> None:
         """Adiciona música no início da fila (próxima a tocar)"""
-        self.queue.appendleft(song)
+        self.insert(0, song)
+
+    def insert(self, index: int, song: Song) -> int:
+        """Insere música na posição `index` (0 = próxima). Retorna posição na fila"""
+        self._fill(index)
+        index = min(max(index, 0), len(self.queue))
+        self.queue.insert(index, song)
+        self._track(song)
+        self._notify()
+        return index + 1
     
+    def requeue_current(self) -> None:
+        """Devolve a música atual ao início da fila sem passar pelo histórico (não chegou a tocar)"""
+        if self.current is None:
+            return
+        song, self.current = self.current, None
+        self.insert(0, song)
+
     def remove(self) -> Optional[Song]:
         """Remove e retorna a próxima música da fila"""
-        if len(self.queue) > 0:
-            return self.queue.popleft()
-        return None
+        return self.remove_at(0)
     
     def remove_at(self, index: int) -> Optional[Song]:
         """Remove uma música pela posição"""
+        self._fill(index + 1)
         if 0 <= index < len(self.queue):
-            temp_list = list(self.queue)
-            removed = temp_list.pop(index)
-            self.queue = deque(temp_list)
+            removed = self.queue.pop(index)
+            self._untrack(removed)
+            self._notify()
             return removed
         return None
+
+    def move(self, source: int, destination: int) -> Optional[Song]:
+        """Move uma música de posição"""
+        self._fill(max(source, destination) + 1)
+        if not (0 <= source < len(self.queue) and 0 <= destination < len(self.queue)):
+            return None
+        song = self.queue.move(source, destination)
+        self._notify()
+        return song
     
     def current_song(self) -> Optional[Song]:
         """Retorna a música atual"""
@@ -59,55 +305,90 @@ class MusicQueue:
         if self.current:
             self.history.append(self.current)
         
-        self.current = self.remove()
+        self.current = self.queue.pop(0) if self.queue else None
+        if self.current:
+            self._untrack(self.current)
+        self._fill(self.window)
         
         # Loop da música atual
         if self.is_looping and self.history:
-            self.queue.appendleft(self.history[-1])
+            self.queue.insert(0, self.history.last())
+            self._track(self.history.last())
         
         # Loop da fila
         if not self.current and self.is_loop_queue and self.history:
-            self.current = self.history[-1]
+            self.current = self.history.last()
         
+        self._notify()
         return self.current
     
     def peek(self) -> Optional[Song]:
         """Retorna próxima música sem remover"""
+        self._fill(1)
         if len(self.queue) > 0:
             return self.queue[0]
         return None
     
+    def peek_many(self, count: int) -> List[Song]:
+        """Retorna as próximas `count` músicas sem remover"""
+        self._fill(count)
+        return self.queue.slice(0, count)
+
+    def get_slice(self, start: int, stop: int) -> List[Song]:
+        """Retorna as músicas nas posições [start, stop) sem copiar a fila toda
+
+        Posições ainda no backlog são lidas dos metadados salvos, sem
+        materializar as músicas na fila.
+        """
+        songs = self.queue.slice(start, stop)
+        if len(songs) < stop - start and self.backlog:
+            songs.extend(self._preview_backlog(max(start - len(self.queue), 0), stop - start - len(songs)))
+        return songs
+
     def get_queue(self) -> List[Song]:
         """Retorna lista da fila atual"""
-        return list(self.queue)
+        return self.get_slice(0, self.size())
     
     def shuffle(self) -> None:
-        """Embaralha a fila"""
-        temp_list = list(self.queue)
-        random.shuffle(temp_list)
-        self.queue = deque(temp_list)
+        """Embaralha a fila (materializa o backlog inteiro)"""
+        self._fill(sys.maxsize)
+        songs = list(self.queue)
+        random.shuffle(songs)
+        self.queue.replace_all(songs)
+        self._notify()
     
     def clear(self) -> None:
         """Limpa toda a fila"""
         self.queue.clear()
+        self.backlog.clear()
+        self._backlog_size = 0
+        self._lazy_seconds = 0
         self.current = None
         self.history.clear()
+        self._total_seconds = 0
+        self._members.clear()
+        self.generation += 1
+        self._notify()
     
     def size(self) -> int:
         """Retorna tamanho da fila"""
-        return len(self.queue)
+        return len(self.queue) + self._backlog_size
     
     def is_empty(self) -> bool:
         """Verifica se fila está vazia"""
-        return len(self.queue) == 0 and self.current is None
+        return self.size() == 0 and self.current is None
     
     def get_history(self, limit: int = 10) -> List[Song]:
         """Retorna últimas músicas tocadas"""
-        return self.history[-limit:]
+        return self.history.recent(limit)
+
+    def total_seconds(self) -> int:
+        """Retorna a duração total da fila em segundos (O(1))"""
+        return self._total_seconds + self._lazy_seconds
     
     def total_duration(self) -> tuple:
         """Retorna duração total da fila (horas, minutos, segundos)"""
-        total_secs = sum(song.duration for song in self.queue)
+        total_secs = self.total_seconds()
         hours = total_secs // 3600
         minutes = (total_secs % 3600) // 60
         secs = total_secs % 60
@@ -0,0 +1,238 @@
+"""Prazo, tentativa paralela (hedge) e disjuntor para chamadas de extração"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+
+class CircuitOpenError(Exception):
+    """Disjuntor aberto: a chamada nem foi tentada"""
+
+
+class LatencyTracker:
+    """Últimas latências (segundos) de um tipo de chamada"""
+
+    def __init__(self, size: int = 200):
+        self.samples: Deque[float] = deque(maxlen=size)
+
+    def __len__(self) -> int:
+        return len(self.samples)
+
+    def record(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        """Percentil `p` (0 a 1) das amostras, ou None sem amostras"""
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(int(len(ordered) * p), len(ordered) - 1)]
+
+
+class CircuitBreaker:
+    """Abre após `failure_threshold` falhas seguidas e volta a testar após `reset_timeout`
+
+    Aberto, recusa as chamadas na hora. Passado o `reset_timeout`, fica
+    meio-aberto: deixa passar uma chamada de teste; se ela der certo, fecha.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0  # Falhas seguidas
+        self.opened_at: Optional[float] = None
+        self._probe_at: Optional[float] = None  # Início da chamada de teste (meio-aberto)
+
+        self.opens = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at < self.reset_timeout:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    @property
+    def closed(self) -> bool:
+        return self.opened_at is None
+
+    def allow(self) -> bool:
+        """Indica se uma chamada pode ser feita agora"""
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.OPEN:
+            return False
+        # Meio-aberto: uma chamada de teste por vez (outra se a anterior sumiu)
+        now = time.monotonic()
+        if self._probe_at is None or now - self._probe_at >= self.reset_timeout:
+            self._probe_at = now
+            return True
+        return False
+
+    def record_success(self) -> None:
+        if self.opened_at is not None:
+            logger.info("Extração voltou a responder, disjuntor fechado")
+        self.failures = 0
+        self.opened_at = None
+        self._probe_at = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.opened_at is not None:
+            # Teste falhou: continua aberto por mais um período
+            self.opened_at = time.monotonic()
+            self._probe_at = None
+        elif self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self.opens += 1
+            logger.warning(f"Disjuntor de extração aberto após {self.failures} falhas seguidas")
+
+
+class ExtractionGuard:
+    """Protege chamadas de extração contra caudas de latência e falhas em série
+
+    - Prazo: cada chamada desiste após `deadline` segundos.
+    - Hedge: se a chamada passar do percentil `hedge_percentile` das
+      latências recentes daquele tipo, uma segunda tentativa idêntica é
+      iniciada e vale a que terminar primeiro. Limitado a `max_hedge_ratio`
+      das chamadas, para não dobrar a carga quando tudo está lento.
+    - Disjuntor: falhas seguidas abrem o `CircuitBreaker`, e as chamadas
+      falham na hora com `CircuitOpenError` (o chamador serve o cache).
+
+    `is_failure` decide quais exceções contam para o disjuntor (ex.: vídeo
+    privado não é falha do serviço).
+    """
+
+    def __init__(self, deadline: float = 12.0, hedge_percentile: float = 0.95, min_samples: int = 20,
+                 min_hedge_delay: float = 0.5, max_hedge_ratio: float = 0.1,
+                 breaker: Optional[CircuitBreaker] = None,
+                 is_failure: Optional[Callable[[Exception], bool]] = None):
+        self.deadline = deadline
+        self.hedge_percentile = hedge_percentile
+        self.min_samples = min_samples
+        self.min_hedge_delay = min_hedge_delay
+        self.max_hedge_ratio = max_hedge_ratio
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+        self.is_failure = is_failure
+        self.latencies: Dict[str, LatencyTracker] = {}
+
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0  # Vezes em que a segunda tentativa terminou primeiro
+        self.timeouts = 0
+        self.short_circuited = 0
+
+    def _tracker(self, op: str) -> LatencyTracker:
+        tracker = self.latencies.get(op)
+        if tracker is None:
+            tracker = self.latencies[op] = LatencyTracker()
+        return tracker
+
+    def hedge_delay(self, op: str) -> Optional[float]:
+        """Quanto esperar antes da segunda tentativa (None = sem hedge agora)"""
+        tracker = self._tracker(op)
+        if len(tracker) < self.min_samples or self.hedged >= self.calls * self.max_hedge_ratio:
+            return None
+        return max(tracker.percentile(self.hedge_percentile), self.min_hedge_delay)
+
+    async def call(self, op: str, factory: Callable[[], Awaitable[T]], hedge: bool = True,
+                   started: Optional[asyncio.Future] = None) -> T:
+        """Executa `factory()` com prazo, hedge e disjuntor
+
+        Se `factory()` primeiro espera numa fila (ex.: vaga do agendador),
+        `started` deve ser resolvido quando ela sair da fila: prazo, hedge e
+        latência só contam a partir daí, e nada é duplicado enquanto espera.
+
+        Raises:
+            CircuitOpenError: disjuntor aberto
+            asyncio.TimeoutError: prazo esgotado
+        """
+        if not self.breaker.allow():
+            self.short_circuited += 1
+            raise CircuitOpenError(f"extração indisponível ({self.breaker.failures} falhas seguidas)")
+
+        self.calls += 1
+        first = asyncio.ensure_future(factory())
+        try:
+            if started is not None:
+                await asyncio.wait({first, started}, return_when=asyncio.FIRST_COMPLETED)
+            start = time.monotonic()
+            delay = self.hedge_delay(op) if hedge else None
+            result = await asyncio.wait_for(self._attempt(first, factory, delay), self.deadline)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            self.breaker.record_failure()
+            raise
+        except asyncio.CancelledError:
+            first.cancel()
+            raise
+        except Exception as e:
+            if self.is_failure is None or self.is_failure(e):
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()  # O serviço respondeu, só não havia o que extrair
+            raise
+
+        self.breaker.record_success()
+        self._tracker(op).record(time.monotonic() - start)
+        return result
+
+    async def _attempt(self, first: asyncio.Future, factory: Callable[[], Awaitable[T]],
+                       delay: Optional[float]) -> T:
+        if delay is None:
+            return await first
+
+        second = None
+        try:
+            done, _ = await asyncio.wait({first}, timeout=delay)
+            if done:
+                return first.result()
+
+            self.hedged += 1
+            second = asyncio.ensure_future(factory())
+            pending = {first, second}
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in (first, second):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    def stats(self) -> Dict:
+        """Contadores e latências (ms) por tipo de chamada"""
+        latencies = {}
+        for op, tracker in self.latencies.items():
+            p50, p95, p99 = (tracker.percentile(p) for p in (0.5, 0.95, 0.99))
+            latencies[op] = {
+                'p50_ms': (p50 or 0.0) * 1000,
+                'p95_ms': (p95 or 0.0) * 1000,
+                'p99_ms': (p99 or 0.0) * 1000,
+            }
+        return {
+            'calls': self.calls,
+            'hedged': self.hedged,
+            'hedge_wins': self.hedge_wins,
+            'timeouts': self.timeouts,
+            'short_circuited': self.short_circuited,
+            'breaker': self.breaker.state,
+            'latencies': latencies,
+        }
@@ -0,0 +1,175 @@
+"""Agendamento das extrações do yt-dlp por prioridade e por servidor"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Deque, Dict, Hashable, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+# Filas, da mais para a menos prioritária
+INTERACTIVE = 'interactive'  # Comandos com alguém esperando a resposta (/play, /search)
+PLAYBACK = 'playback'  # Stream da música atual ou das próximas (prefetch)
+BACKGROUND = 'background'  # Detalhes de playlists importadas, renovações, verificação de links
+LANES = (INTERACTIVE, PLAYBACK, BACKGROUND)
+
+
+class _Ticket:
+    """Pedido de vaga aguardando na fila"""
+
+    __slots__ = ('lane', 'guild_id', 'key', 'future', 'queued_at')
+
+    def __init__(self, lane: str, guild_id: Hashable, key: Optional[Hashable], future: asyncio.Future):
+        self.lane = lane
+        self.guild_id = guild_id
+        self.key = key
+        self.future = future
+        self.queued_at = time.monotonic()
+
+
+class ExtractionScheduler:
+    """Libera até `concurrency` extrações por vez, por prioridade e com rodízio entre servidores
+
+    Cada vaga liberada vai para a fila mais prioritária com pedidos. Dentro
+    de uma fila, os servidores são atendidos em rodízio, então uma playlist
+    de 200 músicas num servidor não segura os pedidos dos outros. A fila de
+    fundo nunca ocupa as últimas `reserved` vagas: um /play encontra worker
+    livre mesmo durante uma importação.
+
+    `concurrency` deve ser o número de workers do backend de extração, para
+    que a fila de espera fique aqui (ordenada) e não no executor (FIFO).
+    """
+
+    # Espera a partir da qual a liberação é registrada no log
+    SLOW_WAIT_SECONDS = 2.0
+
+    def __init__(self, concurrency: int = 2, reserved: int = 1):
+        self.concurrency = max(concurrency, 1)
+        self.reserved = min(reserved, self.concurrency - 1)
+        self.running = 0
+        # fila -> servidor -> pedidos em ordem de chegada (servidores em ordem de rodízio)
+        self._waiting: Dict[str, "OrderedDict[Hashable, Deque[_Ticket]]"] = {lane: OrderedDict() for lane in LANES}
+        self._by_key: Dict[Hashable, _Ticket] = {}
+
+        self.dispatched: Dict[str, int] = {lane: 0 for lane in LANES}
+        self.promoted = 0
+        self._waits: Dict[str, Deque[float]] = {lane: deque(maxlen=200) for lane in LANES}
+
+    def _limit(self, lane: str) -> int:
+        return self.concurrency - self.reserved if lane == BACKGROUND else self.concurrency
+
+    def _enqueue(self, ticket: _Ticket) -> None:
+        self._waiting[ticket.lane].setdefault(ticket.guild_id, deque()).append(ticket)
+
+    def _dequeue(self, ticket: _Ticket) -> None:
+        guilds = self._waiting[ticket.lane]
+        tickets = guilds.get(ticket.guild_id)
+        if tickets is None:
+            return
+        try:
+            tickets.remove(ticket)
+        except ValueError:
+            return
+        if not tickets:
+            del guilds[ticket.guild_id]
+
+    def _dispatch(self) -> None:
+        """Libera pedidos enquanto houver vagas"""
+        for lane in LANES:
+            guilds = self._waiting[lane]
+            while guilds and self.running < self._limit(lane):
+                guild_id, tickets = next(iter(guilds.items()))
+                ticket = tickets.popleft()
+                # Servidor atendido vai para o fim do rodízio
+                if tickets:
+                    guilds.move_to_end(guild_id)
+                else:
+                    del guilds[guild_id]
+                if ticket.key is not None:
+                    self._by_key.pop(ticket.key, None)
+                if ticket.future.done():
+                    continue  # Desistiu enquanto esperava
+                self.running += 1
+                self.dispatched[lane] += 1
+                waited = time.monotonic() - ticket.queued_at
+                self._waits[lane].append(waited)
+                if waited >= self.SLOW_WAIT_SECONDS:
+                    logger.warning(f"Extração ({lane}, guild {ticket.guild_id}) esperou {waited:.1f}s na fila")
+                ticket.future.set_result(None)
+            if self.running >= self.concurrency:
+                return
+
+    def _release(self) -> None:
+        self.running -= 1
+        self._dispatch()
+
+    def _release_abandoned(self, work: asyncio.Future) -> None:
+        """Libera a vaga de um trabalho que ninguém mais aguarda"""
+        if not work.cancelled():
+            work.exception()  # Marca o erro como lido (ninguém mais vai tratá-lo)
+        self._release()
+
+    async def run(self, lane: str, guild_id: Optional[Hashable], factory: Callable[[], Awaitable[T]],
+                  key: Optional[Hashable] = None, started: Optional[asyncio.Future] = None) -> T:
+        """Espera uma vaga na fila `lane` e executa `factory()`
+
+        `key` identifica o pedido para `promote` (ex.: a chave do SingleFlight).
+        `started`, se dado, é resolvido quando a vaga é liberada.
+        """
+        future = asyncio.get_running_loop().create_future()
+        ticket = _Ticket(lane, guild_id, key, future)
+        self._enqueue(ticket)
+        if key is not None:
+            self._by_key[key] = ticket
+        self._dispatch()
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._release()  # A vaga chegou junto com o cancelamento
+            else:
+                self._dequeue(ticket)
+                if key is not None and self._by_key.get(key) is ticket:
+                    del self._by_key[key]
+            raise
+
+        if started is not None and not started.done():
+            started.set_result(None)
+        # A vaga só volta quando o trabalho termina de fato: cancelar quem
+        # espera (prazo, hedge perdedor) não interrompe a thread/processo
+        work = asyncio.ensure_future(factory())
+        try:
+            return await asyncio.shield(work)
+        finally:
+            if work.done():
+                self._release()
+            else:
+                work.add_done_callback(self._release_abandoned)
+
+    def promote(self, key: Hashable, lane: str) -> None:
+        """Sobe para `lane` um pedido ainda na fila (ex.: /play pediu o que o fundo já esperava)"""
+        ticket = self._by_key.get(key)
+        if ticket is None or LANES.index(lane) >= LANES.index(ticket.lane):
+            return
+        self._dequeue(ticket)
+        ticket.lane = lane
+        self._enqueue(ticket)
+        self.promoted += 1
+        self._dispatch()
+
+    def stats(self) -> Dict:
+        """Pedidos na fila, liberados e espera (ms) por fila"""
+        lanes = {}
+        for lane in LANES:
+            waits = sorted(self._waits[lane])
+            lanes[lane] = {
+                'queued': sum(len(tickets) for tickets in self._waiting[lane].values()),
+                'dispatched': self.dispatched[lane],
+                'wait_ms_avg': sum(waits) / len(waits) * 1000 if waits else 0.0,
+                'wait_ms_p95': waits[min(int(len(waits) * 0.95), len(waits) - 1)] * 1000 if waits else 0.0,
+                'wait_ms_max': waits[-1] * 1000 if waits else 0.0,
+            }
+        return {'running': self.running, 'promoted': self.promoted, 'lanes': lanes}
@@ -0,0 +1,267 @@
+"""Índices em memória para autocomplete e busca de músicas salvas"""
+import re
+import unicodedata
+from bisect import bisect_left, insort
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+
+def apply_changes(data: Dict, changes: Dict) -> None:
+    """Aplica em `data` as mudanças de um `take_changes` (None = chave removida)"""
+    for key, value in changes.items():
+        if value is None:
+            data.pop(key, None)
+        else:
+            data[key] = value
+
+
+def normalize(text: str) -> str:
+    """Minúsculas, sem acentos e com espaços colapsados"""
+    decomposed = unicodedata.normalize('NFKD', text)
+    stripped = ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return ' '.join(stripped.casefold().split())
+
+
+class PrefixIndex:
+    """Índice de prefixos por usuário em listas ordenadas (busca com bisect)
+
+    Cada texto é indexado a partir do início de cada uma das primeiras
+    palavras, então "rock" encontra tanto "Rock Nacional" quanto "Classic
+    Rock". Uma busca é um bisect mais a leitura dos resultados: O(log n + k).
+    """
+
+    # Palavras iniciais de onde um texto pode ser encontrado
+    MAX_WORDS = 6
+
+    # Tamanho máximo de cada chave (prefixos digitados são menores que isso)
+    MAX_KEY_LENGTH = 64
+
+    def __init__(self):
+        # (user_id, tipo) -> [(chave normalizada, texto, valor)], ordenada
+        self.entries: Dict[Tuple[str, str], List[Tuple[str, str, str]]] = {}
+        self.changed: Set[Tuple[str, str]] = set()  # Listas alteradas desde o último take_changes
+
+    def _keys(self, text: str) -> Iterator[str]:
+        words = normalize(text).split(' ')
+        seen = set()
+        for start in range(min(len(words), self.MAX_WORDS)):
+            key = ' '.join(words[start:])[:self.MAX_KEY_LENGTH]
+            if key and key not in seen:
+                seen.add(key)
+                yield key
+
+    def add(self, user_id: str, kind: str, text: str, value: str = '') -> None:
+        """Indexa um texto (ex.: nome de playlist ou título de música)"""
+        bucket = self.entries.setdefault((user_id, kind), [])
+        self.changed.add((user_id, kind))
+        for key in self._keys(text):
+            insort(bucket, (key, text, value))
+
+    def remove(self, user_id: str, kind: str, text: str, value: str = '') -> None:
+        """Remove uma ocorrência de um texto indexado"""
+        bucket = self.entries.get((user_id, kind))
+        if not bucket:
+            return
+        self.changed.add((user_id, kind))
+        for key in self._keys(text):
+            entry = (key, text, value)
+            i = bisect_left(bucket, entry)
+            if i < len(bucket) and bucket[i] == entry:
+                del bucket[i]
+        if not bucket:
+            del self.entries[(user_id, kind)]
+
+    def search(self, user_id: str, kind: str, prefix: str, limit: int = 25) -> List[Tuple[str, str]]:
+        """Retorna até `limit` pares (texto, valor) que começam com `prefix`"""
+        bucket = self.entries.get((user_id, kind))
+        if not bucket:
+            return []
+
+        prefix = normalize(prefix)[:self.MAX_KEY_LENGTH]
+        results = []
+        seen = set()
+        i = bisect_left(bucket, (prefix,))
+        while i < len(bucket) and bucket[i][0].startswith(prefix):
+            item = bucket[i][1:]
+            if item not in seen:
+                seen.add(item)
+                results.append(item)
+                if len(results) >= limit:
+                    break
+            i += 1
+        return results
+
+    def size(self) -> int:
+        """Total de chaves indexadas"""
+        return sum(len(bucket) for bucket in self.entries.values())
+
+    def to_dict(self) -> Dict:
+        return {f"{user_id}\x1f{kind}": list(bucket) for (user_id, kind), bucket in self.entries.items()}
+
+    def take_changes(self) -> Dict:
+        """Cópia só das listas alteradas desde a última chamada, no formato do `to_dict`"""
+        changes = {
+            f"{user_id}\x1f{kind}": list(self.entries[(user_id, kind)]) if (user_id, kind) in self.entries else None
+            for user_id, kind in self.changed
+        }
+        self.changed = set()
+        return changes
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'PrefixIndex':
+        """Recarrega listas já ordenadas (sem normalizar nem ordenar de novo)"""
+        index = cls()
+        for compound, bucket in data.items():
+            user_id, kind = compound.split('\x1f', 1)
+            index.entries[(user_id, kind)] = [tuple(entry) for entry in bucket]
+        return index
+
+
+class InvertedIndex:
+    """Índice invertido (palavra -> URLs) dos títulos de todas as playlists
+
+    Cada vídeo é um documento, identificado pela URL, com um contador de
+    referências (em quantas playlists aparece). A última palavra da busca é
+    tratada como prefixo, para funcionar enquanto o usuário digita.
+    """
+
+    # Máximo de palavras do vocabulário expandidas por um prefixo
+    MAX_PREFIX_EXPANSION = 50
+
+    def __init__(self):
+        self.postings: Dict[str, Set[str]] = {}  # palavra -> URLs
+        self.docs: Dict[str, list] = {}  # url -> [título, duração, referências]
+        self._vocabulary: Optional[List[str]] = None  # Palavras ordenadas, refeitas sob demanda
+        # Alterados desde o último take_changes
+        self.changed_docs: Set[str] = set()
+        self.changed_tokens: Set[str] = set()
+
+    @staticmethod
+    def tokenize(text: str) -> List[str]:
+        """Palavras normalizadas de um texto (sem repetição, na ordem)"""
+        tokens = []
+        for token in TOKEN_PATTERN.findall(normalize(text)):
+            if (len(token) > 1 or token.isdigit()) and token not in tokens:
+                tokens.append(token)
+        return tokens
+
+    def add(self, url: str, title: str, duration: int = 0) -> None:
+        """Indexa uma ocorrência de um vídeo"""
+        self.changed_docs.add(url)
+        doc = self.docs.get(url)
+        if doc is not None:
+            doc[2] += 1
+            return
+
+        self.docs[url] = [title, duration, 1]
+        for token in self.tokenize(title):
+            self.changed_tokens.add(token)
+            posting = self.postings.get(token)
+            if posting is None:
+                posting = self.postings[token] = set()
+                self._vocabulary = None
+            posting.add(url)
+
+    def remove(self, url: str) -> None:
+        """Remove uma ocorrência; o vídeo sai do índice quando não resta nenhuma"""
+        doc = self.docs.get(url)
+        if doc is None:
+            return
+        self.changed_docs.add(url)
+        doc[2] -= 1
+        if doc[2] > 0:
+            return
+
+        del self.docs[url]
+        for token in self.tokenize(doc[0]):
+            self.changed_tokens.add(token)
+            posting = self.postings.get(token)
+            if posting is not None:
+                posting.discard(url)
+                if not posting:
+                    del self.postings[token]
+                    self._vocabulary = None
+
+    def update(self, url: str, title: str, duration: int) -> None:
+        """Troca título e duração de um vídeo indexado, mantendo as referências"""
+        doc = self.docs.get(url)
+        if doc is None:
+            return
+        refs = doc[2]
+        doc[2] = 1
+        self.remove(url)
+        self.add(url, title, duration)
+        self.docs[url][2] = refs
+
+    def _prefix_matches(self, prefix: str) -> Set[str]:
+        """URLs de todas as palavras que começam com `prefix`"""
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self.postings)
+        vocabulary = self._vocabulary
+        urls: Set[str] = set()
+        i = bisect_left(vocabulary, prefix)
+        end = min(i + self.MAX_PREFIX_EXPANSION, len(vocabulary))
+        while i < end and vocabulary[i].startswith(prefix):
+            urls |= self.postings[vocabulary[i]]
+            i += 1
+        return urls
+
+    def search(self, query: str, limit: int = 10) -> List[Dict]:
+        """Vídeos com todas as palavras da busca, mais referenciados primeiro
+
+        Returns:
+            Dicts com url, title, duration e refs
+        """
+        tokens = self.tokenize(query)
+        if not tokens:
+            return []
+
+        *exact, last = tokens
+        candidates = [self.postings.get(token, set()) for token in exact]
+        candidates.append(self._prefix_matches(last))
+        candidates.sort(key=len)
+        matches = set(candidates[0])
+        for posting in candidates[1:]:
+            if not matches:
+                break
+            matches &= posting
+
+        ranked = sorted(matches, key=lambda url: (-self.docs[url][2], self.docs[url][0]))[:limit]
+        return [
+            {'url': url, 'title': self.docs[url][0], 'duration': self.docs[url][1], 'refs': self.docs[url][2]}
+            for url in ranked
+        ]
+
+    def get(self, url: str) -> Optional[Dict]:
+        """Dados de um vídeo indexado"""
+        doc = self.docs.get(url)
+        if doc is None:
+            return None
+        return {'url': url, 'title': doc[0], 'duration': doc[1], 'refs': doc[2]}
+
+    def to_dict(self) -> Dict:
+        return {
+            'docs': {url: list(doc) for url, doc in self.docs.items()},
+            'postings': {token: list(urls) for token, urls in self.postings.items()},
+        }
+
+    def take_changes(self) -> Dict:
+        """Cópia só dos vídeos e palavras alterados desde a última chamada, no formato do `to_dict`"""
+        changes = {
+            'docs': {url: list(self.docs[url]) if url in self.docs else None for url in self.changed_docs},
+            'postings': {
+                token: list(self.postings[token]) if token in self.postings else None
+                for token in self.changed_tokens
+            },
+        }
+        self.changed_docs = set()
+        self.changed_tokens = set()
+        return changes
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'InvertedIndex':
+        index = cls()
+        index.docs = {url: list(doc) for url, doc in data['docs'].items()}
+        index.postings = {token: set(urls) for token, urls in data['postings'].items()}
+        return index
@@ -0,0 +1,180 @@
+"""Sequência indexada em blocos para filas longas"""
+from itertools import chain, islice
+from typing import Generic, Iterable, Iterator, List, Tuple, TypeVar
+
+T = TypeVar('T')
+
+
+class ChunkedList(Generic[T]):
+    """Lista dividida em blocos de até `2 * load` itens
+
+    Uma árvore de Fenwick sobre o tamanho dos blocos localiza qualquer posição
+    em O(log n). Inserir ou remover no meio só desloca os itens de um bloco,
+    em vez da sequência inteira como em `list`/`deque`. Blocos que crescem
+    demais são divididos e blocos pequenos são unidos ao vizinho.
+    """
+
+    def __init__(self, iterable: Iterable[T] = (), load: int = 256):
+        self._load = load
+        self._chunks: List[List[T]] = []
+        self._tree: List[int] = [0]  # Fenwick (1-indexada) com o tamanho de cada bloco
+        self._len = 0
+        self.extend(iterable)
+
+    # ===== ÍNDICE =====
+
+    def _rebuild_index(self) -> None:
+        """Reconstrói a árvore após dividir, unir ou remover blocos (O(blocos))"""
+        count = len(self._chunks)
+        tree = [0] * (count + 1)
+        for i, chunk in enumerate(self._chunks, 1):
+            tree[i] += len(chunk)
+            parent = i + (i & -i)
+            if parent <= count:
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _update(self, chunk_index: int, delta: int) -> None:
+        """Ajusta o tamanho de um bloco na árvore (O(log blocos))"""
+        i = chunk_index + 1
+        count = len(self._chunks)
+        while i <= count:
+            self._tree[i] += delta
+            i += i & -i
+
+    def _locate(self, index: int) -> Tuple[int, int]:
+        """Converte uma posição em (bloco, posição dentro do bloco)"""
+        pos = 0
+        remaining = index
+        count = len(self._chunks)
+        step = 1 << (count.bit_length() - 1) if count else 0
+        while step:
+            nxt = pos + step
+            if nxt <= count and self._tree[nxt] <= remaining:
+                pos = nxt
+                remaining -= self._tree[nxt]
+            step >>= 1
+        return pos, remaining
+
+    def _normalize(self, index: int) -> int:
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError("índice fora da sequência")
+        return index
+
+    # ===== LEITURA =====
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __bool__(self) -> bool:
+        return self._len > 0
+
+    def __iter__(self) -> Iterator[T]:
+        return chain.from_iterable(self._chunks)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._len)
+            if step != 1:
+                return list(self)[index]
+            return self.slice(start, stop)
+        chunk, offset = self._locate(self._normalize(index))
+        return self._chunks[chunk][offset]
+
+    def slice(self, start: int, stop: int) -> List[T]:
+        """Copia só os itens de [start, stop), sem percorrer o resto"""
+        start = max(start, 0)
+        stop = min(stop, self._len)
+        if start >= stop:
+            return []
+        chunk, offset = self._locate(start)
+        items = chain(islice(self._chunks[chunk], offset, None), *self._chunks[chunk + 1:])
+        return list(islice(items, stop - start))
+
+    # ===== ESCRITA =====
+
+    def append(self, item: T) -> None:
+        if self._chunks and len(self._chunks[-1]) < 2 * self._load:
+            self._chunks[-1].append(item)
+            self._update(len(self._chunks) - 1, 1)
+        else:
+            self._chunks.append([item])
+            self._rebuild_index()
+        self._len += 1
+
+    def extend(self, iterable: Iterable[T]) -> None:
+        """Adiciona vários itens reconstruindo o índice uma única vez"""
+        items = list(iterable)
+        if not items:
+            return
+        self._len += len(items)
+        if self._chunks:
+            room = max(2 * self._load - len(self._chunks[-1]), 0)
+            self._chunks[-1].extend(items[:room])
+            items = items[room:]
+        for start in range(0, len(items), self._load):
+            self._chunks.append(items[start:start + self._load])
+        self._rebuild_index()
+
+    def insert(self, index: int, item: T) -> None:
+        """Insere antes da posição `index` (posições além do fim vão para o fim)"""
+        if index < 0:
+            index = max(index + self._len, 0)
+        if index >= self._len:
+            self.append(item)
+            return
+
+        chunk_index, offset = self._locate(index)
+        chunk = self._chunks[chunk_index]
+        chunk.insert(offset, item)
+        self._len += 1
+        if len(chunk) > 2 * self._load:
+            self._chunks[chunk_index:chunk_index + 1] = [chunk[:self._load], chunk[self._load:]]
+            self._rebuild_index()
+        else:
+            self._update(chunk_index, 1)
+
+    def pop(self, index: int = -1) -> T:
+        """Remove e retorna o item da posição `index`"""
+        chunk_index, offset = self._locate(self._normalize(index))
+        chunk = self._chunks[chunk_index]
+        item = chunk.pop(offset)
+        self._len -= 1
+
+        if not chunk:
+            del self._chunks[chunk_index]
+            self._rebuild_index()
+        elif len(chunk) < self._load // 2 and len(self._chunks) > 1:
+            self._merge(chunk_index)
+        else:
+            self._update(chunk_index, -1)
+        return item
+
+    def _merge(self, chunk_index: int) -> None:
+        """Une um bloco pequeno ao vizinho, dividindo de novo se ficar grande"""
+        left = chunk_index if chunk_index + 1 < len(self._chunks) else chunk_index - 1
+        merged = self._chunks[left] + self._chunks[left + 1]
+        if len(merged) > 2 * self._load:
+            half = len(merged) // 2
+            self._chunks[left:left + 2] = [merged[:half], merged[half:]]
+        else:
+            self._chunks[left:left + 2] = [merged]
+        self._rebuild_index()
+
+    def move(self, source: int, destination: int) -> T:
+        """Move um item de `source` para `destination`"""
+        item = self.pop(source)
+        self.insert(destination, item)
+        return item
+
+    def clear(self) -> None:
+        self._chunks = []
+        self._tree = [0]
+        self._len = 0
+
+    def replace_all(self, items: Iterable[T]) -> None:
+        """Substitui todo o conteúdo (ex.: após embaralhar)"""
+        self.clear()
+        self.extend(items)
@@ -0,0 +1,181 @@
+"""Sessões de reprodução por servidor (guild)"""
+import sys
+import time
+import logging
+from collections import deque
+from typing import Callable, Dict, List, Optional, Set
+from utils.queue import MusicQueue
+
+logger = logging.getLogger(__name__)
+
+
+def _deep_sizeof(obj, seen: set) -> int:
+    """Soma aproximada de memória de um objeto e seus filhos"""
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, (str, bytes, int, float, bool)) or obj is None:
+        return size
+
+    if isinstance(obj, dict):
+        size += sum(_deep_sizeof(k, seen) + _deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+        size += sum(_deep_sizeof(item, seen) for item in obj)
+    else:
+        if hasattr(obj, '__dict__'):
+            size += _deep_sizeof(vars(obj), seen)
+        for slot in getattr(type(obj), '__slots__', ()):
+            if hasattr(obj, slot):
+                size += _deep_sizeof(getattr(obj, slot), seen)
+    return size
+
+
+class GuildSession:
+    """Estado de reprodução de um único servidor"""
+
+    # Atributos que pertencem ao discord.py e não entram na medição de memória
+    _EXTERNAL = ('voice_client', 'playback_task', 'gapless', 'preload_task', 'resume_task')
+
+    def __init__(self, guild_id: int):
+        self.guild_id = guild_id
+        self.queue = MusicQueue()
+        self.voice_client = None
+        self.is_playing = False
+        self.volume = 1.0  # Volume padrão (100%)
+        self.skip_votes: Set[int] = set()  # IDs dos usuários que votaram para skip
+        self.skip_votes_needed = 0  # Votos necessários para skip
+        self.playback_task = None  # Future da transição para a próxima música
+        self.stop_requested = False  # Parada pedida por usuário (skip/stop), não por falha
+        self.prefetcher = None  # Prefetcher das próximas músicas (configurado pelo cog)
+        self.detail_resolver = None  # Completa músicas importadas de playlists (configurado pelo cog)
+        self.gapless = None  # GaplessSource em reprodução (configurado pelo cog)
+        self.preload_task = None  # Abertura antecipada da próxima música
+        self.resume_task = None  # Nova tentativa depois de uma falha da extração (fila pausada)
+        self.track_ended_at: Optional[float] = None  # Fim da última música (para medir o silêncio)
+        self.gaps: deque = deque(maxlen=50)  # Silêncio entre músicas com FFmpeg a frio, em segundos
+        self.gapless_gaps: deque = deque(maxlen=50)  # Silêncio nas trocas sem pausa, em segundos
+        self.last_activity = time.monotonic()
+
+    def touch(self) -> None:
+        """Marca a sessão como ativa"""
+        self.last_activity = time.monotonic()
+
+    def is_connected(self) -> bool:
+        """Verifica se a sessão tem um voice client conectado"""
+        return self.voice_client is not None and self.voice_client.is_connected()
+
+    def is_idle(self, timeout: float) -> bool:
+        """Verifica se a sessão está parada há mais de `timeout` segundos"""
+        if self.is_playing or self.is_connected():
+            return False
+        return time.monotonic() - self.last_activity >= timeout
+
+    def stop_playback(self) -> None:
+        """Interrompe a música atual a pedido do usuário"""
+        if self.voice_client:
+            self.stop_requested = True
+            # Próxima música já aberta: troca sem parar o player
+            if (self.gapless is not None and self.voice_client.source is self.gapless
+                    and not self.voice_client.is_paused() and self.gapless.skip()):
+                return
+            self.voice_client.stop()
+
+    def record_gap(self, gap: float, gapless: bool = False) -> None:
+        """Registra o silêncio entre o fim de uma música e o primeiro frame da seguinte"""
+        (self.gapless_gaps if gapless else self.gaps).append(gap)
+
+    def average_gap(self, gapless: bool = False) -> Optional[float]:
+        """Retorna a média do silêncio entre músicas (a frio ou sem pausa)"""
+        gaps = list(self.gapless_gaps if gapless else self.gaps)
+        if not gaps:
+            return None
+        return sum(gaps) / len(gaps)
+
+    def reset(self) -> None:
+        """Limpa fila e estado de reprodução (mantém volume)"""
+        self.queue.clear()
+        self.is_playing = False
+        self.skip_votes.clear()
+        self.skip_votes_needed = 0
+        self.track_ended_at = None
+        self.gapless = None
+        if self.preload_task:
+            self.preload_task.cancel()
+            self.preload_task = None
+        if self.resume_task:
+            self.resume_task.cancel()
+            self.resume_task = None
+        if self.detail_resolver:
+            self.detail_resolver.cancel()
+
+    def close(self) -> None:
+        """Libera recursos da sessão antes de descartá-la"""
+        self.reset()
+        if self.prefetcher:
+            self.prefetcher.close()
+
+    def memory_usage(self) -> int:
+        """Retorna uso aproximado de memória da sessão em bytes"""
+        seen = set()
+        for name in self._EXTERNAL:
+            value = getattr(self, name)
+            if value is not None:
+                seen.add(id(value))
+        return _deep_sizeof(self, seen)
+
+
+class SessionManager:
+    """Registro de sessões de reprodução indexado por guild"""
+
+    def __init__(self, idle_timeout: float = 300.0,
+                 on_create: Optional[Callable[[GuildSession], None]] = None):
+        self.idle_timeout = idle_timeout
+        self.on_create = on_create  # Configura sessões recém-criadas
+        self.sessions: Dict[int, GuildSession] = {}
+
+    def get(self, guild_id: int) -> GuildSession:
+        """Retorna a sessão do servidor, criando-a se necessário"""
+        session = self.sessions.get(guild_id)
+        if session is None:
+            session = GuildSession(guild_id)
+            if self.on_create:
+                self.on_create(session)
+            self.sessions[guild_id] = session
+            logger.info(f"Sessão criada para guild {guild_id} ({len(self.sessions)} ativas)")
+        session.touch()
+        return session
+
+    def peek(self, guild_id: int) -> Optional[GuildSession]:
+        """Retorna a sessão do servidor sem criar uma nova"""
+        return self.sessions.get(guild_id)
+
+    def drop(self, guild_id: int) -> bool:
+        """Remove a sessão de um servidor"""
+        session = self.sessions.pop(guild_id, None)
+        if session is None:
+            return False
+        session.close()
+        logger.info(f"Sessão removida para guild {guild_id} ({len(self.sessions)} ativas)")
+        return True
+
+    def drop_idle(self) -> List[int]:
+        """Remove sessões ociosas. Retorna IDs removidos"""
+        idle = [
+            guild_id for guild_id, session in self.sessions.items()
+            if session.is_idle(self.idle_timeout)
+        ]
+        for guild_id in idle:
+            self.drop(guild_id)
+        return idle
+
+    def memory_usage(self) -> Dict[int, int]:
+        """Retorna uso aproximado de memória (bytes) de cada sessão"""
+        return {guild_id: session.memory_usage() for guild_id, session in self.sessions.items()}
+
+    def __len__(self) -> int:
+        return len(self.sessions)
+
+    def __iter__(self):
+        return iter(list(self.sessions.values()))
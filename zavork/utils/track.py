@@ -0,0 +1,64 @@
+"""Registro compacto e compartilhado dos dados de um vídeo"""
+import re
+import sys
+from typing import Optional
+from weakref import WeakValueDictionary
+
+# Extrai o ID de URLs watch?v=, youtu.be/, shorts/ e embed/
+VIDEO_ID_PATTERN = re.compile(
+    r'(?:youtube\.com/(?:watch\?(?:.*&)?v=|shorts/|embed/|live/)|youtu\.be/)([A-Za-z0-9_-]{11})'
+)
+
+WATCH_URL = "https://www.youtube.com/watch?v="
+
+
+def shared_text(text: Optional[str]) -> Optional[str]:
+    """Mesma string para textos iguais (ex.: um título repetido em várias playlists)"""
+    return sys.intern(text) if isinstance(text, str) else text
+
+
+class Track:
+    """Identidade de um vídeo (ID ou URL), armazenada uma única vez e imutável
+
+    `Track.intern` devolve sempre o mesmo objeto para o mesmo vídeo enquanto
+    alguma fila ou playlist o referenciar. Para vídeos do YouTube a URL não é
+    guardada: é remontada a partir do ID.
+
+    Título e duração não ficam aqui: cada música de fila ou de playlist tem
+    os seus, para que uma atualização em tempo de execução (ex.: detalhes
+    resolvidos de uma música na fila) não altere as playlists salvas.
+    """
+
+    __slots__ = ('video_id', '_url', '__weakref__')
+
+    _interned: "WeakValueDictionary[str, Track]" = WeakValueDictionary()
+
+    def __init__(self, video_id: Optional[str], url: Optional[str]):
+        object.__setattr__(self, 'video_id', video_id)
+        object.__setattr__(self, '_url', url)  # Só para URLs que não são de vídeo do YouTube
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Track é imutável")
+
+    @property
+    def url(self) -> str:
+        return self._url if self._url is not None else WATCH_URL + self.video_id
+
+    @classmethod
+    def intern(cls, url: str) -> 'Track':
+        """Retorna o registro compartilhado do vídeo, criando-o se preciso"""
+        match = VIDEO_ID_PATTERN.search(url)
+        key = match.group(1) if match else url
+        track = cls._interned.get(key)
+        if track is None:
+            track = cls(key, None) if match else cls(None, url)
+            cls._interned[key] = track
+        return track
+
+    @classmethod
+    def interned_count(cls) -> int:
+        """Quantidade de vídeos distintos em memória"""
+        return len(cls._interned)
+
+    def __repr__(self) -> str:
+        return f"Track({self.url!r})"
@@ -0,0 +1,170 @@
+"""Verificação em segundo plano dos links salvos nas playlists"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+Checker = Callable[[List[str]], Awaitable[List[Dict]]]
+
+
+class LinkValidator:
+    """Verifica periodicamente, em lotes, se os vídeos salvos ainda existem
+
+    A cada `interval` segundos separa até `batch_size` URLs nunca verificadas
+    (ou verificadas há mais de `recheck_after` segundos) e as extrai numa
+    única tarefa do backend de extração, ocupando um só worker. Vídeos
+    removidos, privados ou bloqueados são marcados como mortos; título e
+    duração desatualizados são corrigidos em todas as playlists.
+
+    Roda com prioridade baixa: enquanto `is_busy()` indicar extrações
+    interativas em andamento, a rodada é adiada. Erros temporários (ex.: HTTP
+    429) dobram o intervalo, até `max_interval`.
+    """
+
+    # Trechos de erro que indicam limite de requisições do YouTube
+    RATE_LIMIT_MARKERS = ('429', 'too many requests')
+
+    # Espera antes de tentar de novo um link que deu erro temporário
+    ERROR_RETRY_SECONDS = 3600
+
+    def __init__(self, check: Checker, manager, is_busy: Optional[Callable[[], bool]] = None,
+                 batch_size: int = 5, interval: float = 30.0, recheck_after: float = 7 * 86400,
+                 max_interval: float = 600.0):
+        self.check = check
+        self.manager = manager  # PlaylistManager: URLs salvas e resultado das verificações
+        self.is_busy = is_busy
+        self.batch_size = batch_size
+        self.interval = interval
+        self.current_interval = interval
+        self.recheck_after = recheck_after
+        self.max_interval = max_interval
+        self._task: Optional[asyncio.Task] = None
+
+        self._urgent: Deque[str] = deque()  # Falharam ao tocar: verificadas primeiro
+        self._urgent_set: Set[str] = set()
+        self._cycle: List[str] = []  # Retrato das URLs salvas percorrido em rodízio
+        self._position = 0
+        self._failed_at: Dict[str, float] = {}  # url -> último erro temporário
+
+        self.checked = 0
+        self.dead = 0
+        self.refreshed = 0
+        self.errors = 0
+        self.deferred = 0  # Rodadas adiadas por extrações interativas
+
+    def start(self) -> None:
+        """Inicia a verificação periódica"""
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._loop())
+
+    def close(self) -> None:
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def report(self, url: str) -> None:
+        """Pede a verificação prioritária de um link salvo (ex.: falhou ao tocar)"""
+        if url in self.manager.library.docs and url not in self._urgent_set:
+            self._urgent.append(url)
+            self._urgent_set.add(url)
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.current_interval)
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"Erro na verificação de links: {e}")
+
+    def _due(self, url: str, now: float) -> bool:
+        failed = self._failed_at.get(url)
+        if failed is not None and now - failed < self.ERROR_RETRY_SECONDS:
+            return False
+        checked = self.manager.last_checked(url)
+        return checked is None or now - checked >= self.recheck_after
+
+    def _next_batch(self) -> List[str]:
+        """Próximas URLs a verificar: prioritárias e depois o rodízio das salvas"""
+        batch = []
+        while self._urgent and len(batch) < self.batch_size:
+            url = self._urgent.popleft()
+            self._urgent_set.discard(url)
+            batch.append(url)
+
+        now = time.time()
+        restarted = False
+        while len(batch) < self.batch_size:
+            if self._position >= len(self._cycle):
+                if restarted:
+                    break  # Percorreu tudo nesta rodada
+                self._cycle = self.manager.saved_urls()
+                self._position = 0
+                restarted = True
+                continue
+            url = self._cycle[self._position]
+            self._position += 1
+            if url in self.manager.library.docs and url not in batch and self._due(url, now):
+                batch.append(url)
+        return batch
+
+    async def run_once(self) -> int:
+        """Verifica um lote. Retorna quantos links foram verificados"""
+        if self.is_busy and self.is_busy():
+            self.deferred += 1
+            return 0
+
+        batch = self._next_batch()
+        if not batch:
+            return 0
+
+        rate_limited = False
+        for result in await self.check(batch):
+            url = result['url']
+            self._failed_at.pop(url, None)
+            if result['status'] == 'ok':
+                self.manager.mark_link(url, dead=False)
+                await self._refresh_metadata(url, result)
+            elif result['status'] == 'dead':
+                self.dead += 1
+                self.manager.mark_link(url, dead=True, reason=result['reason'])
+                logger.warning(f"Link indisponível em playlists: {url} ({result['reason'][:100]})")
+            else:
+                # Falha temporária: fica para o próximo rodízio
+                self.errors += 1
+                self._failed_at[url] = time.time()
+                reason = result['reason'].lower()
+                rate_limited = rate_limited or any(marker in reason for marker in self.RATE_LIMIT_MARKERS)
+                continue
+            self.checked += 1
+
+        if rate_limited:
+            self.current_interval = min(self.current_interval * 2, self.max_interval)
+            logger.warning(f"Verificação de links limitada pelo YouTube, próximo lote em {self.current_interval:.0f}s")
+        else:
+            self.current_interval = self.interval
+        return len(batch)
+
+    async def _refresh_metadata(self, url: str, result: Dict) -> None:
+        """Corrige título e duração salvos se mudaram no YouTube"""
+        saved = self.manager.library_song(url)
+        if not saved or not result.get('title'):
+            return
+        duration = result.get('duration') or saved['duration']
+        if result['title'] != saved['title'] or duration != saved['duration']:
+            await self.manager.update_song_metadata(url, result['title'], duration)
+            self.refreshed += 1
+
+    def stats(self) -> Dict:
+        """Retorna contadores da verificação"""
+        return {
+            'checked': self.checked,
+            'dead': self.dead,
+            'refreshed': self.refreshed,
+            'errors': self.errors,
+            'deferred': self.deferred,
+            'urgent': len(self._urgent),
+            'interval': self.current_interval,
+        }
@@ -1,7 +1,21 @@
 import yt_dlp
-from typing import Optional, Dict, List
+from typing import AsyncIterator, Awaitable, Callable, Optional, Dict, List
 import asyncio
+import logging
+import os
+import threading
 from concurrent.futures import ThreadPoolExecutor
+from utils.cache import MetadataCache, StreamCache, QueryCache, SingleFlight
+from utils.extractor import ThreadExtractor
+from utils.scheduler import ExtractionScheduler, INTERACTIVE, PLAYBACK, BACKGROUND
+from utils.resilience import ExtractionGuard, CircuitOpenError
+from utils.track import VIDEO_ID_PATTERN, WATCH_URL
+
+logger = logging.getLogger(__name__)
+
+# Falhas da extração em si (disjuntor aberto, prazo esgotado), não do vídeo
+UNAVAILABLE_ERRORS = (CircuitOpenError, asyncio.TimeoutError)
+
 
 class YouTubePlayer:
     """Handler para buscar e baixar informações do YouTube"""
@@ -16,6 +30,42 @@ class YouTubePlayer:
         'socket_timeout': 30,
     }
     
+    # Opções para busca rápida: só lista os resultados, sem resolver formatos
+    FLAT_SEARCH_OPTIONS = {
+        'extract_flat': 'in_playlist',
+        'default_search': 'ytsearch',
+        'quiet': True,
+        'no_warnings': True,
+        'socket_timeout': 30,
+    }
+    
+    # Opções para listar playlists: entradas flat, paginadas sob demanda
+    PLAYLIST_OPTIONS = {
+        'extract_flat': 'in_playlist',
+        'lazy_playlist': True,
+        'quiet': True,
+        'no_warnings': True,
+        'socket_timeout': 30,
+    }
+    
+    # Títulos que o YouTube usa para entradas indisponíveis em playlists
+    UNAVAILABLE_TITLES = ('[Private video]', '[Deleted video]')
+    
+    # Opções para verificar vídeos salvos (perfil próprio no pool de instâncias)
+    VALIDATE_OPTIONS = {
+        'format': 'bestaudio/best',
+        'noplaylist': True,
+        'quiet': True,
+        'no_warnings': True,
+        'socket_timeout': 15,
+    }
+    
+    # Trechos de erros do yt-dlp que indicam vídeo indisponível de vez
+    DEAD_MARKERS = (
+        'video unavailable', 'private video', 'has been removed', 'been terminated',
+        'not available in your country', 'no longer available', 'does not exist',
+    )
+    
     # Opções para download de áudio
     DOWNLOAD_OPTIONS = {
         'format': 'bestaudio/best',
@@ -28,88 +78,444 @@ class YouTubePlayer:
         'no_warnings': True,
     }
     
-    def __init__(self):
-        self.executor = ThreadPoolExecutor(max_workers=2)
+    # Intervalo entre verificações de URLs de stream perto de expirar
+    REFRESH_INTERVAL = 60
+
+    def __init__(self, metadata_cache: Optional[MetadataCache] = None,
+                 stream_cache: Optional[StreamCache] = None, extractor=None,
+                 query_cache: Optional[QueryCache] = None, guard: Optional[ExtractionGuard] = None):
+        # Backend de extração (threads ou processos), ver utils/extractor.py
+        self.extractor = extractor if extractor is not None else ThreadExtractor(workers=2)
+        # Downloads (cache local de áudio) em uma thread própria, fora das extrações
+        self.download_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='yt-dlp-download')
+        # Listagem de playlists (pode levar vários segundos paginando)
+        self.playlist_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='yt-dlp-playlist')
+        self.ffmpeg_path: Optional[str] = None
+        self.metadata_cache = metadata_cache
+        self.stream_cache = stream_cache if stream_cache is not None else StreamCache()
+        self.query_cache = query_cache if query_cache is not None else QueryCache()
+        # Buscas e extrações idênticas simultâneas compartilham uma única execução
+        self.inflight = SingleFlight()
+        # Ordem das extrações: interativas, reprodução e fundo, com rodízio entre servidores
+        self.scheduler = ExtractionScheduler(concurrency=getattr(self.extractor, 'workers', 2))
+        # Prazo, hedge e disjuntor; erros de vídeo indisponível não contam como falha do serviço
+        self.guard = guard if guard is not None else ExtractionGuard()
+        if self.guard.is_failure is None:
+            self.guard.is_failure = lambda error: not self.is_unavailable_error(str(error))
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Inicia a renovação antecipada de URLs de stream"""
+        self.extractor.start()
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(self._refresh_streams())
+
+    def close(self) -> None:
+        """Para tarefas de fundo"""
+        if self._refresh_task:
+            self._refresh_task.cancel()
+            self._refresh_task = None
+        self.extractor.close()
+        self.download_executor.shutdown(wait=False, cancel_futures=True)
+        self.playlist_executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _refresh_streams(self) -> None:
+        """Renova em segundo plano URLs usadas recentemente que vão expirar"""
+        while True:
+            await asyncio.sleep(self.REFRESH_INTERVAL)
+            for video_id in self.stream_cache.due_for_refresh():
+                # Se a extração falhar, get_info devolve a URL antiga: só conta se a validade aumentou
+                expires = self.stream_cache.expires_at(video_id) or 0
+                await self.get_info(self.watch_url(video_id), lane=BACKGROUND)
+                if (self.stream_cache.expires_at(video_id) or 0) > expires:
+                    self.stream_cache.refreshes += 1
     
-    async def search(self, query: str, limit: int = 1) -> List[Dict]:
+    async def search(self, query: str, limit: int = 1, flat: bool = False,
+                     guild_id: Optional[int] = None) -> List[Dict]:
         """Busca músicas no YouTube
         
         Args:
-            query: Termo de busca
+            query: Termo de busca ou URL de vídeo
             limit: Número de resultados
+            flat: Busca rápida (só ID, título e duração, sem resolver formatos)
+            guild_id: Servidor que pediu (rodízio do agendador)
             
         Returns:
             Lista de dicts com informações das músicas
         """
-        loop = asyncio.get_event_loop()
-        
+        # URL de vídeo já conhecida: responde direto do cache
+        cached = self._cached_metadata(query)
+        if cached:
+            stream_url = self.stream_cache.get(cached['id'])
+            return [{
+                'url': self.watch_url(cached['id']),
+                'title': cached['title'],
+                'duration': cached['duration'],
+                'id': cached['id'],
+                'stream_url': stream_url,
+                'stream_expires': self.stream_cache.expires_at(cached['id']) if stream_url else None,
+                'codec': self.stream_cache.codec(cached['id']) if stream_url else None,
+            }]
+
+        key = self.query_cache.key(query, limit, flat)
+        results = self.query_cache.get(key)
+        if results is not None:
+            return results
+
         try:
-            with yt_dlp.YoutubeDL(self.YDL_OPTIONS) as ydl:
-                def _search():
-                    return ydl.extract_info(f"ytsearch{limit}:{query}", download=False)
-                
-                result = await loop.run_in_executor(self.executor, _search)
-                
-            if result['_type'] == 'playlist':
-                entries = result['entries'][:limit]
-                return [
-                    {
-                        'url': f"https://www.youtube.com/watch?v={entry.get('id')}",
-                        'title': entry.get('title'),
-                        'duration': entry.get('duration', 0),
-                        'id': entry.get('id'),
-                    }
-                    for entry in entries
-                ]
+            results = await self.inflight.run(
+                ('search', key), lambda: self._search(query, limit, flat, key, guild_id)
+            )
         except Exception as e:
-            print(f"Erro ao buscar no YouTube: {e}")
-            return []
+            logger.error(f"Erro ao buscar no YouTube: {self.describe_error(e)}")
+            # Extração lenta ou fora do ar: resultados antigos valem mais que nada
+            stale = self.query_cache.get_stale(key)
+            if stale:
+                logger.info(f"Servindo busca do cache expirado: {query}")
+            return stale or []
+        return [dict(result) for result in results]
+
+    async def _search(self, query: str, limit: int, flat: bool, key: tuple,
+                      guild_id: Optional[int] = None) -> List[Dict]:
+        """Executa a busca no yt-dlp e grava o resultado no cache de consultas"""
+        # URL de vídeo é extraída diretamente (e por completo), não pesquisada como texto
+        video_id = self.extract_video_id(query)
+        if video_id:
+            target, options, profile, flat = self.watch_url(video_id), self.YDL_OPTIONS, 'default', False
+        elif flat:
+            target, options, profile = f"ytsearch{limit}:{query}", self.FLAT_SEARCH_OPTIONS, 'flat'
+        else:
+            target, options, profile = f"ytsearch{limit}:{query}", self.YDL_OPTIONS, 'default'
+
+        result = await self._guarded(
+            'flat_search' if flat else 'search', INTERACTIVE, guild_id,
+            lambda: self.extractor.extract(target, options, profile)
+        )
+
+        if not result:
+            results = []
+        elif result.get('_type') == 'playlist':
+            # Busca por texto retorna uma playlist; URL direta retorna o próprio vídeo
+            entries = result.get('entries', [])[:limit]
+            results = [self._search_result(entry, flat) for entry in entries if entry.get('id')]
+        else:
+            results = [self._search_result(result, flat)] if result.get('id') else []
+
+        # Falhas de extração não chegam aqui: só buscas concluídas entram no cache
+        self.query_cache.put(key, results)
+        return results
+
+    async def _guarded(self, op: str, lane: str, guild_id: Optional[int],
+                       extract: Callable[[], Awaitable[Dict]], key: Optional[tuple] = None,
+                       hedge: bool = True) -> Dict:
+        """Extração pelo agendador, protegida pelo guard
+
+        O prazo, o hedge e a latência do guard só contam depois que o
+        agendador libera a vaga: espera na fila não é lentidão da extração. A
+        segunda tentativa do hedge pede outra vaga na mesma fila.
+        """
+        started = asyncio.get_running_loop().create_future()
+        return await self.guard.call(
+            op,
+            lambda: self.scheduler.run(lane, guild_id, extract, key=key, started=started),
+            hedge=hedge,
+            started=started
+        )
+
+    def _search_result(self, entry: Dict, flat: bool) -> Dict:
+        """Converte uma entrada do yt-dlp no formato de resultado de busca"""
+        video_id = entry['id']
+        self._store_metadata(entry)
+        result = {
+            'url': self.watch_url(video_id),
+            'title': entry.get('title'),
+            'duration': int(entry.get('duration') or 0),
+            'id': video_id,
+        }
+        if not flat:
+            # A busca já resolveu o formato: guarda o stream para a reprodução
+            self.stream_cache.put(video_id, entry.get('url'), codec=entry.get('acodec'))
+            result['stream_url'] = entry.get('url')
+            result['stream_expires'] = self.stream_cache.expires_at(video_id)
+            result['codec'] = entry.get('acodec')
+        return result
     
-    async def get_info(self, url: str) -> Optional[Dict]:
+    async def get_info(self, url: str, lane: str = PLAYBACK, guild_id: Optional[int] = None,
+                       raise_unavailable: bool = False) -> Optional[Dict]:
         """Obtém informações de uma URL do YouTube
         
+        Chamadas simultâneas para o mesmo vídeo compartilham uma extração; se
+        a nova chamada for mais prioritária, a extração ainda na fila sobe de
+        prioridade.
+        
         Args:
             url: URL do YouTube ou ID do vídeo
+            lane: Fila do agendador (INTERACTIVE, PLAYBACK ou BACKGROUND)
+            guild_id: Servidor que pediu (rodízio do agendador)
+            raise_unavailable: Repassa falhas da extração (UNAVAILABLE_ERRORS)
+                sem cache para servir, em vez de retornar None
             
         Returns:
             Dict com informações do vídeo
         """
-        loop = asyncio.get_event_loop()
-        
+        key = ('info', self.extract_video_id(url) or url)
+        self.scheduler.promote(key, lane)
         try:
-            with yt_dlp.YoutubeDL(self.YDL_OPTIONS) as ydl:
-                def _get_info():
-                    return ydl.extract_info(url, download=False)
-                
-                info = await loop.run_in_executor(self.executor, _get_info)
-            
-            return {
-                'url': info.get('url'),
-                'title': info.get('title'),
-                'duration': info.get('duration', 0),
-                'id': info.get('id'),
-                'thumbnail': info.get('thumbnail'),
-                'uploader': info.get('uploader'),
-                'upload_date': info.get('upload_date'),
-            }
+            info = await self.inflight.run(key, lambda: self._get_info(url, lane, guild_id, key))
         except Exception as e:
-            print(f"Erro ao obter informações: {e}")
+            logger.error(f"Erro ao obter informações: {self.describe_error(e)}")
+            stale = self._stale_info(url)
+            if stale is None and raise_unavailable and isinstance(e, UNAVAILABLE_ERRORS):
+                raise
+            return stale
+        return dict(info)
+
+    async def _get_info(self, url: str, lane: str = PLAYBACK, guild_id: Optional[int] = None,
+                        key: Optional[tuple] = None) -> Dict:
+        """Extrai as informações de um vídeo e atualiza os caches"""
+        info = await self._guarded(
+            'info', lane, guild_id, lambda: self.extractor.extract(url, self.YDL_OPTIONS), key=key,
+            # Renovações de fundo não disputam workers com uma segunda tentativa
+            hedge=lane != BACKGROUND
+        )
+
+        self._store_metadata(info)
+        self.stream_cache.put(info.get('id'), info.get('url'), codec=info.get('acodec'))
+        return {
+            'url': info.get('url'),
+            'stream_expires': self.stream_cache.expires_at(info.get('id')),
+            'acodec': info.get('acodec'),
+            'title': info.get('title'),
+            'duration': info.get('duration', 0),
+            'id': info.get('id'),
+            'thumbnail': info.get('thumbnail'),
+            'uploader': info.get('uploader'),
+            'upload_date': info.get('upload_date'),
+        }
+    
+    def _stale_info(self, url: str) -> Optional[Dict]:
+        """Informações montadas do cache quando a extração falha
+
+        Usa a URL de stream em cache mesmo dentro da margem de segurança
+        (ainda tocável por alguns minutos). Sem stream, não há o que servir.
+        """
+        video_id = self.extract_video_id(url)
+        stream_url = self.stream_cache.get_stale(video_id) if video_id else None
+        if not stream_url:
             return None
+        logger.info(f"Servindo stream do cache perto de expirar: {video_id}")
+        cached = self._cached_metadata(url, fields=MetadataCache.FIELDS) or {}
+        return {
+            'url': stream_url,
+            'stream_expires': self.stream_cache.expires_at(video_id),
+            'acodec': self.stream_cache.codec(video_id),
+            'title': cached.get('title'),
+            'duration': cached.get('duration', 0),
+            'id': video_id,
+            'thumbnail': cached.get('thumbnail'),
+            'uploader': cached.get('uploader'),
+            'upload_date': cached.get('upload_date'),
+        }
+
+    @classmethod
+    def is_unavailable_error(cls, message: str) -> bool:
+        """Indica erro do yt-dlp de vídeo indisponível (removido, privado, bloqueado)"""
+        message = message.lower()
+        return any(marker in message for marker in cls.DEAD_MARKERS)
+
+    @staticmethod
+    def describe_error(error: Exception) -> str:
+        if isinstance(error, asyncio.TimeoutError):
+            return "prazo de extração esgotado"
+        if isinstance(error, CircuitOpenError):
+            return f"disjuntor aberto, {error}"
+        return str(error)
+
+    async def check_videos(self, urls: List[str]) -> List[Dict]:
+        """Verifica um lote de vídeos numa única tarefa do backend de extração
+
+        Returns:
+            Um dict por URL com url, status ('ok', 'dead' ou 'error') e, se
+            'ok', title e duration; se não, reason
+        """
+        try:
+            results = await self.scheduler.run(
+                BACKGROUND, None, lambda: self.extractor.extract_batch(urls, self.VALIDATE_OPTIONS, 'validate')
+            )
+        except Exception as e:
+            return [{'url': url, 'status': 'error', 'reason': str(e)} for url in urls]
+
+        checked = []
+        for url, result in zip(urls, results):
+            info = result['info']
+            if info and info.get('id'):
+                self._store_metadata(info)
+                checked.append({
+                    'url': url,
+                    'status': 'ok',
+                    'title': info.get('title'),
+                    'duration': int(info.get('duration') or 0),
+                })
+                continue
+            reason = result['error'] or 'sem informações'
+            dead = self.is_unavailable_error(reason)
+            checked.append({'url': url, 'status': 'dead' if dead else 'error', 'reason': reason})
+        return checked
     
-    async def get_stream_url(self, url: str) -> Optional[str]:
+    async def get_metadata(self, url: str) -> Optional[Dict]:
+        """Obtém metadados (título, duração, thumbnail, autor) usando o cache
+
+        Args:
+            url: URL do YouTube
+
+        Returns:
+            Dict com metadados do vídeo
+        """
+        cached = self._cached_metadata(url, fields=MetadataCache.FIELDS)
+        if cached:
+            cached['url'] = self.watch_url(cached['id'])
+            return cached
+
+        info = await self.get_info(url, lane=INTERACTIVE)
+        if info:
+            info['url'] = self.watch_url(info['id'])
+        return info
+
+    def _cached_metadata(self, url: str, fields=('title', 'duration')) -> Optional[Dict]:
+        """Busca metadados no cache a partir de uma URL de vídeo"""
+        if not self.metadata_cache:
+            return None
+        video_id = self.extract_video_id(url)
+        if not video_id:
+            return None
+        return self.metadata_cache.get(video_id, fields)
+
+    def _store_metadata(self, info: Optional[Dict]) -> None:
+        """Grava metadados de um resultado do yt-dlp no cache"""
+        if not self.metadata_cache or not info or not info.get('id'):
+            return
+        try:
+            self.metadata_cache.put(info['id'], info)
+        except Exception as e:
+            logger.warning(f"Erro ao gravar cache de metadados: {e}")
+
+    async def get_stream_url(self, url: str, force_refresh: bool = False, lane: str = PLAYBACK,
+                             guild_id: Optional[int] = None, raise_unavailable: bool = False) -> Optional[str]:
         """Obtém URL de stream de áudio
         
         Args:
             url: URL do YouTube
+            force_refresh: Ignora o cache (ex.: a URL anterior falhou)
+            lane: Fila do agendador
+            guild_id: Servidor que pediu (rodízio do agendador)
+            raise_unavailable: Repassa falhas da extração (ver `get_info`)
             
         Returns:
             URL do stream de áudio
         """
-        info = await self.get_info(url)
+        video_id = self.extract_video_id(url)
+        if video_id:
+            if force_refresh:
+                self.stream_cache.invalidate(video_id)
+            else:
+                stream_url = self.stream_cache.get(video_id)
+                if stream_url:
+                    return stream_url
+
+        info = await self.get_info(url, lane=lane, guild_id=guild_id, raise_unavailable=raise_unavailable)
         if info:
             return info.get('url')
         return None
     
+    async def iter_playlist(self, url: str, limit: Optional[int] = None) -> AsyncIterator[Dict]:
+        """Lista as músicas de uma playlist à medida que o yt-dlp pagina
+        
+        A extração roda numa thread e entrega cada entrada assim que ela chega,
+        então a primeira música fica disponível sem esperar a playlist inteira.
+        
+        Args:
+            url: URL da playlist
+            limit: Máximo de músicas
+            
+        Yields:
+            Dicts com url, title, duration e id (sem URL de stream)
+        """
+        loop = asyncio.get_running_loop()
+        entries: asyncio.Queue = asyncio.Queue()
+        stop = threading.Event()
+        done = object()
+
+        def _send(item):
+            try:
+                loop.call_soon_threadsafe(entries.put_nowait, item)
+            except RuntimeError:
+                stop.set()  # Event loop encerrado
+
+        def _produce():
+            try:
+                with yt_dlp.YoutubeDL(self.PLAYLIST_OPTIONS) as ydl:
+                    # process=False mantém `entries` como gerador paginado
+                    info = ydl.extract_info(url, download=False, process=False)
+                    count = 0
+                    for entry in info.get('entries') or []:
+                        if stop.is_set() or (limit and count >= limit):
+                            break
+                        if entry and entry.get('id') and entry.get('title') not in self.UNAVAILABLE_TITLES:
+                            _send(entry)
+                            count += 1
+            except Exception as e:
+                _send(e)
+            finally:
+                _send(done)
+
+        producer = loop.run_in_executor(self.playlist_executor, _produce)
+        try:
+            while True:
+                item = await entries.get()
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    logger.error(f"Erro ao listar playlist: {item}")
+                    break
+                yield {
+                    'url': self.watch_url(item['id']),
+                    'title': item.get('title') or item['id'],
+                    'duration': int(item.get('duration') or 0),
+                    'id': item['id'],
+                }
+        finally:
+            # Consumidor parou (fim, erro ou cancelamento): interrompe a paginação
+            stop.set()
+            producer.cancel()
+
+    async def download_audio(self, url: str, output_dir: str) -> Optional[str]:
+        """Baixa o áudio de um vídeo em opus usando DOWNLOAD_OPTIONS
+
+        Args:
+            url: URL do YouTube
+            output_dir: Diretório de destino
+
+        Returns:
+            Caminho do arquivo baixado
+        """
+        options = dict(self.DOWNLOAD_OPTIONS)
+        options['outtmpl'] = os.path.join(output_dir, '%(id)s.%(ext)s')
+        if self.ffmpeg_path and self.ffmpeg_path != 'ffmpeg':
+            options['ffmpeg_location'] = self.ffmpeg_path
+
+        def _download():
+            with yt_dlp.YoutubeDL(options) as ydl:
+                info = ydl.extract_info(url, download=True)
+            downloads = info.get('requested_downloads') or []
+            return downloads[0].get('filepath') if downloads else None
+
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self.download_executor, _download)
+        except Exception as e:
+            logger.error(f"Erro ao baixar áudio: {e}")
+            return None
+
     @staticmethod
     def format_duration(seconds: int) -> str:
         """Formata duração em HH:MM:SS
@@ -133,7 +539,18 @@ class YouTubePlayer:
         """Verifica se é uma URL válida do YouTube"""
         return 'youtube.com' in url or 'youtu.be' in url
     
+    @staticmethod
+    def extract_video_id(url: str) -> Optional[str]:
+        """Extrai o ID do vídeo de uma URL do YouTube"""
+        match = VIDEO_ID_PATTERN.search(url)
+        return match.group(1) if match else None
+
+    @staticmethod
+    def watch_url(video_id: str) -> str:
+        """Monta a URL canônica de um vídeo"""
+        return WATCH_URL + video_id
+
     @staticmethod
     def is_playlist(url: str) -> bool:
-        """Verifica se é uma playlist do YouTube"""
-        return 'playlist' in url
+        """Verifica se é uma URL de playlist do YouTube"""
+        return YouTubePlayer.is_youtube_url(url) and '/playlist' in url and 'list=' in url